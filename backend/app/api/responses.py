@@ -0,0 +1,19 @@
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed, and with the json module otherwise
+
+    List and get routes return it directly with the service's plain dicts, which
+    also skips FastAPI's jsonable_encoder pass over every value.
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
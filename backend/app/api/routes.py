@@ -1,11 +1,55 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Form
+from fastapi import APIRouter, File, UploadFile, HTTPException, Form, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List
-from app.services.file_service import FileService
-from app.services.receipt_service import ReceiptService
+from datetime import datetime
+import asyncio
+import os
+import zipfile
+from app import config, metrics
+from app.services.file_service import FILE_FIELDS, FILE_PENDING, FILE_PROCESSED, FileService, file_cache
+from app.services.receipt_service import RECEIPT_DETAIL_FIELDS, RECEIPT_FIELDS, ReceiptService, receipt_cache
+from app.services.projection import parse_fields, project
+from app.services.job_service import JobService, CLAIM_PROCESSED, CLAIM_QUEUED, JOB_FAILED, JOB_SUCCEEDED
+from app.services.analytics_service import AnalyticsService
+from app.services.reprocess_service import ReprocessService
+from app.workers.job_runner import JobRunner
+from app.workers.reprocessor import Reprocessor
+from app.extraction.page_cache import get_page_cache
+from app.models.database import get_row_updated_at, get_table_version, run_db
+from app.api.etags import etag_matches, make_etag, not_modified, set_etag
+from app.api.responses import FastJSONResponse
 
 router = APIRouter()
 file_service = FileService()
 receipt_service = ReceiptService()
+job_service = JobService()
+analytics_service = AnalyticsService()
+job_runner = JobRunner(job_service)
+reprocess_service = ReprocessService()
+reprocessor = Reprocessor(reprocess_service)
+
+metrics.QUEUE_DEPTH.set_function(job_service.queue_depth)
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+def file_record_to_dict(file_record) -> dict:
+    """Convert a receipt_file row into a response dict"""
+    return {
+        "id": file_record[0],
+        "file_name": file_record[1],
+        "file_path": file_record[2],
+        "is_valid": file_record[3],
+        "invalid_reason": file_record[4],
+        "is_processed": file_record[5],
+        "created_at": file_record[6],
+        "updated_at": file_record[7],
+        "content_hash": file_record[8],
+        "file_size": file_record[9],
+        "page_count": file_record[10],
+        "processing_state": file_record[11],
+        "receipt_id": file_record[12]
+    }
 
 @router.get("/")
 async def root():
@@ -23,11 +67,21 @@ async def upload_receipt(file: UploadFile = File(...)):
         if file.content_type != "application/pdf":
             raise HTTPException(status_code=400, detail="Content-Type must be application/pdf")
         
-        # Save file
-        file_path = file_service.save_uploaded_file(file, file.filename)
+        # Stream file to disk
+        saved = await file_service.save_uploaded_file(file, file.filename)
+        file_path = saved.file_path
+        
+        # Identical content was uploaded before: reuse its record
+        existing = await run_db(file_service.get_file_by_hash, saved.sha256)
+        if existing:
+            metrics.UPLOADS.inc(result="duplicate")
+            return {**file_record_to_dict(existing), "is_duplicate": True}
         
         # Create database record
-        file_id = file_service.create_file_record(file.filename, file_path)
+        file_id = await run_db(
+            file_service.create_file_record, file.filename, file_path, saved.sha256, saved.size
+        )
+        metrics.UPLOADS.inc(result="created")
         
         # Return file record
         file_record = {
@@ -38,52 +92,201 @@ async def upload_receipt(file: UploadFile = File(...)):
             "invalid_reason": None,
             "is_processed": False,
             "created_at": None,
-            "updated_at": None
+            "updated_at": None,
+            "content_hash": saved.sha256,
+            "file_size": saved.size,
+            "processing_state": FILE_PENDING,
+            "receipt_id": None,
+            "is_duplicate": False
         }
         
         return file_record
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+@router.post("/upload/batch")
+async def upload_batch(files: List[UploadFile] = File(...)):
+    """Upload many receipt PDFs, or zip archives of them, in one request
+    
+    Files are written to disk concurrently and all records are inserted in one
+    transaction. Returns one result per PDF, in order; files that fail get an
+    error instead of a record.
+    """
+    try:
+        results = []
+        sources = []  # (result index, filename, callable returning a readable file)
+        archives = []
+        for upload in files:
+            filename = upload.filename or ""
+            if filename.lower().endswith(".zip") or upload.content_type in ZIP_CONTENT_TYPES:
+                try:
+                    archive = await run_in_threadpool(zipfile.ZipFile, upload.file)
+                except zipfile.BadZipFile:
+                    results.append({"file_name": filename, "error": "Not a valid zip archive"})
+                    continue
+                archives.append(archive)
+                for info in archive.infolist():
+                    if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                        continue
+                    name = os.path.basename(info.filename)
+                    if not file_service.validate_file_type(name):
+                        results.append({"file_name": name, "error": "Only PDF files are allowed"})
+                        continue
+                    sources.append((len(results), name, lambda archive=archive, info=info: archive.open(info)))
+                    results.append(None)
+            elif not file_service.validate_file_type(filename):
+                results.append({"file_name": filename, "error": "Only PDF files are allowed"})
+            elif upload.content_type != "application/pdf":
+                results.append({"file_name": filename, "error": "Content-Type must be application/pdf"})
+            else:
+                sources.append((len(results), filename, lambda upload=upload: upload.file))
+                results.append(None)
+        
+        if len(sources) > config.MAX_BATCH_FILES:
+            raise HTTPException(
+                status_code=400, detail=f"A batch can contain at most {config.MAX_BATCH_FILES} files"
+            )
+        
+        def store(open_source):
+            with open_source() as source:
+                return file_service.store_file(source)
+        
+        try:
+            stored = await asyncio.gather(
+                *(run_in_threadpool(store, open_source) for _, _, open_source in sources),
+                return_exceptions=True
+            )
+        finally:
+            for archive in archives:
+                archive.close()
+        
+        saved_uploads = []
+        for (index, filename, _), saved in zip(sources, stored):
+            if isinstance(saved, HTTPException):
+                results[index] = {"file_name": filename, "error": saved.detail}
+            elif isinstance(saved, Exception):
+                results[index] = {"file_name": filename, "error": f"Error saving file: {str(saved)}"}
+            else:
+                saved_uploads.append((index, filename, saved))
+        
+        records = await run_db(
+            file_service.create_file_records, [(filename, saved) for _, filename, saved in saved_uploads]
+        ) if saved_uploads else []
+        
+        for (index, filename, saved), (file_id, is_duplicate) in zip(saved_uploads, records):
+            metrics.UPLOADS.inc(result="duplicate" if is_duplicate else "created")
+            results[index] = {
+                "id": file_id,
+                "file_name": filename,
+                "file_path": saved.file_path,
+                "content_hash": saved.sha256,
+                "file_size": saved.size,
+                "is_duplicate": is_duplicate
+            }
+        
+        failed = sum(1 for result in results if "error" in result)
+        if failed:
+            metrics.UPLOADS.inc(failed, result="rejected")
+        
+        return {
+            "results": results,
+            "uploaded": len(records),
+            "failed": failed
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading files: {str(e)}")
+
+@router.post("/ingest")
+async def ingest_receipt(file: UploadFile = File(...)):
+    """Upload, validate and extract a receipt in one request and return the receipt
+    
+    The upload is validated before it is stored, so a rejected file leaves nothing
+    behind. The file record and the receipt are written in a single transaction.
+    """
+    try:
+        if not file.filename or not file_service.validate_file_type(file.filename):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+        
+        if file.content_type != "application/pdf":
+            raise HTTPException(status_code=400, detail="Content-Type must be application/pdf")
+        
+        saved = await file_service.save_uploaded_file(file, file.filename, validate=True)
+        
+        # Identical content was extracted before: return that receipt
+        receipt_id = await run_db(receipt_service.get_receipt_id_by_hash, saved.sha256)
+        if receipt_id:
+            return await run_db(receipt_service.get_receipt, receipt_id)
+        
+        receipt_data = await job_runner.extract(saved.file_path, saved.sha256)
+        
+        _, receipt_id = await run_db(
+            receipt_service.ingest_receipt, file.filename, saved.file_path, saved.sha256, saved.size,
+            receipt_data, saved.validation.page_count
+        )
+        
+        return await run_db(receipt_service.get_receipt, receipt_id)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ingesting receipt: {str(e)}")
+
 @router.post("/validate")
 async def validate_receipt(file_id: int = Form(...)):
     """Validate whether the uploaded file is a valid PDF"""
     try:
         # Get file record
-        file_record = file_service.get_file_record(file_id)
+        file_record = await run_db(file_service.get_file_record, file_id)
         
         if not file_record:
             raise HTTPException(status_code=404, detail="Receipt file not found")
         
-        # Validate file exists
-        is_valid = file_service.file_exists(file_record[2])  # file_path is at index 2
-        invalid_reason = None if is_valid else "File not found"
+        # Check the PDF structure (header, trailer, xref, page tree)
+        validation = await run_in_threadpool(file_service.check_pdf, file_record[2])  # file_path is at index 2
         
         # Update database
-        file_service.update_file_validation(file_id, is_valid, invalid_reason)
+        await run_db(
+            file_service.update_file_validation, file_id, validation.is_valid, validation.invalid_reason,
+            validation.page_count
+        )
         
         # Return updated file record
         return {
             "id": file_record[0],
             "file_name": file_record[1],
             "file_path": file_record[2],
-            "is_valid": is_valid,
-            "invalid_reason": invalid_reason,
+            "is_valid": validation.is_valid,
+            "invalid_reason": validation.invalid_reason,
             "is_processed": file_record[5],
+            "processing_state": file_record[11],
             "created_at": file_record[6],
-            "updated_at": None
+            "updated_at": None,
+            "pdf_version": validation.version,
+            "page_count": validation.page_count
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error validating file: {str(e)}")
 
 @router.post("/process")
-async def process_receipt(file_id: int = Form(...)):
-    """Extract receipt details using OCR/AI"""
+async def process_receipt(file_id: int = Form(...), wait: bool = Form(True)):
+    """Extract receipt details using OCR/AI
+    
+    Extraction runs as a background job. With wait=true (the default) the extracted
+    receipt is returned once the job finishes; otherwise the queued job is returned
+    with status 202 and can be followed through /jobs/{job_id}.
+    """
     try:
         # Get file record
-        file_record = file_service.get_file_record(file_id)
+        file_record = await run_db(file_service.get_file_record, file_id)
         
         if not file_record:
             raise HTTPException(status_code=404, detail="Receipt file not found")
@@ -91,55 +294,254 @@ async def process_receipt(file_id: int = Form(...)):
         if not file_record[3]:  # is_valid is at index 3
             raise HTTPException(status_code=400, detail="Cannot process invalid PDF file")
         
-        # Create receipt record
-        receipt_id = receipt_service.create_receipt(file_record[2])  # file_path
+        # Already processed: repeated calls return the same receipt
+        if file_record[11] == FILE_PROCESSED and file_record[12]:  # processing_state, receipt_id
+            return await run_db(receipt_service.get_receipt, file_record[12])
+        
+        # Identical content was extracted before: return that receipt without re-running OCR
+        content_hash = file_record[8]
+        if content_hash:
+            receipt_id = await run_db(receipt_service.get_receipt_id_by_hash, content_hash)
+            if receipt_id:
+                await run_db(file_service.mark_file_processed, file_id, receipt_id)
+                return await run_db(receipt_service.get_receipt, receipt_id)
         
-        # Mark file as processed
-        file_service.mark_file_processed(file_id)
+        # Claim the file and queue extraction, or join the job another request already queued;
+        # the job runner creates the receipt and marks the file processed
+        outcome, claimed_id = await run_db(job_service.claim_processing, file_id)
+        if outcome == CLAIM_PROCESSED:
+            return await run_db(receipt_service.get_receipt, claimed_id)
+        job_id = claimed_id
+        if outcome == CLAIM_QUEUED:
+            job_runner.notify()
+        
+        if not wait:
+            return JSONResponse(status_code=202, content=await run_db(job_service.get_job, job_id))
+        
+        job = await job_runner.wait_for_job(job_id)
+        if job["status"] == JOB_FAILED:
+            raise HTTPException(status_code=500, detail=f"Error processing receipt: {job['error']}")
+        if job["status"] != JOB_SUCCEEDED:
+            return JSONResponse(status_code=202, content=job)
         
         # Get and return receipt data
-        receipt_data = receipt_service.get_receipt(receipt_id)
+        receipt_data = await run_db(receipt_service.get_receipt, job["receipt_id"])
         
         return receipt_data
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing receipt: {str(e)}")
 
 @router.get("/receipts")
-async def list_receipts(skip: int = 0, limit: int = 100):
-    """List all processed receipts"""
-    return receipt_service.get_all_receipts(skip, limit)
+async def list_receipts(request: Request, skip: int = 0, limit: int = 100, cursor: str | None = None,
+                        include_total: bool = True, fields: str | None = None):
+    """List processed receipts, newest first
+    
+    Pass the next_cursor of the previous page as cursor to fetch the next one.
+    Pass fields (e.g. fields=merchant_name,total_amount,purchased_at) to return only those.
+    Send the ETag back as If-None-Match to get a 304 while no receipt has changed.
+    """
+    columns = parse_fields(fields, RECEIPT_FIELDS)
+    # Read the version before the data, so a concurrent write can only make the ETag older
+    etag = make_etag("receipts", await run_db(get_table_version, "receipt"), request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    result = await run_db(receipt_service.get_all_receipts, skip, limit, cursor, include_total, columns)
+    response = FastJSONResponse(result)
+    set_etag(response, etag)
+    return response
+
+@router.get("/receipts/search")
+async def search_receipts(q: str, limit: int = 20, cursor: str | None = None):
+    """Search receipts by merchant, receipt number, item names and extracted text, best match first
+    
+    Words match as prefixes, so q=starb finds Starbucks. Pass next_cursor as cursor for the next page.
+    """
+    return await run_db(receipt_service.search_receipts, q, limit, cursor)
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+@router.get("/receipts/export")
+async def export_receipts(format: str = "ndjson", purchased_from: datetime | None = None,
+                          purchased_to: datetime | None = None, since: datetime | None = None):
+    """Stream receipts as NDJSON or CSV
+    
+    Use since with the last exported updated_at to fetch only receipts that changed.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    
+    return StreamingResponse(
+        receipt_service.iter_export(format, purchased_from, purchased_to, since),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="receipts.{format}"'}
+    )
 
 @router.get("/receipts/{receipt_id}")
-async def get_receipt(receipt_id: int):
-    """Get a specific receipt by ID"""
-    receipt = receipt_service.get_receipt(receipt_id)
+async def get_receipt(receipt_id: int, request: Request, fields: str | None = None):
+    """Get a specific receipt by ID, optionally only some of its fields"""
+    columns = parse_fields(fields, RECEIPT_DETAIL_FIELDS)
+    updated_at = await run_db(get_row_updated_at, "receipt", receipt_id)
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    
+    etag = make_etag("receipt", receipt_id, updated_at, columns)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    receipt = await run_db(receipt_service.get_receipt, receipt_id)
+    if receipt and receipt["updated_at"] != updated_at:
+        # Cached before another process changed it
+        receipt_cache.invalidate(receipt_id)
+        receipt = await run_db(receipt_service.get_receipt, receipt_id)
     
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
     
-    return receipt
+    # The whole receipt is cached, so projecting it is cheaper than a narrower query
+    response = FastJSONResponse(project(receipt, columns))
+    set_etag(response, etag)
+    return response
 
 @router.get("/files")
-async def list_files():
-    """List all uploaded files"""
-    return file_service.get_all_files()
+async def list_files(request: Request, limit: int = 100, cursor: str | None = None, is_valid: bool | None = None,
+                     is_processed: bool | None = None, created_from: datetime | None = None,
+                     created_to: datetime | None = None, fields: str | None = None):
+    """List uploaded files, newest first
+    
+    Pass the next_cursor of the previous page as cursor to fetch the next one.
+    Pass fields (e.g. fields=file_name,processing_state) to return only those.
+    Send the ETag back as If-None-Match to get a 304 while no file has changed.
+    """
+    columns = parse_fields(fields, FILE_FIELDS)
+    etag = make_etag("files", await run_db(get_table_version, "receipt_file"), request.url.query)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    result = await run_db(
+        file_service.get_all_files, limit, cursor, is_valid, is_processed, created_from, created_to, columns
+    )
+    response = FastJSONResponse(result)
+    set_etag(response, etag)
+    return response
 
 @router.get("/files/{file_id}")
-async def get_file(file_id: int):
-    """Get a specific file by ID"""
-    file_record = file_service.get_file_record(file_id)
+async def get_file(file_id: int, request: Request, fields: str | None = None):
+    """Get a specific file by ID, optionally only some of its fields"""
+    columns = parse_fields(fields, FILE_FIELDS)
+    updated_at = await run_db(get_row_updated_at, "receipt_file", file_id)
+    if updated_at is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    
+    etag = make_etag("file", file_id, updated_at, columns)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    
+    file_record = await run_db(file_service.get_file_record, file_id)
+    if file_record and file_record[7] != updated_at:  # updated_at is at index 7
+        # Cached before another process changed it
+        file_cache.invalidate(file_id)
+        file_record = await run_db(file_service.get_file_record, file_id)
     
     if not file_record:
         raise HTTPException(status_code=404, detail="File not found")
     
-    return {
-        "id": file_record[0],
-        "file_name": file_record[1],
-        "file_path": file_record[2],
-        "is_valid": file_record[3],
-        "invalid_reason": file_record[4],
-        "is_processed": file_record[5],
-        "created_at": file_record[6],
-        "updated_at": file_record[7]
-    } 
\ No newline at end of file
+    response = FastJSONResponse(project(file_record_to_dict(file_record), columns))
+    set_etag(response, etag)
+    return response
+
+@router.get("/jobs")
+async def list_jobs(status: str | None = None, limit: int = 100):
+    """List recent processing jobs"""
+    return await run_db(job_service.list_jobs, status, limit)
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: int):
+    """Get the status of a processing job and the resulting receipt ID"""
+    job = await run_db(job_service.get_job, job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
+@router.post("/admin/reprocess", status_code=202)
+async def start_reprocess(batch_size: int = Form(config.REPROCESS_BATCH_SIZE)):
+    """Re-extract, in place, every receipt produced by an older extractor version
+    
+    Starts a run for the current version, or returns the unfinished one (resuming
+    it if paused). The run is worked in the background in checkpointed batches and
+    survives restarts; follow it through /admin/reprocess/{run_id}.
+    """
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size must be positive")
+    run = await run_db(reprocess_service.start_run, batch_size)
+    reprocessor.notify()
+    return run
+
+@router.get("/admin/reprocess")
+async def list_reprocess_runs(limit: int = 20):
+    """List recent reprocess runs"""
+    return {"runs": await run_db(reprocess_service.list_runs, limit)}
+
+@router.get("/admin/reprocess/{run_id}")
+async def get_reprocess_run(run_id: int):
+    """Progress of a reprocess run: checkpoint, processed and failed counts"""
+    run = await run_db(reprocess_service.get_run, run_id)
+    
+    if not run:
+        raise HTTPException(status_code=404, detail="Reprocess run not found")
+    
+    return run
+
+@router.post("/admin/reprocess/{run_id}/pause")
+async def pause_reprocess_run(run_id: int):
+    """Stop a run after its current batch; it keeps its checkpoint"""
+    await run_db(reprocess_service.set_paused, run_id, True)
+    return await get_reprocess_run(run_id)
+
+@router.post("/admin/reprocess/{run_id}/resume")
+async def resume_reprocess_run(run_id: int):
+    """Continue a paused run from its checkpoint"""
+    await run_db(reprocess_service.set_paused, run_id, False)
+    reprocessor.notify()
+    return await get_reprocess_run(run_id)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Request, stage and queue metrics of this process in Prometheus text format"""
+    # Rendering reads the queue depth from the database
+    body = await run_db(metrics.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss statistics of this process's receipt and file caches, and the size of the shared OCR page cache"""
+    page_cache = get_page_cache()
+    ocr_pages = await run_in_threadpool(page_cache.stats) if page_cache else None
+    return {"receipts": receipt_cache.stats(), "files": file_cache.stats(), "ocr_pages": ocr_pages}
+
+@router.get("/analytics/merchants")
+async def spend_by_merchant(purchased_from: datetime | None = None, purchased_to: datetime | None = None,
+                            limit: int = 100):
+    """Receipt count and spend per merchant"""
+    return await run_db(analytics_service.spend_by_merchant, purchased_from, purchased_to, limit)
+
+@router.get("/analytics/monthly")
+async def spend_by_month(purchased_from: datetime | None = None, purchased_to: datetime | None = None):
+    """Receipt count and spend per month of purchase"""
+    return await run_db(analytics_service.spend_by_month, purchased_from, purchased_to)
+
+@router.get("/analytics/payment-methods")
+async def spend_by_payment_method(purchased_from: datetime | None = None, purchased_to: datetime | None = None):
+    """Receipt count and spend per payment method"""
+    return await run_db(analytics_service.spend_by_payment_method, purchased_from, purchased_to)
+
+@router.get("/analytics/top-items")
+async def top_items(purchased_from: datetime | None = None, purchased_to: datetime | None = None,
+                    order_by: str = "spend", limit: int = 20):
+    """Most bought line items, by spend or quantity"""
+    return await run_db(analytics_service.top_items, purchased_from, purchased_to, order_by, limit)
@@ -0,0 +1,76 @@
+import os
+
+# Application settings, overridable through environment variables
+
+# Database
+DATABASE_PATH = os.getenv("RECEIPTS_DB_PATH", "receipts.db")
+DB_POOL_SIZE = int(os.getenv("RECEIPTS_DB_POOL_SIZE", "8"))
+DB_POOL_TIMEOUT = float(os.getenv("RECEIPTS_DB_POOL_TIMEOUT", "30"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("RECEIPTS_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("RECEIPTS_DB_CACHE_SIZE_KB", "20000"))
+# NORMAL skips the fsync on each WAL commit; FULL makes every commit durable on its own
+DB_SYNCHRONOUS = os.getenv("RECEIPTS_DB_SYNCHRONOUS", "NORMAL").upper()
+DB_MMAP_SIZE = int(os.getenv("RECEIPTS_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Group commit: writes queued while the previous batch commits share one transaction
+DB_WRITE_BATCHING = os.getenv("RECEIPTS_DB_WRITE_BATCHING", "true").lower() == "true"
+DB_WRITE_BATCH_WINDOW_MS = float(os.getenv("RECEIPTS_DB_WRITE_BATCH_WINDOW_MS", "0"))
+DB_WRITE_BATCH_MAX = int(os.getenv("RECEIPTS_DB_WRITE_BATCH_MAX", "256"))
+
+# Uploads
+UPLOAD_DIR = os.getenv("RECEIPTS_UPLOAD_DIR", "uploads")
+MAX_UPLOAD_BYTES = int(os.getenv("RECEIPTS_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("RECEIPTS_UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv("RECEIPTS_MAX_BATCH_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+MAX_BATCH_FILES = int(os.getenv("RECEIPTS_MAX_BATCH_FILES", "1000"))
+
+# Upload storage: originals are sharded by content hash under UPLOAD_DIR
+STORAGE_SHARD_DEPTH = int(os.getenv("RECEIPTS_STORAGE_SHARD_DEPTH", "2"))
+# fsync each file before renaming it into place
+STORAGE_FSYNC = os.getenv("RECEIPTS_STORAGE_FSYNC", "true").lower() == "true"
+# gzip, lzma or none; used by the tiering sweep (python -m app.workers.tiering)
+STORAGE_COMPRESSION = os.getenv("RECEIPTS_STORAGE_COMPRESSION", "gzip").lower()
+# Processed originals untouched for this long get compressed
+STORAGE_COMPRESS_AFTER = float(os.getenv("RECEIPTS_STORAGE_COMPRESS_AFTER", str(24 * 3600)))
+
+# Background processing jobs
+JOB_WORKERS = int(os.getenv("RECEIPTS_JOB_WORKERS", str(os.cpu_count() or 1)))
+JOB_RUNNER_EMBEDDED = os.getenv("RECEIPTS_JOB_RUNNER_EMBEDDED", "true").lower() == "true"
+JOB_POLL_INTERVAL = float(os.getenv("RECEIPTS_JOB_POLL_INTERVAL", "0.5"))
+JOB_LEASE_SECONDS = float(os.getenv("RECEIPTS_JOB_LEASE_SECONDS", "600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("RECEIPTS_JOB_MAX_ATTEMPTS", "3"))
+JOB_WAIT_TIMEOUT = float(os.getenv("RECEIPTS_JOB_WAIT_TIMEOUT", "120"))
+
+# Bulk re-extraction (/admin/reprocess and app.workers.reprocessor)
+REPROCESS_BATCH_SIZE = int(os.getenv("RECEIPTS_REPROCESS_BATCH_SIZE", "500"))
+REPROCESS_WORKERS = int(os.getenv("RECEIPTS_REPROCESS_WORKERS", str(JOB_WORKERS)))
+REPROCESS_POLL_INTERVAL = float(os.getenv("RECEIPTS_REPROCESS_POLL_INTERVAL", "30"))
+
+# Extraction
+EXTRACTION_ENGINE = os.getenv("RECEIPTS_EXTRACTION_ENGINE", "auto")
+TEXT_LAYER_MIN_CHARS = int(os.getenv("RECEIPTS_TEXT_LAYER_MIN_CHARS", "10"))
+OCR_DPI = int(os.getenv("RECEIPTS_OCR_DPI", "300"))
+OCR_GRAYSCALE = os.getenv("RECEIPTS_OCR_GRAYSCALE", "true").lower() == "true"
+OCR_LANG = os.getenv("RECEIPTS_OCR_LANG", "eng")
+OCR_PSM = int(os.getenv("RECEIPTS_OCR_PSM", "4"))
+# Each of the JOB_WORKERS extraction processes OCRs this many pages at once; the default shares the CPUs between them
+OCR_PAGE_WORKERS = int(os.getenv("RECEIPTS_OCR_PAGE_WORKERS", str(max(1, (os.cpu_count() or 1) // JOB_WORKERS))))
+# Per-page OCR output, keyed by content hash, page and OCR settings; reused on re-extraction
+OCR_CACHE_ENABLED = os.getenv("RECEIPTS_OCR_CACHE_ENABLED", "true").lower() == "true"
+OCR_CACHE_PATH = os.getenv("RECEIPTS_OCR_CACHE_PATH", "ocr_cache.db")
+OCR_CACHE_MAX_BYTES = int(os.getenv("RECEIPTS_OCR_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# Listing
+COUNT_CACHE_SECONDS = float(os.getenv("RECEIPTS_COUNT_CACHE_SECONDS", "5"))
+
+# Read-through caches for single receipt / file lookups
+RECEIPT_CACHE_SIZE = int(os.getenv("RECEIPTS_RECEIPT_CACHE_SIZE", "10000"))
+RECEIPT_CACHE_TTL = float(os.getenv("RECEIPTS_RECEIPT_CACHE_TTL", "300"))
+FILE_CACHE_SIZE = int(os.getenv("RECEIPTS_FILE_CACHE_SIZE", "10000"))
+FILE_CACHE_TTL = float(os.getenv("RECEIPTS_FILE_CACHE_TTL", "30"))
+EXPORT_BATCH_SIZE = int(os.getenv("RECEIPTS_EXPORT_BATCH_SIZE", "1000"))
+
+# Metrics and profiling
+PROFILE_SLOW_REQUESTS = os.getenv("RECEIPTS_PROFILE_SLOW_REQUESTS", "false").lower() == "true"
+PROFILE_SAMPLE_RATE = float(os.getenv("RECEIPTS_PROFILE_SAMPLE_RATE", "0.1"))
+SLOW_REQUEST_SECONDS = float(os.getenv("RECEIPTS_SLOW_REQUEST_SECONDS", "1.0"))
+PROFILE_DIR = os.getenv("RECEIPTS_PROFILE_DIR", "profiles")
@@ -0,0 +1,308 @@
+"""
+Text extraction engines for receipt PDFs.
+
+Engines share one interface: extract(file_path) -> ExtractionResult. The
+default "auto" engine reads the embedded text layer and only rasterizes and
+OCRs the pages that have none, so digital receipts never touch Tesseract.
+"""
+
+import csv
+import logging
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from functools import lru_cache
+from app import config
+from app.extraction import pdf_text
+from app.extraction.page_cache import file_sha256, get_page_cache
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TEXT_LAYER = "text_layer"
+SOURCE_OCR = "ocr"
+SOURCE_OCR_CACHE = "ocr_cache"
+
+# LSTM engine only; part of the OCR cache key along with the other settings
+OCR_ENGINE_MODE = 1
+
+
+class ExtractionError(Exception):
+    """Raised when no text can be extracted from a file"""
+
+
+@dataclass
+class PageResult:
+    """Text and timing for a single page"""
+    page_number: int
+    text: str
+    source: str
+    raster_ms: float = 0.0
+    ocr_ms: float = 0.0
+    total_ms: float = 0.0
+    # Tesseract TSV of the page's words with their boxes; OCR'd pages only
+    layout: str | None = None
+
+
+@dataclass
+class ExtractionResult:
+    """Text extracted from a whole document"""
+    engine: str
+    pages: list[PageResult] = field(default_factory=list)
+    total_ms: float = 0.0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(page.text for page in self.pages)
+
+    def stats(self) -> dict:
+        """Per-page timing summary suitable for storing as JSON"""
+        return {
+            "engine": self.engine,
+            "total_ms": round(self.total_ms, 2),
+            "pages": [
+                {key: round(value, 2) if isinstance(value, float) else value
+                 for key, value in asdict(page).items() if key not in ("text", "layout")}
+                for page in self.pages
+            ],
+        }
+
+
+class ExtractionEngine:
+    """Base class for extraction engines"""
+
+    name = "base"
+
+    def extract(self, file_path: str, content_hash: str | None = None) -> ExtractionResult:
+        """Extract every page; content_hash, when the caller knows it, saves hashing the file again"""
+        raise NotImplementedError
+
+
+class TextLayerEngine(ExtractionEngine):
+    """Reads the embedded text layer without rasterizing anything
+
+    Uses poppler's pdftotext when installed and the built-in reader otherwise.
+    """
+
+    name = "text_layer"
+
+    def __init__(self):
+        self.pdftotext = shutil.which("pdftotext")
+
+    def page_texts(self, file_path: str) -> list[str]:
+        """Text layer of each page; empty strings for pages without one"""
+        if self.pdftotext:
+            completed = subprocess.run(
+                [self.pdftotext, "-layout", "-enc", "UTF-8", file_path, "-"],
+                capture_output=True, timeout=60
+            )
+            if completed.returncode == 0:
+                # pdftotext ends every page with a form feed
+                return completed.stdout.decode("utf-8", errors="replace").split("\f")[:-1]
+        return pdf_text.extract_page_texts(file_path)
+
+    def extract(self, file_path: str, content_hash: str | None = None) -> ExtractionResult:
+        started = time.perf_counter()
+        pages = [
+            PageResult(page_number=number, text=text, source=SOURCE_TEXT_LAYER)
+            for number, text in enumerate(self.page_texts(file_path), start=1)
+        ]
+        elapsed = (time.perf_counter() - started) * 1000
+        for page in pages:
+            page.total_ms = elapsed / len(pages)
+        return ExtractionResult(engine=self.name, pages=pages, total_ms=elapsed)
+
+
+class TesseractEngine(ExtractionEngine):
+    """Rasterizes pages with pdf2image and OCRs them with Tesseract, several pages at a time"""
+
+    name = "tesseract"
+
+    def __init__(self, dpi: int = config.OCR_DPI, grayscale: bool = config.OCR_GRAYSCALE,
+                 lang: str = config.OCR_LANG, psm: int = config.OCR_PSM,
+                 page_workers: int = config.OCR_PAGE_WORKERS):
+        self.dpi = dpi
+        self.grayscale = grayscale
+        self.lang = lang
+        self.psm = psm
+        self.page_workers = page_workers
+        # Pages already run in parallel; keep each Tesseract process single-threaded
+        os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+    def page_count(self, file_path: str) -> int:
+        from pdf2image import pdfinfo_from_path
+
+        return int(pdfinfo_from_path(file_path)["Pages"])
+
+    def ocr_page(self, file_path: str, page_number: int) -> PageResult:
+        """Rasterize and OCR one page"""
+        from pdf2image import convert_from_path
+        import pytesseract
+
+        started = time.perf_counter()
+        images = convert_from_path(
+            file_path, dpi=self.dpi, grayscale=self.grayscale,
+            first_page=page_number, last_page=page_number
+        )
+        rasterized = time.perf_counter()
+        # psm 4: a single column of text of variable sizes, which is how receipts are laid out.
+        # One TSV run yields the word boxes and, from them, the text.
+        layout = pytesseract.image_to_data(
+            images[0], lang=self.lang, config=f"--oem {OCR_ENGINE_MODE} --psm {self.psm}"
+        )
+        finished = time.perf_counter()
+        return PageResult(
+            page_number=page_number,
+            text=tsv_text(layout),
+            source=SOURCE_OCR,
+            raster_ms=(rasterized - started) * 1000,
+            ocr_ms=(finished - rasterized) * 1000,
+            total_ms=(finished - started) * 1000,
+            layout=layout,
+        )
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies everything that affects OCR output besides the file and page"""
+        return (f"tesseract/{tesseract_version()} oem={OCR_ENGINE_MODE} psm={self.psm} "
+                f"dpi={self.dpi} grayscale={self.grayscale} lang={self.lang}")
+
+    def ocr_pages(self, file_path: str, page_numbers: list[int], content_hash: str | None = None) -> list[PageResult]:
+        """OCR several pages in parallel, reusing cached results for pages OCR'd before
+
+        pdftoppm and tesseract run as subprocesses, so threads give real parallelism.
+        """
+        cache = get_page_cache()
+        cached = {}
+        if cache is not None:
+            try:
+                # Stored files already have their hash recorded; only ad hoc callers pay for hashing
+                content_hash = content_hash or file_sha256(file_path)
+                cached = self._cached_pages(cache, content_hash, page_numbers)
+            except Exception:
+                logger.warning("OCR cache lookup failed for %s", file_path, exc_info=True)
+        missing = [number for number in page_numbers if number not in cached]
+
+        try:
+            if not missing:
+                results = []
+            elif len(missing) == 1:
+                results = [self.ocr_page(file_path, missing[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.page_workers, len(missing))) as executor:
+                    results = list(executor.map(lambda number: self.ocr_page(file_path, number), missing))
+        except Exception as e:
+            raise ExtractionError(f"OCR failed: {str(e)}") from e
+
+        if cache is not None and content_hash is not None:
+            try:
+                for page in results:
+                    cache.put(content_hash, page.page_number, self.cache_key, page.text, page.raster_ms, page.ocr_ms,
+                              page.layout)
+            except Exception:
+                logger.warning("Could not store OCR results of %s", file_path, exc_info=True)
+        cached.update((page.page_number, page) for page in results)
+        return [cached[number] for number in page_numbers]
+
+    def _cached_pages(self, cache, content_hash: str, page_numbers: list[int]) -> dict:
+        pages = {}
+        for number in page_numbers:
+            started = time.perf_counter()
+            hit = cache.get(content_hash, number, self.cache_key)
+            if hit is not None:
+                pages[number] = PageResult(
+                    page_number=number, text=hit.text, source=SOURCE_OCR_CACHE,
+                    total_ms=(time.perf_counter() - started) * 1000, layout=hit.layout,
+                )
+        return pages
+
+    def extract(self, file_path: str, content_hash: str | None = None) -> ExtractionResult:
+        started = time.perf_counter()
+        try:
+            count = self.page_count(file_path)
+        except Exception as e:
+            raise ExtractionError(f"Cannot read page count: {str(e)}") from e
+        pages = self.ocr_pages(file_path, list(range(1, count + 1)), content_hash)
+        return ExtractionResult(engine=self.name, pages=pages, total_ms=(time.perf_counter() - started) * 1000)
+
+
+class AutoEngine(ExtractionEngine):
+    """Uses the text layer where a page has one and OCR for the rest"""
+
+    name = "auto"
+
+    def __init__(self, min_chars: int = config.TEXT_LAYER_MIN_CHARS):
+        self.min_chars = min_chars
+        self.text_layer = TextLayerEngine()
+        self.ocr = TesseractEngine()
+
+    def has_text(self, text: str) -> bool:
+        return sum(not char.isspace() for char in text) >= self.min_chars
+
+    def extract(self, file_path: str, content_hash: str | None = None) -> ExtractionResult:
+        started = time.perf_counter()
+        try:
+            layer = self.text_layer.extract(file_path).pages
+        except Exception:
+            logger.warning("Could not read text layer of %s", file_path, exc_info=True)
+            layer = []
+
+        if not layer:
+            pages = self.ocr.extract(file_path, content_hash).pages
+        else:
+            scanned = [page.page_number for page in layer if not self.has_text(page.text)]
+            ocr_results = {page.page_number: page for page in self.ocr.ocr_pages(file_path, scanned, content_hash)} if scanned else {}
+            pages = [ocr_results.get(page.page_number, page) for page in layer]
+
+        return ExtractionResult(engine=self.name, pages=pages, total_ms=(time.perf_counter() - started) * 1000)
+
+
+@lru_cache(maxsize=None)
+def tesseract_version() -> str:
+    """Installed Tesseract version, so upgrading it invalidates cached OCR output"""
+    try:
+        completed = subprocess.run(["tesseract", "--version"], capture_output=True, timeout=10)
+        # Older releases print the version to stderr
+        output = (completed.stdout or completed.stderr).decode("utf-8", errors="replace")
+        return output.split("\n", 1)[0].strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def tsv_text(tsv: str) -> str:
+    """Plain text of a Tesseract TSV page: words joined per line, a blank line between paragraphs"""
+    lines = []
+    current_line = current_paragraph = None
+    for row in csv.DictReader(tsv.splitlines(), delimiter="\t", quoting=csv.QUOTE_NONE):
+        word = (row.get("text") or "").strip()
+        # Only level 5 rows are words; the others describe the blocks, paragraphs and lines around them
+        if row.get("level") != "5" or not word:
+            continue
+        paragraph = (row["page_num"], row["block_num"], row["par_num"])
+        line = (*paragraph, row["line_num"])
+        if line == current_line:
+            lines[-1] += " " + word
+            continue
+        if current_paragraph is not None and paragraph != current_paragraph:
+            lines.append("")
+        lines.append(word)
+        current_line, current_paragraph = line, paragraph
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+ENGINES = {
+    AutoEngine.name: AutoEngine,
+    TextLayerEngine.name: TextLayerEngine,
+    TesseractEngine.name: TesseractEngine,
+}
+
+
+@lru_cache(maxsize=None)
+def get_engine(name: str = config.EXTRACTION_ENGINE) -> ExtractionEngine:
+    """Get the (per-process) engine registered under a name"""
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown extraction engine: {name}")
@@ -0,0 +1,209 @@
+"""
+On-disk cache of per-page OCR results.
+
+Rasterizing and OCR'ing a page is by far the most expensive part of
+extraction, and its output depends only on the file's bytes, the page and the
+OCR engine and settings. Results (the page text and its word layout as
+Tesseract TSV) are kept in a separate SQLite database keyed by (content hash,
+page number, engine key), so re-extracting a receipt after a parser change
+reads the page back instead of re-running Tesseract.
+
+The cache is shared by every process through the database file and bounded by
+the total size of the stored text; least recently used pages are evicted.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from app import config
+
+# Evicting down to a low-water mark makes eviction run once per many inserts
+EVICTION_TARGET = 0.9
+# Rough per-row cost of the key and bookkeeping columns
+ROW_OVERHEAD_BYTES = 128
+# Cache hits only note the page as used; the notes are written in batches of this many,
+# or with the next put, or once they are this old
+TOUCH_BATCH = 64
+TOUCH_FLUSH_SECONDS = 30.0
+
+
+@dataclass
+class CachedPage:
+    """OCR output of one page, with the timings of the run that produced it"""
+    text: str
+    raster_ms: float
+    ocr_ms: float
+    # Word boxes as Tesseract TSV; None for pages cached before layouts were stored
+    layout: str | None = None
+
+
+class PageCache:
+    """Size-bounded LRU cache of OCR page text stored in SQLite"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        # Row id -> last use of cache hits not written yet
+        self._touched = {}
+        self._touched_since = 0.0
+
+    def _connection(self) -> sqlite3.Connection:
+        # Job workers are separate processes; each opens its own connection
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            # auto_vacuum only takes effect before the first table is created
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ocr_page (
+                    id INTEGER PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    page_number INTEGER NOT NULL,
+                    engine_key TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    layout TEXT,
+                    raster_ms REAL,
+                    ocr_ms REAL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    UNIQUE (content_hash, page_number, engine_key)
+                )
+            ''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(ocr_page)')}
+            if "layout" not in columns:
+                conn.execute('ALTER TABLE ocr_page ADD COLUMN layout TEXT')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_page_last_used ON ocr_page(last_used, size)')
+            # Running total of the stored sizes, so checking the bound never scans the table
+            conn.execute('CREATE TABLE IF NOT EXISTS ocr_cache_size (id INTEGER PRIMARY KEY CHECK (id = 1), bytes INTEGER NOT NULL)')
+            conn.execute('INSERT OR IGNORE INTO ocr_cache_size (id, bytes) SELECT 1, total(size) FROM ocr_page')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS ocr_page_size_insert AFTER INSERT ON ocr_page BEGIN
+                    UPDATE ocr_cache_size SET bytes = bytes + new.size WHERE id = 1;
+                END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS ocr_page_size_update AFTER UPDATE OF size ON ocr_page BEGIN
+                    UPDATE ocr_cache_size SET bytes = bytes - old.size + new.size WHERE id = 1;
+                END
+            ''')
+            conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS ocr_page_size_delete AFTER DELETE ON ocr_page BEGIN
+                    UPDATE ocr_cache_size SET bytes = bytes - old.size WHERE id = 1;
+                END
+            ''')
+            self._conn = conn
+            self._pid = os.getpid()
+            self._touched = {}
+        return self._conn
+
+    def get(self, content_hash: str, page_number: int, engine_key: str) -> CachedPage | None:
+        """Cached OCR output of a page; the hit is recorded for LRU order in a later batch"""
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('''
+                SELECT id, text, raster_ms, ocr_ms, layout FROM ocr_page
+                WHERE content_hash = ? AND page_number = ? AND engine_key = ?
+            ''', (content_hash, page_number, engine_key)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if not self._touched:
+                self._touched_since = now
+            self._touched[row[0]] = now
+            if len(self._touched) >= TOUCH_BATCH or now - self._touched_since >= TOUCH_FLUSH_SECONDS:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._flush_touches(conn)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+        return CachedPage(*row[1:])
+
+    def put(self, content_hash: str, page_number: int, engine_key: str, text: str,
+            raster_ms: float = 0.0, ocr_ms: float = 0.0, layout: str | None = None):
+        """Store a page's OCR output, evicting old pages beyond max_bytes"""
+        if self.max_bytes <= 0:
+            return
+        now = time.time()
+        size = len(text.encode("utf-8")) + len((layout or "").encode("utf-8")) + ROW_OVERHEAD_BYTES
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._flush_touches(conn)
+                conn.execute('''
+                    INSERT INTO ocr_page (
+                        content_hash, page_number, engine_key, text, layout, raster_ms, ocr_ms, size,
+                        created_at, last_used
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (content_hash, page_number, engine_key) DO UPDATE SET
+                        text = excluded.text, layout = excluded.layout, raster_ms = excluded.raster_ms,
+                        ocr_ms = excluded.ocr_ms, size = excluded.size, last_used = excluded.last_used
+                ''', (content_hash, page_number, engine_key, text, layout, raster_ms, ocr_ms, size, now, now))
+                evicted = self._evict(conn)
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            if evicted:
+                conn.execute('PRAGMA incremental_vacuum')
+
+    def _flush_touches(self, conn: sqlite3.Connection):
+        """Write the pending last_used updates of cache hits (inside the caller's transaction)"""
+        if self._touched:
+            conn.executemany('UPDATE ocr_page SET last_used = ? WHERE id = ?',
+                             [(used, row_id) for row_id, used in self._touched.items()])
+            self._touched = {}
+
+    def _evict(self, conn: sqlite3.Connection) -> bool:
+        """Drop least recently used pages until the cache is under its low-water mark"""
+        total = conn.execute('SELECT bytes FROM ocr_cache_size WHERE id = 1').fetchone()[0]
+        if total <= self.max_bytes:
+            return False
+        excess = total - self.max_bytes * EVICTION_TARGET
+        conn.execute('''
+            DELETE FROM ocr_page WHERE id IN (
+                SELECT id FROM (
+                    SELECT id, SUM(size) OVER (ORDER BY last_used, id) - size AS freed_before
+                    FROM ocr_page
+                )
+                WHERE freed_before < ?
+            )
+        ''', (excess,))
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connection()
+            entries = conn.execute('SELECT COUNT(*) FROM ocr_page').fetchone()[0]
+            size = conn.execute('SELECT bytes FROM ocr_cache_size WHERE id = 1').fetchone()[0]
+        return {"entries": entries, "bytes": int(size), "max_bytes": self.max_bytes}
+
+    def clear(self):
+        with self._lock:
+            self._connection().execute('DELETE FROM ocr_page')
+            self._touched = {}
+
+
+@lru_cache(maxsize=None)
+def get_page_cache() -> PageCache | None:
+    """The (per-process) OCR page cache, or None when it is disabled"""
+    if not config.OCR_CACHE_ENABLED:
+        return None
+    return PageCache(config.OCR_CACHE_PATH, config.OCR_CACHE_MAX_BYTES)
+
+
+def file_sha256(file_path: str) -> str:
+    """Content hash of a file, matching receipt_file.content_hash"""
+    with open(file_path, "rb") as handle:
+        return hashlib.file_digest(handle, "sha256").hexdigest()
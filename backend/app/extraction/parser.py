@@ -0,0 +1,140 @@
+"""
+Receipt field parser.
+
+All field patterns are compiled once into a single alternation anchored at
+line boundaries, so parsing is one finditer() pass over the text: every
+line is matched exactly once and classified by the branch that matched it.
+"""
+
+from datetime import datetime
+import regex
+
+PARSER_VERSION = "2"
+
+AMOUNT = r"-?\$?\s?(?:\d{1,3}(?:,\d{3})+|\d+)[.,]\d{2}"
+MONTHS = "jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec"
+MONTH_NUMBERS = {name: number for number, name in enumerate(MONTHS.split("|"), start=1)}
+
+PAYMENT_KEYWORDS = {
+    "visa": "CREDIT", "mastercard": "CREDIT", "master card": "CREDIT", "amex": "CREDIT",
+    "american express": "CREDIT", "discover": "CREDIT", "credit": "CREDIT",
+    "debit": "DEBIT", "cash": "CASH", "apple pay": "MOBILE", "google pay": "MOBILE",
+    "gift card": "GIFT_CARD", "check": "CHECK",
+}
+PAYMENT = "|".join(sorted((regex.escape(keyword) for keyword in PAYMENT_KEYWORDS), key=len, reverse=True))
+
+# Branch order matters: the first branch that matches a line classifies it.
+# regex allows the same group name in several branches (e.g. the date formats).
+LINE_PATTERN = regex.compile(
+    rf"""
+    ^[^\S\n]*(?:
+        (?P<subtotal>sub[\s-]?total\b[^\n\d$-]*(?P<subtotal_amount>{AMOUNT}))
+      | (?P<tax>(?:total\s+)?(?:sales\s+)?(?:tax|vat|gst|hst)\b[^\n]*?(?P<tax_amount>{AMOUNT})[^\S\n]*$)
+      | (?P<total>(?:grand\s+total|total(?:\s+due)?|amount\s+due|balance\s+due)\b[^\S\n]*:?[^\S\n]*(?P<total_amount>{AMOUNT}))
+      | (?P<skip>(?:change|cash\s+back|tendered|you\s+saved|savings|items?\s+sold
+                  |total\s+(?:items|savings|saved|discounts?|coupons?))\b[^\n]*)
+      | (?P<receipt_number>(?:receipt|invoice|trans(?:action)?|order|ticket)\s*(?:\#|no\.?|number|num)\s*:?[^\S\n]*(?P<number>[A-Z0-9][A-Z0-9-]*))
+      | (?P<cashier>(?:cashier|served\s+by|server|operator|clerk)\s*(?:\#|:)?[^\S\n]*(?P<cashier_name>[^\n]*?))
+      | (?P<payment>(?:payment(?:\s+method)?\s*:?[^\S\n]*)?(?P<method>{PAYMENT})\b[^\n]*)
+      | (?P<item>(?:(?P<lead_quantity>\d{{1,3}})\s*[x@]\s+)?(?P<item_name>[^\n]*?[A-Za-z][^\n]*?)
+            (?:\s+(?P<quantity>\d{{1,3}})\s*[x@]\s*{AMOUNT})?
+            \s+(?P<item_price>{AMOUNT})(?:\s+[A-Z]{{1,2}})?)
+      | (?P<date>(?:date|time)?[^\n]*?
+            (?:(?P<year>\d{{4}})-(?P<month>\d{{1,2}})-(?P<day>\d{{1,2}})
+              | (?P<month>\d{{1,2}})/(?P<day>\d{{1,2}})/(?P<year>\d{{2,4}})
+              | (?P<day>\d{{1,2}})\.(?P<month>\d{{1,2}})\.(?P<year>\d{{4}})
+              | (?P<month_name>{MONTHS})[a-z]*\.?\s+(?P<day>\d{{1,2}}),?\s+(?P<year>\d{{4}}))
+            (?:[^\n\d]*?(?P<hour>\d{{1,2}}):(?P<minute>\d{{2}})(?::(?P<second>\d{{2}}))?[^\S\n]*(?P<ampm>[ap]\.?m\.?)?)?
+            [^\n]*)
+      | (?P<other>[^\n]*)
+    )[^\S\n]*$
+    """,
+    regex.IGNORECASE | regex.MULTILINE | regex.VERBOSE | regex.VERSION0,
+)
+
+
+def parse_amount(text: str) -> float:
+    """Convert a matched amount such as '$1,234.50' or '12,39' to a float"""
+    text = text.replace("$", "").replace(" ", "")
+    if text[-3] == ",":
+        text = text[:-3].replace(".", "") + "." + text[-2:]
+    return float(text.replace(",", ""))
+
+
+def _parse_datetime(match) -> datetime | None:
+    """Build a datetime from the date branch's groups"""
+    try:
+        year = int(match.group("year"))
+        if year < 100:
+            year += 2000
+        if match.group("month_name"):
+            month = MONTH_NUMBERS[match.group("month_name")[:3].lower()]
+        else:
+            month = int(match.group("month"))
+        day = int(match.group("day"))
+        hour = int(match.group("hour") or 0)
+        minute = int(match.group("minute") or 0)
+        second = int(match.group("second") or 0)
+        ampm = (match.group("ampm") or "").lower()
+        if ampm.startswith("p") and hour < 12:
+            hour += 12
+        elif ampm.startswith("a") and hour == 12:
+            hour = 0
+        return datetime(year, month, day, hour, minute, second)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_receipt_text(text: str) -> dict:
+    """Pull receipt fields out of extracted text in a single pass"""
+    fields = {
+        "merchant_name": None,
+        "total_amount": None,
+        "purchased_at": None,
+        "items": [],
+        "payment_method": None,
+        "tax_amount": None,
+        "subtotal": None,
+        "receipt_number": None,
+        "cashier": None,
+    }
+    items = fields["items"]
+    tax_total = None
+
+    for match in LINE_PATTERN.finditer(text):
+        kind = match.lastgroup
+        if kind == "item":
+            quantity = match.group("quantity") or match.group("lead_quantity")
+            items.append({
+                "name": match.group("item_name").strip(),
+                "price": parse_amount(match.group("item_price")),
+                "quantity": int(quantity) if quantity else 1,
+            })
+        elif kind == "other":
+            line = match.group("other").strip()
+            if fields["merchant_name"] is None and any(char.isalpha() for char in line):
+                fields["merchant_name"] = line
+        elif kind == "total":
+            # The last total on a receipt is the amount charged
+            fields["total_amount"] = parse_amount(match.group("total_amount"))
+        elif kind == "subtotal":
+            fields["subtotal"] = parse_amount(match.group("subtotal_amount"))
+        elif kind == "tax":
+            # Several tax lines (e.g. state + city) add up
+            tax_total = (tax_total or 0.0) + parse_amount(match.group("tax_amount"))
+        elif kind == "date":
+            if fields["purchased_at"] is None:
+                fields["purchased_at"] = _parse_datetime(match)
+        elif kind == "payment":
+            if fields["payment_method"] is None:
+                fields["payment_method"] = PAYMENT_KEYWORDS[match.group("method").lower()]
+        elif kind == "receipt_number":
+            if fields["receipt_number"] is None:
+                fields["receipt_number"] = match.group("number")
+        elif kind == "cashier":
+            if fields["cashier"] is None and match.group("cashier_name"):
+                fields["cashier"] = match.group("cashier_name").strip()
+
+    if tax_total is not None:
+        fields["tax_amount"] = round(tax_total, 2)
+    return fields
@@ -0,0 +1,179 @@
+"""
+Minimal reader for the embedded text layer of simple PDFs.
+
+Used when poppler's pdftotext is not installed. It understands plain
+(non object-stream) PDFs with FlateDecode/ASCII85Decode content streams and
+single-byte fonts, which covers receipts produced by POS and reporting
+software. Anything it cannot read simply yields no text, and the caller
+falls back to OCR.
+"""
+
+import base64
+import re
+import zlib
+
+OBJECT_PATTERN = re.compile(rb"(\d+)\s+\d+\s+obj\b(.*?)\bendobj", re.S)
+STREAM_PATTERN = re.compile(rb"^(.*?)\bstream\r?\n(.*?)\r?\n?endstream", re.S)
+PAGE_TYPE_PATTERN = re.compile(rb"/Type\s*/Page\b(?!s)")
+CONTENTS_PATTERN = re.compile(rb"/Contents\s*(?:(\d+)\s+\d+\s+R|\[([^\]]*)\])")
+REFERENCE_PATTERN = re.compile(rb"(\d+)\s+\d+\s+R")
+FILTER_PATTERN = re.compile(rb"/(FlateDecode|Fl|ASCII85Decode|A85|ASCIIHexDecode|AHx|[A-Za-z0-9]+Decode)\b")
+TOKEN_PATTERN = re.compile(
+    rb"\((?:\\.|[^\\)])*\)"           # literal string
+    rb"|<[0-9A-Fa-f\s]*>"             # hex string
+    rb"|\[|\]"                        # array delimiters
+    rb"|/[^\s/\[\]()<>{}%]+"          # name
+    rb"|[-+]?(?:\d+\.?\d*|\.\d+)"     # number
+    rb"|[A-Za-z'\"*]+",               # operator
+    re.S
+)
+ESCAPE_PATTERN = re.compile(rb"\\([nrtbf()\\]|[0-7]{1,3}|\r?\n)")
+ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f", b"(": b"(", b")": b")", b"\\": b"\\"}
+
+# Fragments whose baselines differ by less than this (in points) share a line
+LINE_TOLERANCE = 2.0
+
+
+def extract_page_texts(file_path: str) -> list[str]:
+    """Return the text layer of each page, in page order"""
+    with open(file_path, "rb") as pdf:
+        data = pdf.read()
+
+    objects = {int(match.group(1)): match.group(2) for match in OBJECT_PATTERN.finditer(data)}
+    pages = [body for body in objects.values() if PAGE_TYPE_PATTERN.search(body)]
+
+    texts = []
+    for page in pages:
+        contents = CONTENTS_PATTERN.search(page)
+        if not contents:
+            texts.append("")
+            continue
+        if contents.group(1):
+            refs = [int(contents.group(1))]
+        else:
+            refs = [int(ref) for ref in REFERENCE_PATTERN.findall(contents.group(2))]
+        stream = b"\n".join(_decode_stream(objects.get(ref, b"")) for ref in refs)
+        texts.append(_layout_text(stream))
+    return texts
+
+
+def _decode_stream(body: bytes) -> bytes:
+    """Decode an object's stream data through its filter chain"""
+    match = STREAM_PATTERN.match(body)
+    if not match:
+        return b""
+    header, raw = match.groups()
+    try:
+        for name in FILTER_PATTERN.findall(header.split(b"/Filter", 1)[-1] if b"/Filter" in header else b""):
+            if name in (b"FlateDecode", b"Fl"):
+                raw = zlib.decompress(raw)
+            elif name in (b"ASCII85Decode", b"A85"):
+                raw = raw.strip()
+                raw = base64.a85decode(raw if raw.endswith(b"~>") else raw + b"~>", adobe=True)
+            elif name in (b"ASCIIHexDecode", b"AHx"):
+                raw = bytes.fromhex(raw.strip().rstrip(b">").decode("ascii"))
+            else:
+                return b""
+    except (zlib.error, ValueError):
+        return b""
+    return raw
+
+
+def _unescape(literal: bytes) -> bytes:
+    """Resolve the escape sequences of a PDF literal string"""
+    def replace(match):
+        code = match.group(1)
+        if code in ESCAPES:
+            return ESCAPES[code]
+        if code.isdigit():
+            return bytes([int(code, 8) & 0xFF])
+        return b""  # escaped line break
+    return ESCAPE_PATTERN.sub(replace, literal)
+
+
+def _string_value(token: bytes) -> str:
+    """Decode a literal or hex string token"""
+    if token.startswith(b"("):
+        raw = _unescape(token[1:-1])
+    else:
+        raw = bytes.fromhex(re.sub(rb"\s", b"", token[1:-1]).decode("ascii"))
+    return raw.decode("cp1252", errors="replace")
+
+
+def _layout_text(content: bytes) -> str:
+    """Run the text operators of a content stream and rebuild lines by position"""
+    fragments = []
+    operands = []
+    array = None
+    line_x = line_y = 0.0
+    leading = 0.0
+
+    def show(text):
+        if isinstance(text, str) and text:
+            fragments.append((line_y, line_x, len(fragments), text))
+
+    for token in TOKEN_PATTERN.findall(content):
+        first = token[:1]
+        if first in b"(<":
+            try:
+                value = _string_value(token)
+            except ValueError:
+                continue
+            (array if array is not None else operands).append(value)
+        elif token == b"[":
+            array = []
+        elif token == b"]":
+            operands.append(array or [])
+            array = None
+        elif first in b"/" or first.isdigit() or first in b"+-.":
+            if array is not None:
+                if first != b"/":
+                    array.append(float(token))
+            else:
+                operands.append(token)
+        else:
+            op = token
+            try:
+                if op == b"BT":
+                    line_x = line_y = 0.0
+                elif op in (b"Td", b"TD"):
+                    tx, ty = float(operands[-2]), float(operands[-1])
+                    line_x += tx
+                    line_y += ty
+                    if op == b"TD":
+                        leading = -ty
+                elif op == b"Tm":
+                    line_x, line_y = float(operands[-2]), float(operands[-1])
+                elif op == b"TL":
+                    leading = float(operands[-1])
+                elif op == b"T*":
+                    line_y -= leading
+                elif op == b"Tj":
+                    show(operands[-1])
+                elif op in (b"'", b'"'):
+                    line_y -= leading
+                    show(operands[-1])
+                elif op == b"TJ":
+                    # Large negative kerning between strings is a word gap
+                    parts = []
+                    for item in operands[-1]:
+                        if isinstance(item, str):
+                            parts.append(item)
+                        elif item < -200:
+                            parts.append(" ")
+                    show("".join(parts))
+            except (IndexError, ValueError, TypeError):
+                pass
+            operands = []
+
+    # Top of page first, then left to right within a line
+    fragments.sort(key=lambda fragment: (-fragment[0], fragment[1], fragment[2]))
+    lines = []
+    current_y = None
+    for y, _, _, text in fragments:
+        if current_y is not None and abs(current_y - y) <= LINE_TOLERANCE:
+            lines[-1].append(text)
+        else:
+            lines.append([text])
+            current_y = y
+    return "\n".join("  ".join(parts).strip() for parts in lines)
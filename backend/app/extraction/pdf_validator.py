@@ -0,0 +1,198 @@
+"""
+Structural PDF validation.
+
+Checks the parts of a PDF that every reader needs before it can open the
+document: the %PDF- header, the %%EOF marker, the startxref pointer and the
+cross-reference section it points to, and the page count of the catalog's
+page tree. The file is memory-mapped and only those few regions are touched,
+so a multi-megabyte PDF is validated without being read into memory.
+
+The one exception is a file whose cross-reference section is a compressed
+stream: its page count comes from scanning the file for page objects, which
+is only done up to PAGE_SCAN_LIMIT bytes. Larger files of that kind are
+validated structurally but their page count is left unknown.
+"""
+
+import mmap
+import os
+import re
+from dataclasses import dataclass
+
+# Writers may put a little garbage before the header and after the EOF marker
+HEADER_WINDOW = 1024
+TRAILER_WINDOW = 2048
+# Upper bound on how much of a single object we look at
+OBJECT_WINDOW = 64 * 1024
+# Incremental updates chain xref sections through /Prev
+MAX_XREF_SECTIONS = 32
+# Files with xref streams are scanned for page objects only up to this size
+PAGE_SCAN_LIMIT = 8 * 1024 * 1024
+
+HEADER_PATTERN = re.compile(rb"%PDF-(\d\.\d)")
+STARTXREF_PATTERN = re.compile(rb"startxref\s+(\d+)")
+XREF_SUBSECTION_PATTERN = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n?")
+XREF_ENTRY_PATTERN = re.compile(rb"(\d{10})\s(\d{5})\s([nf])")
+OBJECT_HEADER_PATTERN = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj\b")
+ROOT_PATTERN = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+PREV_PATTERN = re.compile(rb"/Prev\s+(\d+)")
+PAGES_PATTERN = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+COUNT_PATTERN = re.compile(rb"/Count\s+(\d+)")
+XREF_STREAM_PATTERN = re.compile(rb"/Type\s*/XRef\b")
+# A page object, or an object stream that may hide page objects from the scan
+PAGE_SCAN_PATTERN = re.compile(rb"/Type\s*/(?:(Page)\b(?!s)|ObjStm\b)")
+
+
+@dataclass
+class PdfValidation:
+    """Outcome of validating one file"""
+    is_valid: bool
+    invalid_reason: str | None = None
+    version: str | None = None
+    page_count: int | None = None
+
+
+def validate_pdf(file_path: str) -> PdfValidation:
+    """Check a file's PDF structure and count its pages"""
+    try:
+        with open(file_path, "rb") as pdf:
+            if os.fstat(pdf.fileno()).st_size == 0:
+                return PdfValidation(False, "File is empty")
+            with mmap.mmap(pdf.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _validate(data)
+    except FileNotFoundError:
+        return PdfValidation(False, "File not found")
+    except OSError as e:
+        return PdfValidation(False, f"Cannot read file: {e.strerror or str(e)}")
+
+
+def _validate(data) -> PdfValidation:
+    size = len(data)
+    header = HEADER_PATTERN.search(data, 0, min(size, HEADER_WINDOW))
+    if not header:
+        return PdfValidation(False, "Missing %PDF- header")
+    version = header.group(1).decode()
+    # Byte offsets in the file are relative to the header
+    base = header.start()
+
+    tail_start = max(0, size - TRAILER_WINDOW)
+    if data.rfind(b"%%EOF", tail_start) == -1:
+        return PdfValidation(False, "Missing %%EOF marker", version)
+
+    startxref = None
+    for match in STARTXREF_PATTERN.finditer(data, tail_start):
+        startxref = match
+    if startxref is None:
+        return PdfValidation(False, "Missing startxref", version)
+    xref_offset = base + int(startxref.group(1))
+    if xref_offset >= size:
+        return PdfValidation(False, f"startxref offset {xref_offset} is beyond the end of the file", version)
+
+    if data[xref_offset:xref_offset + 4] == b"xref":
+        offsets, reason = _read_xref_tables(data, xref_offset, base)
+        if reason:
+            return PdfValidation(False, reason, version)
+        page_count, reason = _page_tree_count(data, offsets)
+        if reason:
+            return PdfValidation(False, reason, version)
+    else:
+        stream = _object_at(data, xref_offset)
+        if stream is None or not XREF_STREAM_PATTERN.search(stream):
+            return PdfValidation(False, f"No cross-reference section at startxref offset {xref_offset}", version)
+        # Compressed cross-reference streams need decoding to follow; count pages directly instead
+        page_count = _scan_page_count(data)
+
+    if page_count == 0:
+        return PdfValidation(False, "Document has no pages", version, 0)
+    return PdfValidation(True, None, version, page_count)
+
+
+def _read_xref_tables(data, offset: int, base: int) -> tuple[dict, str | None]:
+    """Follow the classic xref tables from startxref through /Prev and map objects to offsets"""
+    offsets = {}
+    root = None
+    for _ in range(MAX_XREF_SECTIONS):
+        position = offset + 4
+        while True:
+            subsection = XREF_SUBSECTION_PATTERN.match(data, position)
+            if not subsection:
+                break
+            first, count = int(subsection.group(1)), int(subsection.group(2))
+            position = subsection.end()
+            for number in range(first, first + count):
+                entry = XREF_ENTRY_PATTERN.match(data, position)
+                if not entry:
+                    return offsets, f"Malformed cross-reference entry for object {number}"
+                position = entry.end()
+                while data[position:position + 1] in (b" ", b"\r", b"\n"):
+                    position += 1
+                # Newer sections (read first) override older ones
+                if entry.group(3) == b"n" and number not in offsets:
+                    offsets[number] = base + int(entry.group(1))
+
+        trailer_start = data.find(b"trailer", position, position + 64)
+        if trailer_start == -1:
+            return offsets, "Missing trailer after cross-reference table"
+        trailer = data[trailer_start:data.find(b">>", trailer_start, trailer_start + OBJECT_WINDOW) + 2]
+        if root is None:
+            match = ROOT_PATTERN.search(trailer)
+            root = int(match.group(1)) if match else None
+        previous = PREV_PATTERN.search(trailer)
+        if not previous:
+            break
+        offset = base + int(previous.group(1))
+        if data[offset:offset + 4] != b"xref":
+            return offsets, f"No cross-reference table at /Prev offset {offset}"
+
+    if root is None:
+        return offsets, "Trailer has no /Root catalog"
+    offsets["root"] = root
+    return offsets, None
+
+
+def _page_tree_count(data, offsets: dict) -> tuple[int | None, str | None]:
+    """Read /Count from the catalog's page tree root"""
+    root = offsets["root"]
+    if root not in offsets:
+        return None, f"Catalog object {root} is not in the cross-reference table"
+    catalog = _object_at(data, offsets[root])
+    if catalog is None:
+        return None, f"Catalog object {root} is not at its cross-reference offset"
+    pages = PAGES_PATTERN.search(catalog)
+    if not pages:
+        return None, "Catalog has no /Pages tree"
+    pages_number = int(pages.group(1))
+    if pages_number not in offsets:
+        return None, f"Page tree object {pages_number} is not in the cross-reference table"
+    tree = _object_at(data, offsets[pages_number])
+    if tree is None:
+        return None, f"Page tree object {pages_number} is not at its cross-reference offset"
+    count = COUNT_PATTERN.search(tree)
+    if not count:
+        return None, "Page tree has no /Count"
+    return int(count.group(1)), None
+
+
+def _scan_page_count(data) -> int | None:
+    """Count page objects in one pass over the file
+
+    Unknown when they may be hidden in compressed object streams, and for files
+    over PAGE_SCAN_LIMIT, where the scan would cost more than validating is worth.
+    """
+    if len(data) > PAGE_SCAN_LIMIT:
+        return None
+    count = 0
+    for match in PAGE_SCAN_PATTERN.finditer(data):
+        if match.group(1) is None:
+            return None
+        count += 1
+    return count
+
+
+def _object_at(data, offset: int) -> bytes | None:
+    """The body of the indirect object starting at offset, or None if there is none"""
+    if not OBJECT_HEADER_PATTERN.match(data, offset):
+        return None
+    end = data.find(b"endobj", offset, offset + OBJECT_WINDOW)
+    if end == -1:
+        end = min(len(data), offset + OBJECT_WINDOW)
+    return data[offset:end]
@@ -1,13 +1,32 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.api.routes import router
+from app import config
+from app.api.routes import router, job_runner, reprocessor
+from app.api.responses import FastJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from app.middleware import MetricsMiddleware, UploadSizeLimitMiddleware
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Run processing jobs and reprocess runs in this process unless standalone workers handle them
+    if config.JOB_RUNNER_EMBEDDED:
+        await job_runner.start()
+        await reprocessor.start()
+    yield
+    await reprocessor.stop()
+    await job_runner.stop()
 
 app = FastAPI(
     title="Receipt OCR Processing System",
     version="1.0.0",
-    description="A FastAPI application for processing receipt PDFs using OCR"
+    description="A FastAPI application for processing receipt PDFs using OCR",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
+# Refuse oversized uploads before the multipart body is spooled
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # Add this CORS middleware setup
 app.add_middleware(
     CORSMiddleware,
@@ -17,6 +36,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so request timings include every other middleware
+app.add_middleware(MetricsMiddleware)
+
 # Include the API routes
 app.include_router(router, tags=["receipts"])
 
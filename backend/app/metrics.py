@@ -0,0 +1,158 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Histograms, counters and callback gauges are registered at import time and
+rendered by render(). Metrics are per process: with several API workers,
+scrape each one (or run a single worker behind the scraper).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond DB lookups up to multi-second OCR runs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets"""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """Point-in-time value set directly or read from a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self.callback = None
+        _registry.append(self)
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, callback):
+        """Read the value from callback() on every scrape (it may block, e.g. on the database)"""
+        self.callback = callback
+
+    def render(self) -> list[str]:
+        value = self.value
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                value = float("nan")
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_DURATION = Histogram(
+    "receipts_http_request_duration_seconds", "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+STAGE_DURATION = Histogram(
+    "receipts_stage_duration_seconds", "Time spent in each service stage", ("stage",)
+)
+EXTRACTION_PAGE_DURATION = Histogram(
+    "receipts_extraction_page_seconds", "Per-page extraction time by text source", ("source",)
+)
+WRITE_BATCH_SIZE = Histogram(
+    "receipts_db_write_batch_size", "Write operations committed per group-commit transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+UPLOADS = Counter("receipts_uploads_total", "Uploaded files by outcome", ("result",))
+VALIDATIONS = Counter("receipts_validations_total", "PDF validations by outcome", ("result",))
+PROCESSING = Counter("receipts_processing_total", "Extraction runs by outcome", ("result",))
+SLOW_REQUEST_PROFILES = Counter("receipts_slow_request_profiles_total", "Slow requests captured with cProfile")
+QUEUE_DEPTH = Gauge("receipts_job_queue_depth", "Processing jobs waiting to run")
+
+
+def stage(name: str):
+    """Time a block of code as one service stage"""
+    return STAGE_DURATION.time(stage=name)
@@ -0,0 +1,116 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from app import config, metrics
+
+logger = logging.getLogger(__name__)
+
+# Allowance for multipart boundaries and part headers around the file body
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """Reject oversized request bodies from the Content-Length header before they are read"""
+
+    def __init__(self, app, max_body_bytes: int | None = None, path_limits: dict | None = None):
+        self.app = app
+        self.max_body_bytes = (max_body_bytes or config.MAX_UPLOAD_BYTES) + MULTIPART_OVERHEAD_BYTES
+        # Endpoints that accept many files at once get their own limit
+        if path_limits is None:
+            path_limits = {"/upload/batch": config.MAX_BATCH_UPLOAD_BYTES}
+        self.path_limits = {path: limit + MULTIPART_OVERHEAD_BYTES for path, limit in path_limits.items()}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] in ("POST", "PUT"):
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    limit = self.path_limits.get(scope["path"], self.max_body_bytes)
+                    if value.isdigit() and int(value) > limit:
+                        await self._reject(send)
+                        return
+                    break
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send):
+        """Send a 413 response without touching the request body"""
+        body = json.dumps({"detail": "Request body exceeds maximum upload size"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+class MetricsMiddleware:
+    """Record request latency per route template and profile a sample of slow requests
+
+    With RECEIPTS_PROFILE_SLOW_REQUESTS on, a fraction of requests runs under
+    cProfile (one at a time, since the profiler is per thread). Those slower
+    than RECEIPTS_SLOW_REQUEST_SECONDS are written to RECEIPTS_PROFILE_DIR.
+    The profile covers the event loop thread only; time spent in DB and
+    extraction workers shows up in the stage histograms instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._profiling = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        profiler = None
+        if config.PROFILE_SLOW_REQUESTS and not self._profiling and random.random() < config.PROFILE_SAMPLE_RATE:
+            profiler = cProfile.Profile()
+            self._profiling = True
+            profiler.enable()
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Routing has stored the matched route in the scope by now
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            metrics.REQUEST_DURATION.observe(elapsed, method=scope["method"], route=route_path, status=status)
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                if elapsed >= config.SLOW_REQUEST_SECONDS:
+                    self._save_profile(profiler, scope["method"], route_path, elapsed)
+
+    def _save_profile(self, profiler, method: str, route_path: str, elapsed: float):
+        """Write a slow request's profile and log its top functions"""
+        try:
+            os.makedirs(config.PROFILE_DIR, exist_ok=True)
+            name = re.sub(r"[^A-Za-z0-9]+", "_", f"{method}{route_path}").strip("_")
+            path = os.path.join(config.PROFILE_DIR, f"{int(time.time() * 1000)}-{name}.prof")
+            profiler.dump_stats(path)
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(15)
+            logger.warning("Slow request %s %s took %.3fs, profile saved to %s\n%s",
+                           method, route_path, elapsed, path, summary.getvalue())
+            metrics.SLOW_REQUEST_PROFILES.inc()
+        except Exception:
+            logger.exception("Could not save request profile")
@@ -1,54 +1,627 @@
-import sqlite3
+import asyncio
 import os
-from datetime import datetime
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from app import config, metrics
 
 # Database setup
-DATABASE_PATH = "receipts.db"
+DATABASE_PATH = config.DATABASE_PATH
 
-def init_database():
-    """Initialize the SQLite database with required tables"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
+
+def open_connection(database_path: str) -> sqlite3.Connection:
+    """Open a new connection and apply the performance pragmas"""
+    conn = sqlite3.connect(
+        database_path,
+        timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False,
+    )
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {config.DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout = {config.DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute(f"PRAGMA cache_size = -{config.DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {config.DB_MMAP_SIZE}")
+    return conn
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections tuned for concurrent access"""
+
+    def __init__(self, database_path: str, max_size: int = 8, timeout: float = 30.0):
+        self.database_path = database_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._pid = os.getpid()
+
+    def _connect(self) -> sqlite3.Connection:
+        return open_connection(self.database_path)
+
+    def _reset_after_fork(self):
+        """Drop connections inherited from a parent process without closing them"""
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._pid = os.getpid()
+
+    def acquire(self) -> sqlite3.Connection:
+        """Borrow a connection, opening a new one if none is idle"""
+        if self._pid != os.getpid():
+            self._reset_after_fork()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeoutError(f"No database connection available after {self.timeout}s")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, discarding it if it is unusable"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """Close all idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = ConnectionPool(DATABASE_PATH, config.DB_POOL_SIZE, config.DB_POOL_TIMEOUT)
+
+
+@contextmanager
+def get_db():
+    """Borrow a pooled connection; commit on success and roll back on error"""
+    conn = _pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _pool.release(conn)
+
+
+class WriteBatcher:
+    """Single writer that group-commits concurrent write operations
+
+    Callers hand in operations (functions of a cursor) and block until the
+    transaction containing theirs has committed. The writer thread takes every
+    queued operation, up to `max_batch`, and runs them in one BEGIN IMMEDIATE
+    transaction. Writes that arrive while a batch commits form the next batch,
+    so batches grow with load; a non-zero `window` also waits that long for
+    more operations, trading single-writer latency for bigger batches. Each
+    operation gets its own savepoint, so one that raises is rolled back alone
+    and its caller gets the exception; the rest still commit.
+    """
+
+    def __init__(self, database_path: str, window: float = 0.0, max_batch: int = 256):
+        self.database_path = database_path
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._conn = None
+        self._pid = os.getpid()
+
+    def execute(self, operation):
+        """Run operation(cursor) in the next group commit and return its result"""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((operation, future))
+        return future.result()
+
+    def _ensure_started(self):
+        if self._pid != os.getpid():
+            # Threads do not survive a fork; start a fresh writer in this process
+            self._queue = queue.SimpleQueue()
+            self._thread = None
+            self._conn = None
+            self._pid = os.getpid()
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            metrics.WRITE_BATCH_SIZE.observe(len(batch))
+            self._commit(batch)
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch: list):
+        outcomes = []
+        try:
+            if self._conn is None:
+                self._conn = open_connection(self.database_path)
+                # Transactions are managed explicitly below
+                self._conn.isolation_level = None
+            conn = self._conn
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            for operation, _ in batch:
+                cursor.execute("SAVEPOINT write_op")
+                try:
+                    outcomes.append((operation(cursor), None))
+                except BaseException as e:
+                    cursor.execute("ROLLBACK TO write_op")
+                    outcomes.append((None, e))
+                cursor.execute("RELEASE write_op")
+            cursor.execute("COMMIT")
+        except BaseException as e:
+            if self._conn is not None and self._conn.in_transaction:
+                self._conn.rollback()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        # Results are only handed out once the whole batch is durable
+        for (_, future), (result, error) in zip(batch, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+_write_batcher = WriteBatcher(
+    DATABASE_PATH, config.DB_WRITE_BATCH_WINDOW_MS / 1000, config.DB_WRITE_BATCH_MAX
+)
+
+
+def run_write(operation):
+    """Run operation(cursor) as a write and return its result
+
+    Writes are group-committed by the shared WriteBatcher unless batching is
+    disabled, in which case the operation commits on its own pooled connection.
+    """
+    if not config.DB_WRITE_BATCHING:
+        with get_db() as conn:
+            return operation(conn.cursor())
+    return _write_batcher.execute(operation)
+
+
+# Blocking database work runs here so async handlers never stall the event loop.
+# Sized to the pool so a DB thread never waits for a connection.
+_db_executor = ThreadPoolExecutor(max_workers=config.DB_POOL_SIZE, thread_name_prefix="db")
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call on the DB executor and await its result
     
-    # Create receipt_file table
+    Each call is timed as the stage db.<function name>.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _db_executor, _timed_call, f"db.{getattr(func, '__qualname__', 'call')}", func, args, kwargs
+    )
+
+
+def _timed_call(stage_name: str, func, args, kwargs):
+    with metrics.stage(stage_name):
+        return func(*args, **kwargs)
+
+
+def get_table_version(table: str) -> int:
+    """Current change_counter version of a table; it grows on every insert, update and delete"""
+    with get_db() as conn:
+        row = conn.execute('SELECT version FROM change_counter WHERE table_name = ?', (table,)).fetchone()
+    return row[0] if row else 0
+
+
+def get_row_updated_at(table: str, row_id: int):
+    """updated_at of one row, or None if the row does not exist"""
+    with get_db() as conn:
+        row = conn.execute(f'SELECT updated_at FROM {table} WHERE id = ?', (row_id,)).fetchone()
+    return row[0] if row else None
+
+
+def _add_column_if_missing(cursor, table: str, column: str, definition: str):
+    """Add a column to an existing table unless it is already there"""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+# Tables whose writes are counted in change_counter
+VERSIONED_TABLES = ("receipt", "receipt_file")
+
+# Month of purchase ('YYYY-MM'); queries must use this exact expression to hit its index
+PURCHASE_MONTH_SQL = "substr(purchased_at, 1, 7)"
+
+# Expands new.items into receipt_item rows; used by the receipt triggers
+INSERT_RECEIPT_ITEMS_SQL = '''
+    INSERT INTO receipt_item (receipt_id, position, name, price, quantity, purchased_at)
+    SELECT new.id, key, json_extract(value, '$.name'), json_extract(value, '$.price'),
+           coalesce(json_extract(value, '$.quantity'), 1), new.purchased_at
+    FROM json_each(new.items)
+'''
+
+
+# bm25 weights for merchant_name, receipt_number, items, raw_text
+FTS_RANK = "bm25(10.0, 8.0, 4.0, 1.0)"
+
+# Indexes new.* in receipt_fts, keyed by receipt id; used by the receipt triggers
+INSERT_RECEIPT_FTS_SQL = '''
+    INSERT INTO receipt_fts (rowid, merchant_name, receipt_number, items, raw_text)
+    VALUES (
+        new.id, new.merchant_name, new.receipt_number,
+        (SELECT group_concat(json_extract(value, '$.name'), ' ')
+         FROM json_each(CASE WHEN json_valid(new.items) THEN new.items ELSE '[]' END)),
+        new.raw_text
+    )
+'''
+
+
+# Data migrations, applied in order and tracked with PRAGMA user_version.
+# Schema changes that are safe to repeat stay in init_database().
+def _backfill_receipt_items(cursor):
+    """Copy line items of receipts stored before receipt_item existed"""
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS receipt_file (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            file_name TEXT NOT NULL,
-            file_path TEXT NOT NULL,
-            is_valid BOOLEAN DEFAULT FALSE,
-            invalid_reason TEXT,
-            is_processed BOOLEAN DEFAULT FALSE,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
+        INSERT INTO receipt_item (receipt_id, position, name, price, quantity, purchased_at)
+        SELECT receipt.id, item.key, json_extract(item.value, '$.name'), json_extract(item.value, '$.price'),
+               coalesce(json_extract(item.value, '$.quantity'), 1), receipt.purchased_at
+        FROM receipt, json_each(receipt.items) AS item
+        WHERE json_valid(receipt.items)
+          AND NOT EXISTS (SELECT 1 FROM receipt_item WHERE receipt_item.receipt_id = receipt.id)
     ''')
-    
-    # Create receipt table
+
+
+def _backfill_receipt_fts(cursor):
+    """Index receipts stored before receipt_fts existed"""
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS receipt (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            purchased_at TIMESTAMP,
-            merchant_name TEXT,
-            total_amount REAL,
-            file_path TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            items TEXT,
-            payment_method TEXT,
-            tax_amount REAL,
-            subtotal REAL,
-            receipt_number TEXT,
-            cashier TEXT
+        INSERT INTO receipt_fts (rowid, merchant_name, receipt_number, items, raw_text)
+        SELECT receipt.id, receipt.merchant_name, receipt.receipt_number,
+               (SELECT group_concat(json_extract(value, '$.name'), ' ')
+                FROM json_each(CASE WHEN json_valid(receipt.items) THEN receipt.items ELSE '[]' END)),
+               receipt.raw_text
+        FROM receipt
+        WHERE receipt.id NOT IN (SELECT rowid FROM receipt_fts)
+    ''')
+
+
+def _link_processed_files(cursor):
+    """Set processing_state and receipt_id for files processed before they existed"""
+    cursor.execute('''
+        UPDATE receipt_file
+        SET processing_state = 'processed',
+            receipt_id = coalesce(
+                (SELECT receipt_id FROM processing_job
+                 WHERE processing_job.file_id = receipt_file.id AND status = 'succeeded'
+                 ORDER BY id DESC LIMIT 1),
+                (SELECT id FROM receipt
+                 WHERE receipt.content_hash = receipt_file.content_hash
+                 ORDER BY id DESC LIMIT 1)
+            )
+        WHERE is_processed
+    ''')
+    cursor.execute('''
+        UPDATE receipt_file SET processing_state = 'processing'
+        WHERE NOT is_processed AND id IN (
+            SELECT file_id FROM processing_job WHERE status IN ('queued', 'running')
         )
     ''')
-    
-    conn.commit()
-    conn.close()
 
-def get_db_connection():
-    """Get a database connection"""
-    return sqlite3.connect(DATABASE_PATH)
+
+MIGRATIONS = [
+    _backfill_receipt_items,
+    _backfill_receipt_fts,
+    _link_processed_files,
+]
+
+
+def _run_migrations(cursor):
+    """Apply the migrations this database has not seen yet"""
+    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(cursor)
+        cursor.execute(f'PRAGMA user_version = {number}')
+
+
+def init_database():
+    """Initialize the SQLite database with required tables"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        # Create receipt_file table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS receipt_file (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_name TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                is_valid BOOLEAN DEFAULT FALSE,
+                invalid_reason TEXT,
+                is_processed BOOLEAN DEFAULT FALSE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # Create receipt table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS receipt (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                purchased_at TIMESTAMP,
+                merchant_name TEXT,
+                total_amount REAL,
+                file_path TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                items TEXT,
+                payment_method TEXT,
+                tax_amount REAL,
+                subtotal REAL,
+                receipt_number TEXT,
+                cashier TEXT
+            )
+        ''')
+
+        # Content hashes for deduplicating uploads and their extracted receipts
+        _add_column_if_missing(cursor, "receipt_file", "content_hash", "TEXT")
+        _add_column_if_missing(cursor, "receipt_file", "file_size", "INTEGER")
+        _add_column_if_missing(cursor, "receipt_file", "page_count", "INTEGER")
+        # pending -> processing -> processed (or failed), and the receipt a processed file produced
+        _add_column_if_missing(cursor, "receipt_file", "processing_state", "TEXT NOT NULL DEFAULT 'pending'")
+        _add_column_if_missing(cursor, "receipt_file", "receipt_id", "INTEGER REFERENCES receipt (id)")
+        # Set once the storage tiering sweep has compressed (or skipped) the original
+        _add_column_if_missing(cursor, "receipt_file", "tiered_at", "TIMESTAMP")
+        _add_column_if_missing(cursor, "receipt", "content_hash", "TEXT")
+
+        # Extracted text and per-page extraction timing
+        _add_column_if_missing(cursor, "receipt", "raw_text", "TEXT")
+        _add_column_if_missing(cursor, "receipt", "extraction_stats", "TEXT")
+        # Version of the extractor that produced the row; NULL for receipts stored before it was tracked
+        _add_column_if_missing(cursor, "receipt", "extractor_version", "TEXT")
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_receipt_file_content_hash
+            ON receipt_file (content_hash) WHERE content_hash IS NOT NULL
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_content_hash
+            ON receipt (content_hash) WHERE content_hash IS NOT NULL
+        ''')
+
+        # Keyset pagination over (created_at, id)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_created_at_id
+            ON receipt (created_at, id)
+        ''')
+        
+        # Incremental exports scan receipts changed since a checkpoint
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_updated_at_id
+            ON receipt (updated_at, id)
+        ''')
+        
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_purchased_at
+            ON receipt (purchased_at)
+        ''')
+
+        # /files listing: newest first, optionally filtered by status
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_file_created_at_id
+            ON receipt_file (created_at, id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_file_valid_processed
+            ON receipt_file (is_valid, is_processed, created_at, id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_file_valid
+            ON receipt_file (is_valid, created_at, id)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_file_processed
+            ON receipt_file (is_processed, created_at, id)
+        ''')
+        # Storage tiering sweep: processed files whose original is not compressed yet
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_file_untiered
+            ON receipt_file (updated_at, id) WHERE processing_state = 'processed' AND tiered_at IS NULL
+        ''')
+
+        # Create processing_job table (durable queue for /process)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS processing_job (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                file_id INTEGER NOT NULL REFERENCES receipt_file (id),
+                status TEXT NOT NULL DEFAULT 'queued',
+                receipt_id INTEGER REFERENCES receipt (id),
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_expires_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_processing_job_status
+            ON processing_job (status, id)
+        ''')
+        # /process looks up the job in flight for a file
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_processing_job_file_status
+            ON processing_job (file_id, status)
+        ''')
+
+        # Bulk re-extraction runs; last_receipt_id is the checkpoint a resumed run continues from
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reprocess_run (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                target_version TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                batch_size INTEGER NOT NULL,
+                last_receipt_id INTEGER NOT NULL DEFAULT 0,
+                processed INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                lease_expires_at TIMESTAMP,
+                lease_owner TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        # Token of the reprocessor holding the lease; checkpoints from anyone else are refused
+        _add_column_if_missing(cursor, "reprocess_run", "lease_owner", "TEXT")
+
+        # Line items, normalized out of receipt.items for SQL-side analytics
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS receipt_item (
+                id INTEGER PRIMARY KEY,
+                receipt_id INTEGER NOT NULL REFERENCES receipt (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                name TEXT,
+                price REAL,
+                quantity INTEGER NOT NULL DEFAULT 1,
+                purchased_at TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_item_receipt
+            ON receipt_item (receipt_id, position)
+        ''')
+
+        # receipt.items stays the source of truth; these triggers mirror it into receipt_item
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_receipt_item_insert
+            AFTER INSERT ON receipt WHEN json_valid(new.items)
+            BEGIN
+                {INSERT_RECEIPT_ITEMS_SQL};
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_receipt_item_update
+            AFTER UPDATE OF items, purchased_at ON receipt
+            BEGIN
+                DELETE FROM receipt_item WHERE receipt_id = old.id;
+                {INSERT_RECEIPT_ITEMS_SQL} WHERE json_valid(new.items);
+            END
+        ''')
+
+        # Covering indexes for the /analytics rollups
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_receipt_month_spend
+            ON receipt ({PURCHASE_MONTH_SQL}, purchased_at, total_amount)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_merchant_spend
+            ON receipt (merchant_name, purchased_at, total_amount)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_payment_spend
+            ON receipt (payment_method, purchased_at, total_amount)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_item_name
+            ON receipt_item (name, quantity, price)
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_receipt_item_purchased_name
+            ON receipt_item (purchased_at, name, quantity, price)
+        ''')
+
+        # Full-text search over merchant, receipt number, item names and extracted text
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS receipt_fts USING fts5(
+                merchant_name, receipt_number, items, raw_text,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+        # Rank matches in the merchant and receipt number above the OCR text. Only written when it
+        # changes: the write invalidates the FTS table in every other open connection.
+        stored_rank = cursor.execute("SELECT v FROM receipt_fts_config WHERE k = 'rank'").fetchone()
+        if stored_rank is None or stored_rank[0] != FTS_RANK:
+            cursor.execute(f"INSERT INTO receipt_fts (receipt_fts, rank) VALUES ('rank', '{FTS_RANK}')")
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_receipt_fts_insert
+            AFTER INSERT ON receipt
+            BEGIN
+                {INSERT_RECEIPT_FTS_SQL};
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_receipt_fts_update
+            AFTER UPDATE OF merchant_name, receipt_number, items, raw_text ON receipt
+            BEGIN
+                DELETE FROM receipt_fts WHERE rowid = old.id;
+                {INSERT_RECEIPT_FTS_SQL};
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_receipt_fts_delete
+            AFTER DELETE ON receipt
+            BEGIN
+                DELETE FROM receipt_fts WHERE rowid = old.id;
+            END
+        ''')
+
+        # Per-table write counters, bumped by triggers; list endpoints derive ETags from them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_counter (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+        for table in VERSIONED_TABLES:
+            cursor.execute('INSERT OR IGNORE INTO change_counter (table_name, version) VALUES (?, 0)', (table,))
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE change_counter SET version = version + 1 WHERE table_name = '{table}';
+                    END
+                ''')
+
+        _run_migrations(cursor)
 
 # Initialize database on import
-init_database() 
\ No newline at end of file
+init_database()
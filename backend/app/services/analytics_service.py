@@ -0,0 +1,105 @@
+from datetime import datetime
+from fastapi import HTTPException
+from app.models.database import PURCHASE_MONTH_SQL, get_db
+from app.services.file_service import utc_naive
+from app.services.pagination import clamp_limit
+
+TOP_ITEMS_ORDER = {"spend": "spend", "quantity": "quantity"}
+
+class AnalyticsService:
+    """Spending rollups computed in SQL
+
+    Every query is answered from a covering index (see init_database), so
+    rollups never read receipt rows or decode item JSON.
+    """
+
+    def __init__(self):
+        pass
+
+    def spend_by_merchant(self, purchased_from: datetime | None = None, purchased_to: datetime | None = None,
+                          limit: int = 100):
+        """Receipt count and spend per merchant, biggest spend first"""
+        where, params = _purchased_between(purchased_from, purchased_to)
+        return self._rollup(f'''
+            SELECT merchant_name, COUNT(*), ROUND(SUM(total_amount), 2), ROUND(AVG(total_amount), 2)
+            FROM receipt INDEXED BY idx_receipt_merchant_spend
+            {where}
+            GROUP BY merchant_name
+            ORDER BY 3 DESC
+            LIMIT ?
+        ''', [*params, clamp_limit(limit)], ("merchant_name", "receipts", "total_spend", "average_spend"))
+
+    def spend_by_month(self, purchased_from: datetime | None = None, purchased_to: datetime | None = None):
+        """Receipt count and spend per calendar month of purchase"""
+        # Months are those of the stored naive UTC timestamps, so the bounds are converted first
+        purchased_from = utc_naive(purchased_from) if purchased_from is not None else None
+        purchased_to = utc_naive(purchased_to) if purchased_to is not None else None
+        conditions = [f"{PURCHASE_MONTH_SQL} IS NOT NULL"]
+        month_params = []
+        # Bound the month expression too, so a date range is a range scan of the month index
+        if purchased_from is not None:
+            conditions.append(f"{PURCHASE_MONTH_SQL} >= ?")
+            month_params.append(f"{purchased_from:%Y-%m}")
+        if purchased_to is not None:
+            conditions.append(f"{PURCHASE_MONTH_SQL} <= ?")
+            month_params.append(f"{purchased_to:%Y-%m}")
+        where, params = _purchased_between(purchased_from, purchased_to, *conditions)
+        return self._rollup(f'''
+            SELECT {PURCHASE_MONTH_SQL}, COUNT(*), ROUND(SUM(total_amount), 2)
+            FROM receipt INDEXED BY idx_receipt_month_spend
+            {where}
+            GROUP BY {PURCHASE_MONTH_SQL}
+            ORDER BY {PURCHASE_MONTH_SQL}
+        ''', [*month_params, *params], ("month", "receipts", "total_spend"))
+
+    def spend_by_payment_method(self, purchased_from: datetime | None = None,
+                                purchased_to: datetime | None = None):
+        """Receipt count and spend per payment method"""
+        where, params = _purchased_between(purchased_from, purchased_to)
+        return self._rollup(f'''
+            SELECT payment_method, COUNT(*), ROUND(SUM(total_amount), 2)
+            FROM receipt INDEXED BY idx_receipt_payment_spend
+            {where}
+            GROUP BY payment_method
+            ORDER BY 3 DESC
+        ''', params, ("payment_method", "receipts", "total_spend"))
+
+    def top_items(self, purchased_from: datetime | None = None, purchased_to: datetime | None = None,
+                  order_by: str = "spend", limit: int = 20):
+        """Most bought line items by spend or by quantity"""
+        if order_by not in TOP_ITEMS_ORDER:
+            raise HTTPException(status_code=400, detail="order_by must be spend or quantity")
+        where, params = _purchased_between(purchased_from, purchased_to)
+        # Without a date range the name index streams groups in order; with one the date index narrows the scan
+        index = "idx_receipt_item_purchased_name" if params else "idx_receipt_item_name"
+        return self._rollup(f'''
+            SELECT name, COUNT(*), SUM(quantity) AS quantity, ROUND(SUM(price), 2) AS spend
+            FROM receipt_item INDEXED BY {index}
+            {where}
+            GROUP BY name
+            ORDER BY {TOP_ITEMS_ORDER[order_by]} DESC
+            LIMIT ?
+        ''', [*params, clamp_limit(limit)], ("name", "line_count", "quantity", "total_spend"))
+
+    def _rollup(self, query: str, params: list, columns: tuple) -> list:
+        try:
+            with get_db() as conn:
+                rows = conn.execute(query, params).fetchall()
+
+            return [dict(zip(columns, row)) for row in rows]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error computing analytics: {str(e)}")
+
+
+def _purchased_between(purchased_from: datetime | None, purchased_to: datetime | None,
+                       *conditions: str) -> tuple[str, list]:
+    """WHERE clause restricting purchased_at to [purchased_from, purchased_to)"""
+    conditions = list(conditions)
+    params = []
+    if purchased_from is not None:
+        conditions.append('purchased_at >= ?')
+        params.append(utc_naive(purchased_from))
+    if purchased_to is not None:
+        conditions.append('purchased_at < ?')
+        params.append(utc_naive(purchased_to))
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), params
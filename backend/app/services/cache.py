@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a fixed time
+
+    Used as a read-through cache in front of single-row lookups. Cached values
+    are shared between callers and must be treated as read-only.
+
+    A reader can fetch a row just before a writer commits and invalidates it,
+    then store the stale row afterwards. Readers therefore take generation()
+    before reading and pass it to set(), which drops the value if the key was
+    invalidated in between.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._generation = 0
+        # Generation of each recent invalidation; keys that fell off count as invalidated at the floor
+        self._invalidated = OrderedDict()
+        self._invalidated_floor = 0
+
+    def get(self, key, default=None):
+        """Return a live entry and mark it recently used"""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self) -> int:
+        """Token to take before reading the value that will be passed to set()"""
+        with self._lock:
+            return self._generation
+
+    def set(self, key, value, generation: int | None = None):
+        """Store an entry, evicting the least recently used ones beyond maxsize
+
+        With a generation from generation(), the value is dropped if the key was
+        invalidated after that, since it may predate the change.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and self._invalidated.get(key, self._invalidated_floor) > generation:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop an entry after the row behind it changed"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            while len(self._invalidated) > max(self.maxsize, 1):
+                _, self._invalidated_floor = self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+            self._invalidated.clear()
+            self._invalidated_floor = self._generation
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
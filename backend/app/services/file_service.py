@@ -1,54 +1,202 @@
+import hashlib
 import os
-import shutil
-from datetime import datetime
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException
-from app.models.database import get_db_connection
+from starlette.concurrency import run_in_threadpool
+from app import config, metrics
+from app.extraction.pdf_validator import PdfValidation, validate_pdf
+from app.models.database import get_db, run_write
+from app.services.cache import TTLCache
+from app.services.pagination import clamp_limit, decode_cursor, encode_cursor
+from app.services.projection import dict_rows
+from app.services.storage import get_storage
+
+# receipt_file.processing_state; a file moves to processing when a /process call claims it
+FILE_PENDING = "pending"
+FILE_PROCESSING = "processing"
+FILE_PROCESSED = "processed"
+FILE_FAILED = "failed"
+
+# Fields of /files responses, in response order; also what ?fields= may select
+FILE_FIELDS = (
+    "id", "file_name", "file_path", "is_valid", "invalid_reason", "is_processed", "created_at", "updated_at",
+    "content_hash", "file_size", "page_count", "processing_state", "receipt_id"
+)
+
+# Content hashes per IN (...) lookup, well under SQLite's bound-parameter limit
+HASH_LOOKUP_BATCH = 500
+
+# Rows by file ID, shared by every FileService in this process.
+# Other processes' writes show up once the TTL expires.
+file_cache = TTLCache(config.FILE_CACHE_SIZE, config.FILE_CACHE_TTL)
+
+@dataclass
+class SavedUpload:
+    """Result of streaming an upload to disk"""
+    file_path: str
+    sha256: str
+    size: int
+    # Set when the upload was validated before it was stored
+    validation: PdfValidation | None = None
 
 class FileService:
     def __init__(self):
-        self.upload_dir = "uploads"
-        os.makedirs(self.upload_dir, exist_ok=True)
+        self.storage = get_storage()
+        self.max_upload_bytes = config.MAX_UPLOAD_BYTES
+        self.chunk_size = config.UPLOAD_CHUNK_SIZE
+    
+    async def save_uploaded_file(self, file, filename: str, validate: bool = False) -> SavedUpload:
+        """Stream uploaded file to disk in chunks, hashing and sizing it in the same pass
+        
+        With validate, the PDF structure is checked while the file is still a temp
+        file; an invalid upload is rejected with a 400 and never reaches storage.
+        """
+        with metrics.stage("file_save"):
+            return await self._save_uploaded_file(file, validate)
     
-    def save_uploaded_file(self, file, filename: str) -> str:
-        """Save uploaded file to disk and return file path"""
+    async def _save_uploaded_file(self, file, validate: bool = False) -> SavedUpload:
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = self.storage.create_temp()
         try:
-            # Generate unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_filename = f"{timestamp}_{filename}"
-            file_path = os.path.join(self.upload_dir, unique_filename)
+            with os.fdopen(fd, "wb") as buffer:
+                while True:
+                    chunk = await file.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File exceeds maximum upload size of {self.max_upload_bytes} bytes"
+                        )
+                    # hashlib and file writes release the GIL, so this runs off the event loop
+                    await run_in_threadpool(self._write_chunk, buffer, digest, chunk)
             
-            # Save file
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
+            validation = None
+            if validate:
+                validation = await run_in_threadpool(self._check_temp_pdf, temp_path)
+                if not validation.is_valid:
+                    raise HTTPException(status_code=400, detail=f"Invalid PDF file: {validation.invalid_reason}")
             
-            return file_path
+            saved = self._store_temp_file(temp_path, digest.hexdigest(), size)
+            saved.validation = validation
+            return saved
+        except HTTPException:
+            self._discard(temp_path)
+            raise
         except Exception as e:
+            self._discard(temp_path)
             raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
     
+    def store_file(self, source) -> SavedUpload:
+        """Copy a readable binary file object to disk, hashing and sizing it in the same pass
+        
+        The blocking counterpart of save_uploaded_file, for callers that already run
+        in a worker thread (e.g. a spooled upload or a zip member).
+        """
+        with metrics.stage("file_save"):
+            return self._store_file(source)
+    
+    def _store_file(self, source) -> SavedUpload:
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = self.storage.create_temp()
+        try:
+            with os.fdopen(fd, "wb") as buffer:
+                while True:
+                    chunk = source.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File exceeds maximum upload size of {self.max_upload_bytes} bytes"
+                        )
+                    self._write_chunk(buffer, digest, chunk)
+            
+            return self._store_temp_file(temp_path, digest.hexdigest(), size)
+        except HTTPException:
+            self._discard(temp_path)
+            raise
+        except Exception as e:
+            self._discard(temp_path)
+            raise HTTPException(status_code=500, detail=f"Error saving file: {str(e)}")
+    
+    def _store_temp_file(self, temp_path: str, content_hash: str, size: int) -> SavedUpload:
+        """Move a fully written temp file to its content-addressed path"""
+        # Store by content hash so identical uploads share one file on disk
+        file_path = self.storage.commit(temp_path, content_hash)
+        
+        return SavedUpload(file_path=file_path, sha256=content_hash, size=size)
+    
+    def _write_chunk(self, buffer, digest, chunk: bytes):
+        """Write one chunk and feed it to the running hash"""
+        digest.update(chunk)
+        buffer.write(chunk)
+    
+    def _discard(self, path: str):
+        """Remove a partially written file if it is still there"""
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    
     def validate_file_type(self, filename: str) -> bool:
         """Validate if file is a PDF"""
         if not filename or not filename.lower().endswith('.pdf'):
             return False
         return True
     
+    def check_pdf(self, file_path: str) -> PdfValidation:
+        """Validate the PDF structure of a stored file without reading all of it"""
+        with metrics.stage("pdf_validation"):
+            try:
+                with self.storage.local_path(file_path) as local_path:
+                    validation = validate_pdf(local_path)
+            except FileNotFoundError:
+                validation = PdfValidation(False, "File not found")
+        metrics.VALIDATIONS.inc(result="valid" if validation.is_valid else "invalid")
+        return validation
+    
+    def _check_temp_pdf(self, temp_path: str) -> PdfValidation:
+        """Validate an upload that has not been moved into storage yet"""
+        with metrics.stage("pdf_validation"):
+            validation = validate_pdf(temp_path)
+        metrics.VALIDATIONS.inc(result="valid" if validation.is_valid else "invalid")
+        return validation
+    
     def file_exists(self, file_path: str) -> bool:
         """Check if file exists on disk"""
-        return os.path.exists(file_path)
+        return self.storage.exists(file_path)
     
-    def create_file_record(self, filename: str, file_path: str) -> int:
-        """Create a new file record in database and return file ID"""
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
+    def create_file_record(self, filename: str, file_path: str, content_hash: str | None = None,
+                           file_size: int | None = None) -> int:
+        """Create a new file record in database and return file ID
+        
+        If a record with the same content hash already exists, its ID is returned instead.
+        """
+        def insert(cursor):
             cursor.execute('''
-                INSERT INTO receipt_file (file_name, file_path, is_valid, is_processed, created_at, updated_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (filename, file_path, False, False, datetime.utcnow(), datetime.utcnow()))
+                INSERT INTO receipt_file (
+                    file_name, file_path, is_valid, is_processed, created_at, updated_at,
+                    content_hash, file_size
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (content_hash) WHERE content_hash IS NOT NULL DO NOTHING
+            ''', (filename, file_path, False, False, datetime.utcnow(), datetime.utcnow(),
+                  content_hash, file_size))
             
-            file_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
+            if cursor.rowcount:
+                return cursor.lastrowid
+            # Lost a race with a concurrent upload of the same content
+            cursor.execute('SELECT id FROM receipt_file WHERE content_hash = ?', (content_hash,))
+            return cursor.fetchone()[0]
+        
+        try:
+            # Group-committed with other concurrent writes
+            file_id = run_write(insert)
             
             if file_id is None:
                 raise HTTPException(status_code=500, detail="Failed to create file record")
@@ -57,76 +205,195 @@ class FileService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error creating file record: {str(e)}")
     
+    def create_file_records(self, uploads: list[tuple[str, SavedUpload]]) -> list[tuple[int, bool]]:
+        """Create records for many stored uploads in one transaction
+        
+        Takes (filename, SavedUpload) pairs and returns (file_id, is_duplicate) for each,
+        in order. Content that already has a record, or that appears earlier in the
+        same batch, maps to that record.
+        """
+        try:
+            hashes = list(dict.fromkeys(saved.sha256 for _, saved in uploads))
+            now = datetime.utcnow()
+            
+            def insert(cursor):
+                existing = set()
+                for start in range(0, len(hashes), HASH_LOOKUP_BATCH):
+                    batch = hashes[start:start + HASH_LOOKUP_BATCH]
+                    cursor.execute(f'''
+                        SELECT content_hash FROM receipt_file
+                        WHERE content_hash IN ({", ".join("?" * len(batch))})
+                    ''', batch)
+                    existing.update(row[0] for row in cursor.fetchall())
+                
+                cursor.executemany('''
+                    INSERT INTO receipt_file (
+                        file_name, file_path, is_valid, is_processed, created_at, updated_at,
+                        content_hash, file_size
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (content_hash) WHERE content_hash IS NOT NULL DO NOTHING
+                ''', [(filename, saved.file_path, False, False, now, now, saved.sha256, saved.size)
+                      for filename, saved in uploads])
+                
+                ids = {}
+                for start in range(0, len(hashes), HASH_LOOKUP_BATCH):
+                    batch = hashes[start:start + HASH_LOOKUP_BATCH]
+                    cursor.execute(f'''
+                        SELECT content_hash, id FROM receipt_file
+                        WHERE content_hash IN ({", ".join("?" * len(batch))})
+                    ''', batch)
+                    ids.update(cursor.fetchall())
+                return existing, ids
+            
+            existing, ids = run_write(insert)
+            results = []
+            seen = set(existing)
+            for _, saved in uploads:
+                results.append((ids[saved.sha256], saved.sha256 in seen))
+                seen.add(saved.sha256)
+            return results
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error creating file records: {str(e)}")
+    
     def get_file_record(self, file_id: int):
         """Get file record by ID"""
+        file_record = file_cache.get(file_id)
+        if file_record is not None:
+            return file_record
+        generation = file_cache.generation()
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            with get_db() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('SELECT * FROM receipt_file WHERE id = ?', (file_id,))
+                file_record = cursor.fetchone()
             
-            cursor.execute('SELECT * FROM receipt_file WHERE id = ?', (file_id,))
-            file_record = cursor.fetchone()
+            if file_record is not None:
+                file_cache.set(file_id, file_record, generation)
+            return file_record
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error getting file record: {str(e)}")
+    
+    def get_file_by_hash(self, content_hash: str):
+        """Get file record by content hash"""
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('SELECT * FROM receipt_file WHERE content_hash = ?', (content_hash,))
+                file_record = cursor.fetchone()
             
-            conn.close()
             return file_record
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error getting file record: {str(e)}")
     
-    def update_file_validation(self, file_id: int, is_valid: bool, invalid_reason: str | None = None):
+    def update_file_validation(self, file_id: int, is_valid: bool, invalid_reason: str | None = None,
+                               page_count: int | None = None):
         """Update file validation status"""
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            run_write(lambda cursor: cursor.execute('''
                 UPDATE receipt_file 
-                SET is_valid = ?, invalid_reason = ?, updated_at = ?
+                SET is_valid = ?, invalid_reason = ?, page_count = ?, updated_at = ?
                 WHERE id = ?
-            ''', (is_valid, invalid_reason, datetime.utcnow(), file_id))
-            
-            conn.commit()
-            conn.close()
+            ''', (is_valid, invalid_reason, page_count, datetime.utcnow(), file_id)))
+            file_cache.invalidate(file_id)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error updating file validation: {str(e)}")
     
-    def mark_file_processed(self, file_id: int):
-        """Mark file as processed"""
+    def mark_file_processed(self, file_id: int, receipt_id: int | None = None):
+        """Mark file as processed, linking it to the receipt extracted from it"""
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
+            run_write(lambda cursor: cursor.execute('''
                 UPDATE receipt_file 
-                SET is_processed = ?, updated_at = ?
+                SET is_processed = ?, processing_state = ?, receipt_id = coalesce(?, receipt_id), updated_at = ?
                 WHERE id = ?
-            ''', (True, datetime.utcnow(), file_id))
-            
-            conn.commit()
-            conn.close()
+            ''', (True, FILE_PROCESSED, receipt_id, datetime.utcnow(), file_id)))
+            file_cache.invalidate(file_id)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error marking file as processed: {str(e)}")
     
-    def get_all_files(self):
-        """Get all file records"""
-        try:
-            conn = get_db_connection()
+    def get_files_to_tier(self, older_than: float, limit: int = 500) -> list[tuple[int, str]]:
+        """(id, file_path) of files processed more than older_than seconds ago that the tiering sweep has not handled"""
+        with get_db() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('SELECT * FROM receipt_file ORDER BY created_at DESC')
+            cursor.execute('''
+                SELECT id, file_path FROM receipt_file
+                WHERE processing_state = ? AND tiered_at IS NULL AND updated_at < ?
+                ORDER BY updated_at, id
+                LIMIT ?
+            ''', (FILE_PROCESSED, datetime.utcnow() - timedelta(seconds=older_than), limit))
+            return cursor.fetchall()
+    
+    def mark_files_tiered(self, file_ids: list[int]):
+        """Record that the tiering sweep handled these files"""
+        now = datetime.utcnow()
+        run_write(lambda cursor: cursor.executemany(
+            'UPDATE receipt_file SET tiered_at = ? WHERE id = ?', [(now, file_id) for file_id in file_ids]
+        ))
+        for file_id in file_ids:
+            file_cache.invalidate(file_id)
+    
+    def get_all_files(self, limit: int = 100, page_cursor: str | None = None, is_valid: bool | None = None,
+                      is_processed: bool | None = None, created_from: datetime | None = None,
+                      created_to: datetime | None = None, fields: tuple = FILE_FIELDS):
+        """Get file records newest first, filtered and paginated by keyset cursor, reading only `fields`"""
+        try:
+            limit = clamp_limit(limit)
+            conditions = []
+            params = []
+            if is_valid is not None:
+                conditions.append('is_valid = ?')
+                params.append(is_valid)
+            if is_processed is not None:
+                conditions.append('is_processed = ?')
+                params.append(is_processed)
+            if created_from is not None:
+                conditions.append('created_at >= ?')
+                params.append(utc_naive(created_from))
+            if created_to is not None:
+                conditions.append('created_at < ?')
+                params.append(utc_naive(created_to))
+            if page_cursor:
+                conditions.append('(created_at, id) < (?, ?)')
+                params.extend(decode_cursor(page_cursor, 2))
+            
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            # The next cursor is built from the last row's created_at and id
+            columns = fields if "created_at" in fields else (*fields, "created_at")
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = dict_rows(columns)
+                
+                # Fetch one extra row to know whether there is a next page
+                cursor.execute(f'''
+                    SELECT {", ".join(columns)} FROM receipt_file
+                    {where}
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT ?
+                ''', (*params, limit + 1))
+                files = cursor.fetchall()
+            
+            next_cursor = None
+            if len(files) > limit:
+                files = files[:limit]
+                next_cursor = encode_cursor(files[-1]["created_at"], files[-1]["id"])
             
-            files = []
-            for row in cursor.fetchall():
-                files.append({
-                    "id": row[0],
-                    "file_name": row[1],
-                    "file_path": row[2],
-                    "is_valid": row[3],
-                    "invalid_reason": row[4],
-                    "is_processed": row[5],
-                    "created_at": row[6],
-                    "updated_at": row[7]
-                })
+            if columns is not fields:
+                for record in files:
+                    del record["created_at"]
             
-            conn.close()
-            return files
+            return {
+                "files": files,
+                "next_cursor": next_cursor
+            }
+        except HTTPException:
+            raise
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error getting all files: {str(e)}") 
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"Error getting all files: {str(e)}")
+
+def utc_naive(value: datetime) -> datetime:
+    """Convert to naive UTC, the form timestamps are stored in"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
\ No newline at end of file
@@ -0,0 +1,192 @@
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from app import config
+from app.models.database import get_db, run_write
+from app.services.file_service import FILE_FAILED, FILE_PROCESSED, FILE_PROCESSING, file_cache
+from app.services.receipt_service import ReceiptService, invalidate_receipt_count
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+# Outcomes of JobService.claim_processing
+CLAIM_QUEUED = "queued"
+CLAIM_IN_FLIGHT = "in_flight"
+CLAIM_PROCESSED = "processed"
+
+JOB_COLUMNS = (
+    "id", "file_id", "status", "receipt_id", "error", "attempts",
+    "created_at", "updated_at", "started_at", "finished_at"
+)
+
+class JobService:
+    def __init__(self):
+        self.receipt_service = ReceiptService()
+
+    def claim_processing(self, file_id: int) -> tuple[str, int]:
+        """Atomically move a file to processing and queue its job, unless that already happened
+        
+        Returns (CLAIM_PROCESSED, receipt_id) for a file that already has its receipt,
+        (CLAIM_IN_FLIGHT, job_id) for the job another caller queued and that has not
+        finished, or (CLAIM_QUEUED, job_id) for a newly queued job. The state change and
+        the job insert commit together, so concurrent and retried calls share one job.
+        """
+        def claim(cursor):
+            now = datetime.utcnow()
+            cursor.execute('''
+                UPDATE receipt_file SET processing_state = ?, updated_at = ?
+                WHERE id = ?
+                  AND NOT (processing_state = ? AND receipt_id IS NOT NULL)
+                  AND NOT EXISTS (SELECT 1 FROM processing_job WHERE file_id = ? AND status IN (?, ?))
+                RETURNING id
+            ''', (FILE_PROCESSING, now, file_id, FILE_PROCESSED, file_id, JOB_QUEUED, JOB_RUNNING))
+            if cursor.fetchone():
+                cursor.execute('''
+                    INSERT INTO processing_job (file_id, status, created_at, updated_at)
+                    VALUES (?, ?, ?, ?)
+                ''', (file_id, JOB_QUEUED, now, now))
+                return CLAIM_QUEUED, cursor.lastrowid
+            
+            cursor.execute('''
+                SELECT id FROM processing_job WHERE file_id = ? AND status IN (?, ?)
+                ORDER BY id DESC LIMIT 1
+            ''', (file_id, JOB_QUEUED, JOB_RUNNING))
+            row = cursor.fetchone()
+            if row:
+                return CLAIM_IN_FLIGHT, row[0]
+            cursor.execute('SELECT receipt_id FROM receipt_file WHERE id = ?', (file_id,))
+            return CLAIM_PROCESSED, cursor.fetchone()[0]
+
+        try:
+            outcome = run_write(claim)
+            if outcome[0] == CLAIM_QUEUED:
+                file_cache.invalidate(file_id)
+            return outcome
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error queueing job: {str(e)}")
+
+    def get_job(self, job_id: int):
+        """Get job by ID"""
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute(f'SELECT {", ".join(JOB_COLUMNS)} FROM processing_job WHERE id = ?', (job_id,))
+                row = cursor.fetchone()
+
+            return dict(zip(JOB_COLUMNS, row)) if row else None
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error getting job: {str(e)}")
+
+    def list_jobs(self, status: str | None = None, limit: int = 100):
+        """List the most recent jobs, optionally filtered by status"""
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+
+                query = f'SELECT {", ".join(JOB_COLUMNS)} FROM processing_job'
+                params = []
+                if status:
+                    query += ' WHERE status = ?'
+                    params.append(status)
+                query += ' ORDER BY id DESC LIMIT ?'
+                params.append(limit)
+                cursor.execute(query, params)
+
+                return [dict(zip(JOB_COLUMNS, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error listing jobs: {str(e)}")
+
+    def queue_depth(self) -> int:
+        """Number of jobs waiting to run"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM processing_job WHERE status = ?', (JOB_QUEUED,))
+            return cursor.fetchone()[0]
+
+    def claim_next(self):
+        """Atomically claim the oldest runnable job
+
+        Queued jobs and running jobs whose lease expired (their worker died) are
+        both runnable, so several runner processes can share the table safely.
+        Returns (job_id, file_id, attempts, file_path, content_hash) or None.
+        """
+        def claim(cursor):
+            now = datetime.utcnow()
+            cursor.execute('''
+                UPDATE processing_job
+                SET status = ?, attempts = attempts + 1, started_at = ?,
+                    lease_expires_at = ?, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM processing_job
+                    WHERE status = ? OR (status = ? AND lease_expires_at < ?)
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING id, file_id, attempts
+            ''', (JOB_RUNNING, now, now + timedelta(seconds=config.JOB_LEASE_SECONDS), now,
+                  JOB_QUEUED, JOB_RUNNING, now))
+            claimed = cursor.fetchone()
+            if not claimed:
+                return None
+
+            cursor.execute('SELECT file_path, content_hash FROM receipt_file WHERE id = ?', (claimed[1],))
+            file_path, content_hash = cursor.fetchone()
+
+            return (*claimed, file_path, content_hash)
+
+        return run_write(claim)
+
+    def complete_job(self, job_id: int, file_id: int, receipt_data: dict, content_hash: str | None) -> int:
+        """Store the extracted receipt, mark the file processed and finish the job in one transaction
+        
+        If the file got its receipt meanwhile (a job retried after its lease expired while
+        the first attempt was still running), that receipt is kept and no duplicate is stored.
+        """
+        def complete(cursor):
+            now = datetime.utcnow()
+            cursor.execute('''
+                UPDATE receipt_file SET is_processed = ?, processing_state = ?, updated_at = ?
+                WHERE id = ?
+                RETURNING receipt_id
+            ''', (True, FILE_PROCESSED, now, file_id))
+            row = cursor.fetchone()
+            receipt_id = row[0] if row else None
+            if receipt_id is None:
+                receipt_id = self.receipt_service.insert_receipt(cursor, receipt_data, content_hash)
+                cursor.execute('UPDATE receipt_file SET receipt_id = ? WHERE id = ?', (receipt_id, file_id))
+            cursor.execute('''
+                UPDATE processing_job
+                SET status = ?, receipt_id = ?, error = NULL, updated_at = ?, finished_at = ?
+                WHERE id = ?
+            ''', (JOB_SUCCEEDED, receipt_id, now, now, job_id))
+            return receipt_id
+
+        receipt_id = run_write(complete)
+        file_cache.invalidate(file_id)
+        invalidate_receipt_count()
+        return receipt_id
+
+    def fail_job(self, job_id: int, error: str, retry: bool = False):
+        """Record a job failure, putting it back in the queue when it should be retried"""
+        def fail(cursor):
+            now = datetime.utcnow()
+            cursor.execute('''
+                UPDATE processing_job
+                SET status = ?, error = ?, lease_expires_at = NULL, updated_at = ?, finished_at = ?
+                WHERE id = ?
+                RETURNING file_id
+            ''', (JOB_QUEUED if retry else JOB_FAILED, error, now, None if retry else now, job_id))
+            row = cursor.fetchone()
+            if retry or not row:
+                return None
+            # The next /process call claims the file again
+            cursor.execute('''
+                UPDATE receipt_file SET processing_state = ?, updated_at = ?
+                WHERE id = ? AND processing_state = ?
+            ''', (FILE_FAILED, now, row[0], FILE_PROCESSING))
+            return row[0]
+
+        file_id = run_write(fail)
+        if file_id is not None:
+            file_cache.invalidate(file_id)
@@ -0,0 +1,41 @@
+import json
+from fastapi import HTTPException
+
+
+def parse_fields(fields: str | None, allowed: tuple) -> tuple:
+    """Columns for a ?fields= projection, in the order of `allowed`
+
+    No (or an empty) projection selects every allowed field; id is always included.
+    """
+    if not fields:
+        return allowed
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    requested.add("id")
+    return tuple(name for name in allowed if name in requested)
+
+
+def dict_rows(columns: tuple):
+    """sqlite3 row factory building dicts keyed by `columns`, the query's selected columns"""
+    def factory(cursor, row):
+        return dict(zip(columns, row))
+    return factory
+
+
+def project(record: dict, columns: tuple) -> dict:
+    """Restrict a full response dict (e.g. a cached one) to a projection"""
+    if len(columns) == len(record):
+        return record
+    return {name: record[name] for name in columns}
+
+
+def load_json_column(value, default):
+    """Decode a JSON text column, falling back to `default` when it is empty or malformed"""
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        return default
@@ -1,144 +1,392 @@
+import csv
+import io
 import json
+import logging
+import re
+import time
 from datetime import datetime
 from fastapi import HTTPException
-from app.models.database import get_db_connection
+from app import config
+from app.extraction.engine import ExtractionError, get_engine
+from app.extraction.parser import PARSER_VERSION, parse_receipt_text
+from app.models.database import get_db, run_write
+from app.services.cache import TTLCache
+from app.services.file_service import FILE_PROCESSED, file_cache, utc_naive
+from app.services.pagination import clamp_limit, decode_cursor, encode_cursor
+from app.services.projection import dict_rows, load_json_column
+from app.services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Cached exact receipt count, shared by every ReceiptService in this process
+_count_cache = {"value": None, "expires_at": 0.0}
+
+# Receipt dicts by ID; receipts rarely change once extracted
+receipt_cache = TTLCache(config.RECEIPT_CACHE_SIZE, config.RECEIPT_CACHE_TTL)
+
+# Words of a search query; each one becomes a quoted FTS5 prefix term
+SEARCH_TERM_PATTERN = re.compile(r"\w+")
+MAX_SEARCH_TERMS = 16
+SEARCH_COLUMNS = ("id", "merchant_name", "purchased_at", "total_amount", "receipt_number", "snippet", "rank")
+
+# Stored with every receipt; receipts from other versions are picked up by /admin/reprocess
+EXTRACTOR_VERSION = PARSER_VERSION
+
+# Fields of /receipts list entries, in response order; also what ?fields= may select
+RECEIPT_FIELDS = (
+    "id", "purchased_at", "merchant_name", "total_amount", "file_path", "created_at", "updated_at",
+    "items", "payment_method", "tax_amount", "subtotal", "receipt_number", "cashier", "content_hash"
+)
+# A single receipt additionally carries its extraction details
+RECEIPT_DETAIL_FIELDS = RECEIPT_FIELDS + ("extraction_stats", "extractor_version")
+
+EXPORT_COLUMNS = (
+    "id", "purchased_at", "merchant_name", "total_amount", "tax_amount", "subtotal",
+    "payment_method", "receipt_number", "cashier", "file_path", "created_at", "updated_at", "items"
+)
+# Malformed items text is exported as an empty list, so every NDJSON line stays valid JSON
+EXPORT_SELECT = ", ".join(EXPORT_COLUMNS[:-1]) + ", CASE WHEN json_valid(items) THEN items ELSE '[]' END"
+
+def invalidate_receipt_count():
+    """Drop the cached receipt count; call after a write that added receipts has committed"""
+    _count_cache["value"] = None
+
+def extract_receipt_data(file_path: str, content_hash: str | None = None) -> dict:
+    """Extract receipt fields from a receipt file
+    
+    Runs in the job runner's process pool, so it must stay a picklable module-level function.
+    Passing the file's known content_hash spares the OCR cache from hashing it again.
+    """
+    # Originals may be stored compressed; the engines' tools need a plain PDF on disk
+    with get_storage().local_path(file_path) as local_path:
+        result = get_engine().extract(local_path, content_hash)
+    text = result.text
+    if not text.strip():
+        raise ExtractionError("No text could be extracted from the file")
+    
+    fields = parse_receipt_text(text)
+    stats = result.stats()
+    logger.info("Extracted %s in %.1fms: %s", file_path, result.total_ms,
+                ", ".join(f"page {page['page_number']} {page['source']} {page['total_ms']}ms"
+                          for page in stats["pages"]))
+    return {
+        **fields,
+        "file_path": file_path,
+        "items": json.dumps(fields["items"]),
+        "raw_text": text,
+        "extraction_stats": json.dumps(stats),
+        "extractor_version": EXTRACTOR_VERSION
+    }
 
 class ReceiptService:
     def __init__(self):
         pass
     
-    def create_receipt(self, file_path: str) -> int:
-        """Create a new receipt record and return receipt ID"""
+    def insert_receipt(self, cursor, receipt_data: dict, content_hash: str | None = None) -> int:
+        """Insert extracted receipt data using the caller's cursor and return receipt ID
+        
+        The caller calls invalidate_receipt_count() once its transaction has committed.
+        """
+        cursor.execute('''
+            INSERT INTO receipt (
+                purchased_at, merchant_name, total_amount, file_path, 
+                items, payment_method, tax_amount, subtotal, 
+                receipt_number, cashier, created_at, updated_at, content_hash,
+                raw_text, extraction_stats, extractor_version
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            receipt_data["purchased_at"], receipt_data["merchant_name"], 
+            receipt_data["total_amount"], receipt_data["file_path"],
+            receipt_data["items"], receipt_data["payment_method"],
+            receipt_data["tax_amount"], receipt_data["subtotal"],
+            receipt_data["receipt_number"], receipt_data["cashier"],
+            datetime.utcnow(), datetime.utcnow(), content_hash,
+            receipt_data.get("raw_text"), receipt_data.get("extraction_stats"),
+            receipt_data.get("extractor_version")
+        ))
+        
+        return cursor.lastrowid
+    
+    def update_extracted_fields(self, cursor, updates: list[tuple[int, dict]]):
+        """Overwrite the extracted fields of existing receipts in place, using the caller's cursor
+        
+        Takes (receipt_id, receipt_data) pairs. The caller invalidates receipt_cache after committing.
+        """
+        now = datetime.utcnow()
+        cursor.executemany('''
+            UPDATE receipt
+            SET purchased_at = ?, merchant_name = ?, total_amount = ?, items = ?, payment_method = ?,
+                tax_amount = ?, subtotal = ?, receipt_number = ?, cashier = ?, raw_text = ?,
+                extraction_stats = ?, extractor_version = ?, updated_at = ?
+            WHERE id = ?
+        ''', [
+            (data["purchased_at"], data["merchant_name"], data["total_amount"], data["items"],
+             data["payment_method"], data["tax_amount"], data["subtotal"], data["receipt_number"],
+             data["cashier"], data.get("raw_text"), data.get("extraction_stats"),
+             data.get("extractor_version"), now, receipt_id)
+            for receipt_id, data in updates
+        ])
+    
+    def get_receipt(self, receipt_id: int):
+        """Get receipt by ID
+        
+        Served from receipt_cache when possible; the returned dict is shared and must not be modified.
+        """
+        receipt = receipt_cache.get(receipt_id)
+        if receipt is not None:
+            return receipt
+        generation = receipt_cache.generation()
         try:
-            # Create mock receipt data (in real implementation, this would use OCR)
-            receipt_data = {
-                "purchased_at": datetime.utcnow(),
-                "merchant_name": "Sample Store",
-                "total_amount": 25.99,
-                "file_path": file_path,
-                "items": json.dumps([{"name": "Sample Item", "price": 25.99}]),
-                "payment_method": "CREDIT",
-                "tax_amount": 2.08,
-                "subtotal": 23.91,
-                "receipt_number": "12345",
-                "cashier": "John Doe"
-            }
-            
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = dict_rows(RECEIPT_DETAIL_FIELDS)
+                
+                cursor.execute(f'SELECT {", ".join(RECEIPT_DETAIL_FIELDS)} FROM receipt WHERE id = ?', (receipt_id,))
+                receipt = cursor.fetchone()
             
-            # Insert into receipt table
-            cursor.execute('''
-                INSERT INTO receipt (
-                    purchased_at, merchant_name, total_amount, file_path, 
-                    items, payment_method, tax_amount, subtotal, 
-                    receipt_number, cashier, created_at, updated_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                receipt_data["purchased_at"], receipt_data["merchant_name"], 
-                receipt_data["total_amount"], receipt_data["file_path"],
-                receipt_data["items"], receipt_data["payment_method"],
-                receipt_data["tax_amount"], receipt_data["subtotal"],
-                receipt_data["receipt_number"], receipt_data["cashier"],
-                datetime.utcnow(), datetime.utcnow()
-            ))
-            
-            receipt_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            
-            if receipt_id is None:
-                raise HTTPException(status_code=500, detail="Failed to create receipt record")
+            if not receipt:
+                return None
             
-            return receipt_id
+            receipt["items"] = load_json_column(receipt["items"], [])
+            receipt["extraction_stats"] = load_json_column(receipt["extraction_stats"], None)
+            receipt_cache.set(receipt_id, receipt, generation)
+            return receipt
             
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error creating receipt: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error getting receipt: {str(e)}")
     
-    def get_receipt(self, receipt_id: int):
-        """Get receipt by ID"""
+    def get_receipt_id_by_hash(self, content_hash: str) -> int | None:
+        """Get the ID of the most recent receipt extracted from a file with this content hash"""
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
+            with get_db() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute('''
+                    SELECT id FROM receipt WHERE content_hash = ?
+                    ORDER BY id DESC LIMIT 1
+                ''', (content_hash,))
+                row = cursor.fetchone()
             
-            cursor.execute('SELECT * FROM receipt WHERE id = ?', (receipt_id,))
-            row = cursor.fetchone()
+            return row[0] if row else None
             
-            conn.close()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error getting receipt: {str(e)}")
+    
+    def ingest_receipt(self, filename: str, file_path: str, content_hash: str, file_size: int,
+                       receipt_data: dict, page_count: int | None = None) -> tuple[int, int]:
+        """Record a validated, extracted upload and its receipt in one transaction
+        
+        Returns (file_id, receipt_id). An existing record for the same content is
+        marked valid and processed, and a receipt extracted from it meanwhile is kept.
+        """
+        def ingest(cursor):
+            now = datetime.utcnow()
+            cursor.execute('''
+                INSERT INTO receipt_file (
+                    file_name, file_path, is_valid, is_processed, created_at, updated_at,
+                    content_hash, file_size, page_count
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (content_hash) WHERE content_hash IS NOT NULL DO UPDATE SET
+                    is_valid = excluded.is_valid, invalid_reason = NULL, page_count = excluded.page_count,
+                    is_processed = excluded.is_processed, updated_at = excluded.updated_at
+                RETURNING id
+            ''', (filename, file_path, True, True, now, now, content_hash, file_size, page_count))
+            file_id = cursor.fetchone()[0]
             
-            if not row:
-                return None
+            # A concurrent request may have extracted the same content first
+            cursor.execute('''
+                SELECT id FROM receipt WHERE content_hash = ?
+                ORDER BY id DESC LIMIT 1
+            ''', (content_hash,))
+            row = cursor.fetchone()
+            receipt_id = row[0] if row else self.insert_receipt(cursor, receipt_data, content_hash)
+            cursor.execute('''
+                UPDATE receipt_file SET processing_state = ?, receipt_id = ? WHERE id = ?
+            ''', (FILE_PROCESSED, receipt_id, file_id))
+            return file_id, receipt_id
+        
+        file_id, receipt_id = run_write(ingest)
+        file_cache.invalidate(file_id)
+        invalidate_receipt_count()
+        return file_id, receipt_id
+    
+    def count_receipts(self) -> int:
+        """Exact number of receipts, cached for a few seconds"""
+        now = time.monotonic()
+        if _count_cache["value"] is None or now >= _count_cache["expires_at"]:
+            with get_db() as conn:
+                total = conn.execute('SELECT COUNT(*) FROM receipt').fetchone()[0]
+            _count_cache.update(value=total, expires_at=now + config.COUNT_CACHE_SECONDS)
+        return _count_cache["value"]
+    
+    def search_receipts(self, query: str, limit: int = 20, page_cursor: str | None = None):
+        """Full-text search over merchant, receipt number, item names and extracted text
+        
+        Every word matches as a prefix and all words must match. Results are ranked
+        best first; pass the previous page's next_cursor to continue.
+        """
+        match = build_search_query(query)
+        if match is None:
+            raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+        limit = clamp_limit(limit)
+        offset = decode_cursor(page_cursor, 1)[0] if page_cursor else 0
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                
+                # Rank on the FTS index alone, then join only the page of hits
+                cursor.execute('''
+                    SELECT receipt.id, receipt.merchant_name, receipt.purchased_at, receipt.total_amount,
+                           receipt.receipt_number, hit.snippet, hit.rank
+                    FROM (
+                        SELECT rowid, rank, snippet(receipt_fts, -1, '[', ']', '...', 10) AS snippet
+                        FROM receipt_fts
+                        WHERE receipt_fts MATCH ?
+                        ORDER BY rank
+                        LIMIT ? OFFSET ?
+                    ) AS hit
+                    JOIN receipt ON receipt.id = hit.rowid
+                    ORDER BY hit.rank
+                ''', (match, limit + 1, offset))
+                rows = cursor.fetchall()
             
-            # Parse items as array
-            try:
-                items = json.loads(row[7]) if row[7] else []
-            except Exception:
-                items = []
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(offset + limit)
             
             return {
-                "id": row[0],
-                "purchased_at": row[1],
-                "merchant_name": row[2],
-                "total_amount": row[3],
-                "file_path": row[4],
-                "created_at": row[5],
-                "updated_at": row[6],
-                "items": items,
-                "payment_method": row[8],
-                "tax_amount": row[9],
-                "subtotal": row[10],
-                "receipt_number": row[11],
-                "cashier": row[12]
+                "results": [dict(zip(SEARCH_COLUMNS, row)) for row in rows],
+                "next_cursor": next_cursor
             }
-            
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error getting receipt: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error searching receipts: {str(e)}")
     
-    def get_all_receipts(self, skip: int = 0, limit: int = 100):
-        """Get all receipts with pagination"""
+    def get_all_receipts(self, skip: int = 0, limit: int = 100, page_cursor: str | None = None,
+                         include_total: bool = True, fields: tuple = RECEIPT_FIELDS):
+        """Get receipts newest first with keyset pagination
+        
+        Pass the previous page's next_cursor to continue; skip is kept for older
+        clients but gets slower the deeper it goes. Only `fields` are read, and
+        items are only decoded when they are among them.
+        """
         try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Get total count
-            cursor.execute('SELECT COUNT(*) FROM receipt')
-            total = cursor.fetchone()[0]
+            limit = clamp_limit(limit)
+            # The next cursor is built from the last row's created_at and id
+            columns = fields if "created_at" in fields else (*fields, "created_at")
+            select = f'SELECT {", ".join(columns)} FROM receipt'
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = dict_rows(columns)
+                
+                # Fetch one extra row to know whether there is a next page
+                if page_cursor:
+                    created_at, last_id = decode_cursor(page_cursor, 2)
+                    cursor.execute(f'''
+                        {select}
+                        WHERE (created_at, id) < (?, ?)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    ''', (created_at, last_id, limit + 1))
+                else:
+                    cursor.execute(f'''
+                        {select}
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ? OFFSET ?
+                    ''', (limit + 1, skip))
+                receipts = cursor.fetchall()
             
-            # Get receipts with pagination
-            cursor.execute('''
-                SELECT * FROM receipt 
-                ORDER BY created_at DESC 
-                LIMIT ? OFFSET ?
-            ''', (limit, skip))
-            
-            receipts = []
-            for row in cursor.fetchall():
-                try:
-                    items = json.loads(row[7]) if row[7] else []
-                except Exception:
-                    items = []
-                receipts.append({
-                    "id": row[0],
-                    "purchased_at": row[1],
-                    "merchant_name": row[2],
-                    "total_amount": row[3],
-                    "file_path": row[4],
-                    "created_at": row[5],
-                    "updated_at": row[6],
-                    "items": items,
-                    "payment_method": row[8],
-                    "tax_amount": row[9],
-                    "subtotal": row[10],
-                    "receipt_number": row[11],
-                    "cashier": row[12]
-                })
+            next_cursor = None
+            if len(receipts) > limit:
+                receipts = receipts[:limit]
+                next_cursor = encode_cursor(receipts[-1]["created_at"], receipts[-1]["id"])
             
-            conn.close()
+            if columns is not fields:
+                for receipt in receipts:
+                    del receipt["created_at"]
+            if "items" in fields:
+                for receipt in receipts:
+                    receipt["items"] = load_json_column(receipt["items"], [])
             
             return {
                 "receipts": receipts,
-                "total": total
+                "total": self.count_receipts() if include_total else None,
+                "next_cursor": next_cursor
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error listing receipts: {str(e)}") 
\ No newline at end of file
+            raise HTTPException(status_code=500, detail=f"Error listing receipts: {str(e)}") 
+    
+    def iter_export(self, export_format: str = "ndjson", purchased_from: datetime | None = None,
+                    purchased_to: datetime | None = None, since: datetime | None = None,
+                    batch_size: int = config.EXPORT_BATCH_SIZE):
+        """Stream receipts as NDJSON lines or CSV rows, one batch at a time
+        
+        Only one batch of rows is held in memory, and each batch is read on its own
+        connection with a keyset condition, so a slow download holds neither a
+        pooled connection nor a read snapshot between batches. With since, rows
+        updated after that time are returned in update order, so the last row's
+        updated_at is the checkpoint for the next incremental export.
+        """
+        conditions = []
+        params = []
+        if purchased_from is not None:
+            conditions.append('purchased_at >= ?')
+            params.append(utc_naive(purchased_from))
+        if purchased_to is not None:
+            conditions.append('purchased_at < ?')
+            params.append(utc_naive(purchased_to))
+        if since is not None:
+            conditions.append('updated_at > ?')
+            params.append(utc_naive(since))
+        # Each batch continues after the previous batch's last row
+        if since is not None:
+            order = "updated_at, id"
+            keyset = '(updated_at, id) > (?, ?)'
+            key_columns = (EXPORT_COLUMNS.index("updated_at"), EXPORT_COLUMNS.index("id"))
+        else:
+            order = "id"
+            keyset = 'id > ?'
+            key_columns = (EXPORT_COLUMNS.index("id"),)
+        
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue()
+        
+        last_key = None
+        while True:
+            batch_conditions = conditions if last_key is None else [*conditions, keyset]
+            where = f"WHERE {' AND '.join(batch_conditions)}" if batch_conditions else ""
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f'SELECT {EXPORT_SELECT} FROM receipt {where} ORDER BY {order} LIMIT ?',
+                    [*params, *(last_key or ()), batch_size]
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                break
+            last_key = tuple(rows[-1][index] for index in key_columns)
+            if export_format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(rows)
+                yield buffer.getvalue()
+            else:
+                yield "".join(_ndjson_line(row) for row in rows)
+            if len(rows) < batch_size:
+                break
+
+def build_search_query(query: str) -> str | None:
+    """Turn free text into an FTS5 query of quoted prefix terms, or None if it has no words"""
+    terms = SEARCH_TERM_PATTERN.findall(query or "")[:MAX_SEARCH_TERMS]
+    return " ".join(f'"{term}"*' for term in terms) or None
+
+def _ndjson_line(row) -> str:
+    """Serialize an export row, splicing the items JSON in without decoding it (EXPORT_SELECT validated it)"""
+    record = json.dumps(dict(zip(EXPORT_COLUMNS[:-1], row[:-1])), separators=(",", ":"))
+    return f'{record[:-1]},"items":{row[-1]}}}\n'
\ No newline at end of file
@@ -0,0 +1,232 @@
+import uuid
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from app import config
+from app.models.database import get_db, run_write
+from app.services.receipt_service import EXTRACTOR_VERSION, ReceiptService, receipt_cache
+
+RUN_PENDING = "pending"
+RUN_RUNNING = "running"
+RUN_PAUSED = "paused"
+RUN_COMPLETED = "completed"
+# Unfinished run for an older extractor version, replaced by a run for the current one
+RUN_SUPERSEDED = "superseded"
+
+RUN_COLUMNS = (
+    "id", "target_version", "status", "batch_size", "last_receipt_id", "processed", "failed",
+    "last_error", "created_at", "updated_at", "started_at", "finished_at"
+)
+
+class ReprocessService:
+    """Bookkeeping for bulk re-extraction runs
+
+    A run walks the receipt table in id order and re-extracts every receipt
+    whose extractor_version differs from the run's target. Each batch's
+    updates and the run's checkpoint (last_receipt_id) commit together, so a
+    run that stops for any reason resumes after its last finished batch.
+    Runs are leased like processing jobs, so a run whose owner died is taken
+    over once the lease expires. Each claim gets a new owner token, and
+    checkpoints, lease renewals and releases only apply while the caller
+    still holds it.
+    """
+
+    def __init__(self):
+        self.receipt_service = ReceiptService()
+
+    def start_run(self, batch_size: int = config.REPROCESS_BATCH_SIZE) -> dict:
+        """Create a run for the current extractor version, or return the unfinished one
+
+        Unfinished runs for other versions are superseded; their owners lose the lease.
+        """
+        def start(cursor):
+            now = datetime.utcnow()
+            cursor.execute('''
+                UPDATE reprocess_run
+                SET status = ?, lease_expires_at = NULL, lease_owner = NULL, updated_at = ?, finished_at = ?
+                WHERE target_version != ? AND status NOT IN (?, ?)
+            ''', (RUN_SUPERSEDED, now, now, EXTRACTOR_VERSION, RUN_COMPLETED, RUN_SUPERSEDED))
+
+            cursor.execute(f'''
+                SELECT {", ".join(RUN_COLUMNS)} FROM reprocess_run
+                WHERE target_version = ? AND status != ?
+                ORDER BY id DESC LIMIT 1
+            ''', (EXTRACTOR_VERSION, RUN_COMPLETED))
+            row = cursor.fetchone()
+            if row:
+                run = dict(zip(RUN_COLUMNS, row))
+                if run["status"] == RUN_PAUSED:
+                    cursor.execute('UPDATE reprocess_run SET status = ?, updated_at = ? WHERE id = ?',
+                                   (RUN_PENDING, now, run["id"]))
+                    run["status"] = RUN_PENDING
+                return run
+
+            cursor.execute(f'''
+                INSERT INTO reprocess_run (target_version, status, batch_size, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?)
+                RETURNING {", ".join(RUN_COLUMNS)}
+            ''', (EXTRACTOR_VERSION, RUN_PENDING, batch_size, now, now))
+            return dict(zip(RUN_COLUMNS, cursor.fetchone()))
+
+        try:
+            return run_write(start)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error starting reprocess run: {str(e)}")
+
+    def get_run(self, run_id: int):
+        """Get run by ID"""
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute(f'SELECT {", ".join(RUN_COLUMNS)} FROM reprocess_run WHERE id = ?', (run_id,))
+                row = cursor.fetchone()
+
+            return dict(zip(RUN_COLUMNS, row)) if row else None
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error getting reprocess run: {str(e)}")
+
+    def list_runs(self, limit: int = 20):
+        """Most recent runs first"""
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+
+                cursor.execute(f'''
+                    SELECT {", ".join(RUN_COLUMNS)} FROM reprocess_run ORDER BY id DESC LIMIT ?
+                ''', (limit,))
+                return [dict(zip(RUN_COLUMNS, row)) for row in cursor.fetchall()]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error listing reprocess runs: {str(e)}")
+
+    def set_paused(self, run_id: int, paused: bool):
+        """Pause a run after its current batch, or let a paused run be picked up again"""
+        def update(cursor):
+            now = datetime.utcnow()
+            if paused:
+                cursor.execute('''
+                    UPDATE reprocess_run SET status = ?, lease_expires_at = NULL, updated_at = ?
+                    WHERE id = ? AND status IN (?, ?)
+                ''', (RUN_PAUSED, now, run_id, RUN_PENDING, RUN_RUNNING))
+            else:
+                cursor.execute('''
+                    UPDATE reprocess_run SET status = ?, updated_at = ? WHERE id = ? AND status = ?
+                ''', (RUN_PENDING, now, run_id, RUN_PAUSED))
+
+        try:
+            run_write(update)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error updating reprocess run: {str(e)}")
+
+    def claim_run(self, run_id: int | None = None):
+        """Atomically take ownership of a pending run, or of a running one whose lease expired
+
+        Only runs for the current extractor version are claimed, so an old run never
+        stamps receipts with a stale version. The returned run carries the
+        lease_owner token later calls must pass.
+        """
+        owner = uuid.uuid4().hex
+
+        def claim(cursor):
+            now = datetime.utcnow()
+            cursor.execute(f'''
+                UPDATE reprocess_run
+                SET status = ?, lease_expires_at = ?, lease_owner = ?, updated_at = ?,
+                    started_at = coalesce(started_at, ?)
+                WHERE id = (
+                    SELECT id FROM reprocess_run
+                    WHERE (status = ? OR (status = ? AND lease_expires_at < ?))
+                      AND target_version = ?
+                      AND (? IS NULL OR id = ?)
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING {", ".join(RUN_COLUMNS)}
+            ''', (RUN_RUNNING, now + timedelta(seconds=config.JOB_LEASE_SECONDS), owner, now, now,
+                  RUN_PENDING, RUN_RUNNING, now, EXTRACTOR_VERSION, run_id, run_id))
+            return cursor.fetchone()
+
+        row = run_write(claim)
+        return {**dict(zip(RUN_COLUMNS, row)), "lease_owner": owner} if row else None
+
+    def renew_lease(self, run_id: int, owner: str) -> bool:
+        """Extend the lease of a run this caller still owns; False once it lost the run"""
+        def renew(cursor):
+            now = datetime.utcnow()
+            cursor.execute('''
+                UPDATE reprocess_run SET lease_expires_at = ?, updated_at = ?
+                WHERE id = ? AND status = ? AND lease_owner = ?
+            ''', (now + timedelta(seconds=config.JOB_LEASE_SECONDS), now, run_id, RUN_RUNNING, owner))
+            return cursor.rowcount > 0
+
+        return run_write(renew)
+
+    def next_batch(self, run: dict) -> list[tuple[int, str, str | None]]:
+        """(receipt_id, file_path, content_hash) of the next receipts after the checkpoint that need re-extraction
+
+        Scans the primary key from the checkpoint on, so a whole run reads the
+        table once however many receipts are already current.
+        """
+        with get_db() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute('''
+                SELECT id, file_path, content_hash FROM receipt
+                WHERE id > ? AND extractor_version IS NOT ?
+                ORDER BY id
+                LIMIT ?
+            ''', (run["last_receipt_id"], run["target_version"], run["batch_size"]))
+            return cursor.fetchall()
+
+    def complete_batch(self, run_id: int, owner: str, last_receipt_id: int, updates: list[tuple[int, dict]],
+                       failed: int = 0, last_error: str | None = None) -> str | None:
+        """Store a batch's re-extracted receipts, advance the checkpoint and renew the lease
+
+        Returns the run's status afterwards, which is no longer running if the
+        run was paused meanwhile, or None without storing anything if another
+        reprocessor has taken the run over.
+        """
+        def complete(cursor):
+            now = datetime.utcnow()
+            # A paused run keeps its owner, so the batch in flight is still stored
+            cursor.execute('''
+                UPDATE reprocess_run
+                SET last_receipt_id = ?, processed = processed + ?, failed = failed + ?,
+                    last_error = coalesce(?, last_error), updated_at = ?,
+                    lease_expires_at = CASE WHEN status = ? THEN ? ELSE lease_expires_at END
+                WHERE id = ? AND lease_owner = ?
+                RETURNING status
+            ''', (last_receipt_id, len(updates), failed, last_error, now,
+                  RUN_RUNNING, now + timedelta(seconds=config.JOB_LEASE_SECONDS), run_id, owner))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            self.receipt_service.update_extracted_fields(cursor, updates)
+            return row[0]
+
+        status = run_write(complete)
+        if status is None:
+            return None
+        for receipt_id, _ in updates:
+            receipt_cache.invalidate(receipt_id)
+        return status
+
+    def finish_run(self, run_id: int, owner: str):
+        """Mark a run completed once no receipts are left after its checkpoint"""
+        def finish(cursor):
+            now = datetime.utcnow()
+            cursor.execute('''
+                UPDATE reprocess_run
+                SET status = ?, lease_expires_at = NULL, lease_owner = NULL, updated_at = ?, finished_at = ?
+                WHERE id = ? AND status = ? AND lease_owner = ?
+            ''', (RUN_COMPLETED, now, now, run_id, RUN_RUNNING, owner))
+
+        run_write(finish)
+
+    def release_run(self, run_id: int, owner: str):
+        """Give up ownership so another runner can resume the run right away"""
+        def release(cursor):
+            cursor.execute('''
+                UPDATE reprocess_run SET status = ?, lease_expires_at = NULL, lease_owner = NULL, updated_at = ?
+                WHERE id = ? AND status = ? AND lease_owner = ?
+            ''', (RUN_PENDING, datetime.utcnow(), run_id, RUN_RUNNING, owner))
+
+        run_write(release)
@@ -0,0 +1,194 @@
+"""
+Storage of uploaded originals.
+
+Files are content addressed and sharded by the leading characters of their
+SHA-256, e.g. uploads/3f/a9/3fa9...c2.pdf, so no directory grows beyond a few
+thousand entries however many receipts are stored. Writes go to a temp file
+on the same filesystem and are renamed into place, so a path that exists
+always holds a complete file. Files stored before sharding sit flat in the
+root (uploads/3fa9...c2.pdf); they keep their recorded paths and an upload
+of the same content reuses them instead of storing a second copy.
+
+Processed originals are rarely read again (only when receipts are
+re-extracted), so the tiering sweep compresses them in place: the compressed
+copy is stored next to the original's path with a .xz or .gz suffix and the
+path kept in the database does not change. Reads resolve whichever variant
+exists and decompress transparently.
+"""
+
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import BinaryIO
+from app import config
+
+# Suffix and opener of each compression format, in the order reads look for them
+COMPRESSORS = {
+    "lzma": (".xz", lzma.open),
+    "gzip": (".gz", gzip.open),
+}
+COMPRESSION_NONE = "none"
+# Compressed copies that save less than this are not worth decompressing on every read
+MIN_COMPRESSION_SAVING = 0.05
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class StorageBackend:
+    """Base class for upload storage backends"""
+
+    def create_temp(self) -> tuple[int, str]:
+        """Open a temp file for a new upload; returns (fd, temp_path)"""
+        raise NotImplementedError
+
+    def commit(self, temp_path: str, content_hash: str) -> str:
+        """Move a fully written temp file to the path of its content and return that path"""
+        raise NotImplementedError
+
+    def exists(self, path: str) -> bool:
+        raise NotImplementedError
+
+    def open(self, path: str) -> BinaryIO:
+        """Open a stored file for reading, decompressing it if needed"""
+        raise NotImplementedError
+
+    def local_path(self, path: str):
+        """Context manager yielding a filesystem path that holds the file's original bytes"""
+        raise NotImplementedError
+
+    def compress(self, path: str) -> int:
+        """Compress a stored file in place and return the number of bytes saved"""
+        raise NotImplementedError
+
+
+class ShardedFileStorage(StorageBackend):
+    """Content-addressed files in hash-sharded directories on the local filesystem"""
+
+    def __init__(self, root: str, shard_depth: int = 2, compression: str = "gzip", fsync: bool = True):
+        if compression != COMPRESSION_NONE and compression not in COMPRESSORS:
+            raise ValueError(f"Unknown storage compression: {compression}")
+        self.root = root
+        self.shard_depth = shard_depth
+        self.compression = compression
+        self.fsync = fsync
+        # Temp files live under the root so the final rename never crosses filesystems
+        self.temp_dir = os.path.join(root, ".tmp")
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def path_for(self, content_hash: str) -> str:
+        shards = [content_hash[2 * level:2 * level + 2] for level in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, f"{content_hash}.pdf")
+
+    def legacy_path_for(self, content_hash: str) -> str:
+        """Where the unsharded layout stored a file"""
+        return os.path.join(self.root, f"{content_hash}.pdf")
+
+    def create_temp(self) -> tuple[int, str]:
+        return tempfile.mkstemp(dir=self.temp_dir, prefix="upload-", suffix=".part")
+
+    def commit(self, temp_path: str, content_hash: str) -> str:
+        path = self.path_for(content_hash)
+        # Identical uploads share one file, whether or not it has been compressed since
+        for existing_path in (path, self.legacy_path_for(content_hash)):
+            if self.exists(existing_path):
+                _discard(temp_path)
+                return existing_path
+        if self.fsync:
+            _fsync_file(temp_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return path
+
+    def _resolve(self, path: str):
+        """(physical path, opener) of a stored file; the plain file wins over compressed copies"""
+        if os.path.exists(path):
+            return path, open
+        for suffix, opener in COMPRESSORS.values():
+            if os.path.exists(path + suffix):
+                return path + suffix, opener
+        raise FileNotFoundError(path)
+
+    def exists(self, path: str) -> bool:
+        try:
+            self._resolve(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def open(self, path: str) -> BinaryIO:
+        physical_path, opener = self._resolve(path)
+        return opener(physical_path, "rb")
+
+    @contextmanager
+    def local_path(self, path: str):
+        physical_path, opener = self._resolve(path)
+        temp_path = os.path.join(self.temp_dir, f"read-{uuid.uuid4().hex}.pdf")
+        try:
+            if opener is open:
+                # A hard link keeps the file readable if the tiering sweep compresses it meanwhile
+                try:
+                    os.link(physical_path, temp_path)
+                except OSError:
+                    # Hard links are not supported everywhere (e.g. some network and FUSE filesystems)
+                    shutil.copyfile(physical_path, temp_path)
+            else:
+                with opener(physical_path, "rb") as source, open(temp_path, "wb") as target:
+                    shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+            yield temp_path
+        finally:
+            _discard(temp_path)
+
+    def compress(self, path: str) -> int:
+        if self.compression == COMPRESSION_NONE:
+            return 0
+        physical_path, opener = self._resolve(path)
+        if opener is not open:
+            return 0
+        suffix, compressed_opener = COMPRESSORS[self.compression]
+        fd, temp_path = tempfile.mkstemp(dir=self.temp_dir, prefix="compress-", suffix=suffix)
+        os.close(fd)
+        try:
+            with open(physical_path, "rb") as source, compressed_opener(temp_path, "wb") as target:
+                shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+            original_size = os.path.getsize(physical_path)
+            compressed_size = os.path.getsize(temp_path)
+            if compressed_size > original_size * (1 - MIN_COMPRESSION_SAVING):
+                _discard(temp_path)
+                return 0
+            if self.fsync:
+                _fsync_file(temp_path)
+            # The compressed copy is in place before the original goes, so readers always find one
+            os.replace(temp_path, path + suffix)
+        except BaseException:
+            _discard(temp_path)
+            raise
+        _discard(physical_path)
+        return original_size - compressed_size
+
+
+def _fsync_file(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _discard(path: str):
+    """Remove a file if it is still there"""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+@lru_cache(maxsize=None)
+def get_storage() -> StorageBackend:
+    """The configured storage backend (one per process)"""
+    return ShardedFileStorage(
+        config.UPLOAD_DIR, config.STORAGE_SHARD_DEPTH, config.STORAGE_COMPRESSION, config.STORAGE_FSYNC
+    )
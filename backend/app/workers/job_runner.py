@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app import config, metrics
+from app.models.database import run_db
+from app.services.job_service import JobService, JOB_FAILED, JOB_SUCCEEDED
+from app.services.receipt_service import extract_receipt_data
+
+logger = logging.getLogger(__name__)
+
+
+class JobRunner:
+    """Claims queued processing jobs and runs their extraction in a process pool
+
+    Any number of runners (embedded in API workers or standalone) can share
+    the jobs table, since jobs are claimed atomically.
+    """
+
+    def __init__(self, job_service: JobService, max_workers: int = config.JOB_WORKERS):
+        self.job_service = job_service
+        self.max_workers = max_workers
+        self.executor = None
+        self._dispatcher = None
+        self._wakeup = None
+        self._finished = {}  # job_id -> [event set when the job finishes here, number of waiters]
+
+    async def start(self):
+        """Start the process pool and the dispatch loop"""
+        self.executor = self._create_executor()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        """Create the extraction process pool"""
+        # Spawned workers avoid inheriting the API process's threads and DB connections
+        return ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def stop(self):
+        """Stop dispatching; interrupted jobs are retried once their lease expires"""
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def notify(self):
+        """Wake the dispatcher after a job was queued"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def extract(self, file_path: str, content_hash: str | None = None) -> dict:
+        """Extract a file right away, outside the job queue
+        
+        Uses the process pool when the runner is started here, and a thread otherwise.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self.executor
+        try:
+            with metrics.stage("extraction"):
+                receipt_data = await loop.run_in_executor(executor, extract_receipt_data, file_path, content_hash)
+        except BrokenProcessPool:
+            metrics.PROCESSING.inc(result="crashed")
+            if executor is not None and self.executor is executor:
+                self.executor = self._create_executor()
+            raise
+        except Exception:
+            metrics.PROCESSING.inc(result="failed")
+            raise
+        _record_extraction(receipt_data)
+        return receipt_data
+
+    async def wait_for_job(self, job_id: int, timeout: float = config.JOB_WAIT_TIMEOUT):
+        """Wait until a job finishes or the timeout passes, then return the job"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # Concurrent /process calls for one file wait on the same job; they share its event
+        waiter = self._finished.setdefault(job_id, [asyncio.Event(), 0])
+        waiter[1] += 1
+        finished = waiter[0]
+        try:
+            while True:
+                job = await run_db(self.job_service.get_job, job_id)
+                if not job or job["status"] in (JOB_SUCCEEDED, JOB_FAILED):
+                    return job
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return job
+                # Jobs run by this process signal immediately; others are picked up by polling
+                try:
+                    await asyncio.wait_for(finished.wait(), min(remaining, config.JOB_POLL_INTERVAL))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            waiter[1] -= 1
+            if not waiter[1]:
+                self._finished.pop(job_id, None)
+
+    async def _dispatch_loop(self):
+        """Keep up to max_workers jobs in flight"""
+        slots = asyncio.Semaphore(self.max_workers)
+        while True:
+            await slots.acquire()
+            try:
+                job = await run_db(self.job_service.claim_next)
+            except Exception:
+                logger.exception("Failed to claim processing job")
+                job = None
+            if job is None:
+                slots.release()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), config.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._run_job(*job))
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _run_job(self, job_id: int, file_id: int, attempts: int, file_path: str, content_hash: str | None):
+        """Extract one job's file in the process pool and store the result"""
+        try:
+            if attempts > config.JOB_MAX_ATTEMPTS:
+                metrics.PROCESSING.inc(result="failed")
+                await run_db(self.job_service.fail_job, job_id, "Exceeded maximum attempts")
+                return
+            loop = asyncio.get_running_loop()
+            executor = self.executor
+            try:
+                with metrics.stage("extraction"):
+                    receipt_data = await loop.run_in_executor(
+                        executor, extract_receipt_data, file_path, content_hash
+                    )
+            except BrokenProcessPool as e:
+                # A worker process died; the job itself may be fine
+                metrics.PROCESSING.inc(result="crashed")
+                await run_db(self.job_service.fail_job, job_id, f"Worker crashed: {str(e)}", retry=True)
+                if self.executor is executor:
+                    self.executor = self._create_executor()
+                return
+            except Exception as e:
+                metrics.PROCESSING.inc(result="failed")
+                await run_db(self.job_service.fail_job, job_id, str(e))
+                return
+            _record_extraction(receipt_data)
+            await run_db(self.job_service.complete_job, job_id, file_id, receipt_data, content_hash)
+        except Exception:
+            logger.exception("Processing job %s failed", job_id)
+        finally:
+            waiter = self._finished.get(job_id)
+            if waiter:
+                waiter[0].set()
+
+
+def _record_extraction(receipt_data: dict):
+    """Feed a finished extraction's per-page timings (measured in the worker) into the metrics"""
+    metrics.PROCESSING.inc(result="succeeded")
+    try:
+        pages = json.loads(receipt_data.get("extraction_stats") or "{}").get("pages", [])
+    except ValueError:
+        return
+    for page in pages:
+        metrics.EXTRACTION_PAGE_DURATION.observe(page["total_ms"] / 1000, source=page["source"])
+
+
+async def run_standalone():
+    """Run a job runner outside the API process until interrupted"""
+    runner = JobRunner(JobService())
+    await runner.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_standalone())
@@ -0,0 +1,210 @@
+"""
+Bulk re-extraction of receipts produced by older extractor versions.
+
+Usage:
+    python -m app.workers.reprocessor                 # start or resume a run and work it to completion
+    python -m app.workers.reprocessor --batch-size 1000 --workers 8
+    python -m app.workers.reprocessor --status
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from app import config
+from app.models.database import run_db
+from app.services.reprocess_service import RUN_RUNNING, ReprocessService
+from app.services.receipt_service import extract_receipt_data
+
+logger = logging.getLogger(__name__)
+
+# Chunks per worker and batch: enough to balance uneven files, few enough to amortize IPC
+CHUNKS_PER_WORKER = 4
+
+
+def extract_chunk(files: list[tuple[str, str | None]]) -> list:
+    """Extract several (file_path, content_hash) pairs in one worker call
+
+    Each result is receipt data or an error message.
+    """
+    results = []
+    for file_path, content_hash in files:
+        try:
+            results.append(extract_receipt_data(file_path, content_hash))
+        except Exception as e:
+            results.append(f"{type(e).__name__}: {str(e)}")
+    return results
+
+
+class Reprocessor:
+    """Works reprocess runs batch by batch on a process pool
+
+    Like the job runner it can be embedded in an API process or run on its
+    own; runs are claimed with a lease, so only one reprocessor works a run at
+    a time and a run abandoned by a dead process is picked up by another.
+    """
+
+    def __init__(self, reprocess_service: ReprocessService, max_workers: int = config.REPROCESS_WORKERS):
+        self.reprocess_service = reprocess_service
+        self.max_workers = max_workers
+        self.executor = None
+        self._watcher = None
+        self._wakeup = None
+
+    async def start(self):
+        """Watch for runs to work in the background"""
+        self._wakeup = asyncio.Event()
+        self._watcher = asyncio.create_task(self._watch_loop())
+
+    async def stop(self):
+        """Stop working; the current run is released and resumes from its checkpoint"""
+        if self._watcher:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+        self._shutdown_executor()
+
+    def notify(self):
+        """Wake the watcher after a run was started or resumed"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _watch_loop(self):
+        while True:
+            try:
+                await self.work_runs()
+            except Exception:
+                logger.exception("Reprocess run failed")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), config.REPROCESS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def work_runs(self, run_id: int | None = None):
+        """Claim and work runs until none is left to claim"""
+        while True:
+            run = await run_db(self.reprocess_service.claim_run, run_id)
+            if run is None:
+                return
+            try:
+                await self.work_run(run)
+            finally:
+                self._shutdown_executor()
+
+    async def work_run(self, run: dict):
+        """Re-extract a claimed run's receipts, one checkpointed batch at a time"""
+        logger.info("Reprocess run %s: resuming after receipt %s", run["id"], run["last_receipt_id"])
+        owner = run["lease_owner"]
+        try:
+            while True:
+                batch = await run_db(self.reprocess_service.next_batch, run)
+                if not batch:
+                    await run_db(self.reprocess_service.finish_run, run["id"], owner)
+                    logger.info("Reprocess run %s completed", run["id"])
+                    return
+                # A batch can take longer than the lease, so keep renewing it while extracting
+                heartbeat = asyncio.create_task(self._keep_lease(run["id"], owner))
+                try:
+                    updates, failures = await self._extract_batch(batch)
+                finally:
+                    heartbeat.cancel()
+                last_error = failures[-1][1] if failures else None
+                for receipt_id, error in failures:
+                    logger.warning("Reprocess run %s: receipt %s failed: %s", run["id"], receipt_id, error)
+                status = await run_db(
+                    self.reprocess_service.complete_batch, run["id"], owner, batch[-1][0], updates,
+                    len(failures), last_error
+                )
+                if status is None:
+                    logger.warning("Reprocess run %s was taken over by another reprocessor; stopping", run["id"])
+                    return
+                run["last_receipt_id"] = batch[-1][0]
+                if status != RUN_RUNNING:
+                    logger.info("Reprocess run %s is %s; stopping after receipt %s",
+                                run["id"], status, run["last_receipt_id"])
+                    return
+        except asyncio.CancelledError:
+            await run_db(self.reprocess_service.release_run, run["id"], owner)
+            raise
+
+    async def _keep_lease(self, run_id: int, owner: str):
+        """Renew a run's lease a few times per lease period until cancelled or the run is lost"""
+        while True:
+            await asyncio.sleep(config.JOB_LEASE_SECONDS / 3)
+            if not await run_db(self.reprocess_service.renew_lease, run_id, owner):
+                return
+
+    async def _extract_batch(self, batch: list) -> tuple[list, list]:
+        """Extract a batch in chunks across the pool; returns (updates, failures)"""
+        if self.executor is None:
+            # Spawned workers avoid inheriting the parent's threads and DB connections
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        executor = self.executor
+        loop = asyncio.get_running_loop()
+        chunk_size = max(1, math.ceil(len(batch) / (self.max_workers * CHUNKS_PER_WORKER)))
+        chunks = [batch[start:start + chunk_size] for start in range(0, len(batch), chunk_size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(
+                executor, extract_chunk, [(file_path, content_hash) for _, file_path, content_hash in chunk]
+            )
+            for chunk in chunks
+        ), return_exceptions=True)
+
+        updates, failures = [], []
+        for chunk, outcome in zip(chunks, results):
+            if isinstance(outcome, BaseException):
+                # A crashed worker fails every chunk still in the pool; those receipts keep
+                # their old version and are retried by the next run
+                if isinstance(outcome, BrokenProcessPool) and self.executor is executor:
+                    self._shutdown_executor()
+                outcome = [f"{type(outcome).__name__}: {str(outcome)}"] * len(chunk)
+            for (receipt_id, *_), result in zip(chunk, outcome):
+                if isinstance(result, dict):
+                    updates.append((receipt_id, result))
+                else:
+                    failures.append((receipt_id, result))
+        return updates, failures
+
+    def _shutdown_executor(self):
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+async def run_standalone(batch_size: int, workers: int):
+    """Start or resume the run for the current extractor version and work it to completion"""
+    service = ReprocessService()
+    run = await run_db(service.start_run, batch_size)
+    reprocessor = Reprocessor(service, workers)
+    # A run still leased by a live process is left to it
+    await reprocessor.work_runs(run["id"])
+    return await run_db(service.get_run, run["id"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=config.REPROCESS_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=config.REPROCESS_WORKERS)
+    parser.add_argument("--status", action="store_true", help="print recent runs and exit")
+    args = parser.parse_args()
+
+    if args.status:
+        print(json.dumps(ReprocessService().list_runs(), indent=2, default=str))
+        return
+    run = asyncio.run(run_standalone(args.batch_size, args.workers))
+    print(json.dumps(run, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
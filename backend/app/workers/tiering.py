@@ -0,0 +1,67 @@
+"""
+Storage tiering sweep: compress the originals of processed receipts.
+
+Files processed more than RECEIPTS_STORAGE_COMPRESS_AFTER seconds ago are
+compressed in place with RECEIPTS_STORAGE_COMPRESSION; reads decompress them
+transparently. Each run handles what is due and exits, so schedule it (e.g.
+hourly from cron) on every node that stores uploads.
+
+Usage:
+    python -m app.workers.tiering
+    python -m app.workers.tiering --older-than 0 --workers 4
+"""
+
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from app import config
+from app.services.file_service import FileService
+
+logger = logging.getLogger(__name__)
+
+
+def compress_file(storage, file_path: str) -> int:
+    """Bytes saved by compressing one original; missing or unreadable files are skipped"""
+    try:
+        return storage.compress(file_path)
+    except OSError:
+        logger.warning("Could not compress %s", file_path, exc_info=True)
+        return 0
+
+
+def run_sweep(older_than: float, batch_size: int, workers: int) -> dict:
+    """Compress every due original, one batch of files at a time"""
+    file_service = FileService()
+    storage = file_service.storage
+    summary = {"files": 0, "compressed": 0, "bytes_saved": 0}
+    # lzma and gzip release the GIL while compressing, so threads use several cores
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            files = file_service.get_files_to_tier(older_than, batch_size)
+            if not files:
+                return summary
+            # Files with identical content share one original
+            paths = list(dict.fromkeys(file_path for _, file_path in files))
+            for saved in executor.map(lambda file_path: compress_file(storage, file_path), paths):
+                summary["compressed"] += saved > 0
+                summary["bytes_saved"] += saved
+            file_service.mark_files_tiered([file_id for file_id, _ in files])
+            summary["files"] += len(files)
+            logger.info("Tiered %s files, %s bytes saved so far", summary["files"], summary["bytes_saved"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than", type=float, default=config.STORAGE_COMPRESS_AFTER,
+                        help="seconds since a file was processed")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=config.JOB_WORKERS)
+    args = parser.parse_args()
+
+    print(json.dumps(run_sweep(args.older_than, args.batch_size, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
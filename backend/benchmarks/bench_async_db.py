@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Concurrency check: GET /receipts/{id} latency while slow writes are in flight.
+
+A background thread repeatedly holds the SQLite write lock, so every
+POST /validate issued by the writer clients waits on it. Because the routes
+run database work on the DB executor instead of the event loop, reads must
+keep their latency. The script exits non-zero when the p99 read latency under
+write load exceeds the limit.
+
+Usage:
+    python -m benchmarks.bench_async_db --seconds 5 --writers 4
+"""
+
+import argparse
+import json
+import sqlite3
+import sys
+import threading
+import time
+
+import requests
+
+from benchmarks.common import LocalServer, latency_summary, sample_receipt_data
+from app.config import DATABASE_PATH
+from app.main import app
+from app.models.database import run_write
+from app.services.file_service import FileService
+from app.services.receipt_service import ReceiptService
+
+
+def measure_reads(base_url: str, receipt_id: int, seconds: float, readers: int) -> list:
+    """Issue GET /receipts/{id} from several threads and collect latencies"""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def reader():
+        session = requests.Session()
+        local = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = session.get(f"{base_url}/receipts/{receipt_id}")
+            local.append(time.perf_counter() - started)
+            response.raise_for_status()
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def hold_write_lock(stop: threading.Event, hold_seconds: float):
+    """Keep grabbing the write lock and sitting on it to make writes slow"""
+    conn = sqlite3.connect(DATABASE_PATH, timeout=30)
+    while not stop.is_set():
+        conn.execute("BEGIN IMMEDIATE")
+        time.sleep(hold_seconds)
+        conn.commit()
+        time.sleep(hold_seconds)
+    conn.close()
+
+
+def slow_writer(base_url: str, file_id: int, stop: threading.Event, counter: list):
+    """Repeatedly POST /validate, each call waiting on the held write lock"""
+    session = requests.Session()
+    while not stop.is_set():
+        session.post(f"{base_url}/validate", data={"file_id": file_id})
+        counter.append(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--hold-ms", type=float, default=100.0, help="how long each slow write holds the lock")
+    parser.add_argument("--max-p99-ms", type=float, default=50.0, help="allowed p99 increase under write load")
+    args = parser.parse_args()
+
+    file_id = FileService().create_file_record("bench.pdf", "bench.pdf")
+    receipt_service = ReceiptService()
+    receipt_id = run_write(lambda cursor: receipt_service.insert_receipt(cursor, sample_receipt_data("bench.pdf")))
+
+    with LocalServer(app) as server:
+        baseline = measure_reads(server.base_url, receipt_id, args.seconds, args.readers)
+
+        stop = threading.Event()
+        writes = []
+        background = [threading.Thread(target=hold_write_lock, args=(stop, args.hold_ms / 1000))]
+        background += [
+            threading.Thread(target=slow_writer, args=(server.base_url, file_id, stop, writes))
+            for _ in range(args.writers)
+        ]
+        for thread in background:
+            thread.start()
+        loaded = measure_reads(server.base_url, receipt_id, args.seconds, args.readers)
+        stop.set()
+        for thread in background:
+            thread.join()
+
+    result = {
+        "baseline": latency_summary(baseline),
+        "under_slow_writes": latency_summary(loaded),
+        "slow_writes_completed": len(writes),
+    }
+    result["p99_increase_ms"] = round(result["under_slow_writes"]["p99_ms"] - result["baseline"]["p99_ms"], 2)
+    result["passed"] = result["p99_increase_ms"] <= args.max_p99_ms
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
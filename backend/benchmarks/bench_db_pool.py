@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark the database layer: per-call sqlite3.connect() vs the pooled WAL connections.
+
+Each simulated request performs the database work of POST /process
+(get file record, insert receipt, mark file processed, read receipt back)
+from several threads at once.
+
+Usage:
+    python -m benchmarks.bench_db_pool --threads 8 --seconds 5
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from benchmarks.common import WORKDIR, sample_receipt_data
+from app.models.database import init_database, run_write
+from app.services.file_service import FileService, file_cache
+from app.services.receipt_service import ReceiptService
+
+LEGACY_DB_PATH = os.path.join(WORKDIR, "legacy.db")
+
+
+def legacy_connection():
+    """Open a connection the way get_db_connection() used to"""
+    return sqlite3.connect(LEGACY_DB_PATH)
+
+
+def init_legacy_database():
+    """Create the legacy schema using the default rollback journal"""
+    conn = legacy_connection()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS receipt_file (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, file_name TEXT NOT NULL, file_path TEXT NOT NULL,
+            is_valid BOOLEAN DEFAULT FALSE, invalid_reason TEXT, is_processed BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS receipt (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, purchased_at TIMESTAMP, merchant_name TEXT,
+            total_amount REAL, file_path TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, items TEXT, payment_method TEXT,
+            tax_amount REAL, subtotal REAL, receipt_number TEXT, cashier TEXT
+        )
+    ''')
+    conn.execute("INSERT INTO receipt_file (file_name, file_path, is_valid) VALUES ('a.pdf', 'a.pdf', 1)")
+    conn.commit()
+    conn.close()
+
+
+def legacy_request(file_id: int):
+    """The /process database calls, one fresh connection per call"""
+    conn = legacy_connection()
+    conn.execute('SELECT * FROM receipt_file WHERE id = ?', (file_id,)).fetchone()
+    conn.close()
+
+    conn = legacy_connection()
+    cursor = conn.execute('''
+        INSERT INTO receipt (purchased_at, merchant_name, total_amount, file_path, items, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (datetime.utcnow(), "Sample Store", 25.99, "a.pdf", "[]", datetime.utcnow(), datetime.utcnow()))
+    receipt_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+
+    conn = legacy_connection()
+    conn.execute('UPDATE receipt_file SET is_processed = ?, updated_at = ? WHERE id = ?',
+                 (True, datetime.utcnow(), file_id))
+    conn.commit()
+    conn.close()
+
+    conn = legacy_connection()
+    conn.execute('SELECT * FROM receipt WHERE id = ?', (receipt_id,)).fetchone()
+    conn.close()
+
+
+def pooled_request(file_service: FileService, receipt_service: ReceiptService, file_id: int):
+    """The /process database calls through the services and the pool"""
+    # Every request reads the same file; without this the record would come from
+    # the file cache and the comparison would stop measuring the database
+    file_cache.clear()
+    file_record = file_service.get_file_record(file_id)
+    # Fixed receipt data, like the legacy path: this measures the database work, not OCR
+    receipt_data = sample_receipt_data(file_record[2])
+    receipt_id = run_write(lambda cursor: receipt_service.insert_receipt(cursor, receipt_data))
+    file_service.mark_file_processed(file_id)
+    receipt_service.get_receipt(receipt_id)
+
+
+def run(name: str, request, threads: int, seconds: float) -> dict:
+    """Drive `request` from several threads and report throughput"""
+    completed = [0] * threads
+    errors = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def worker(index: int):
+        while time.perf_counter() < deadline:
+            try:
+                request()
+                completed[index] += 1
+            except Exception:
+                errors[index] += 1
+
+    started = time.perf_counter()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "mode": name,
+        "threads": threads,
+        "requests": sum(completed),
+        "errors": sum(errors),
+        "requests_per_sec": round(sum(completed) / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    init_legacy_database()
+    init_database()
+    file_service = FileService()
+    receipt_service = ReceiptService()
+    file_id = file_service.create_file_record("a.pdf", "a.pdf")
+
+    results = [
+        run("per-call connect (before)", lambda: legacy_request(1), args.threads, args.seconds),
+        run("pooled WAL (after)", lambda: pooled_request(file_service, receipt_service, file_id),
+            args.threads, args.seconds),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
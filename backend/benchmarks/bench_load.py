@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Load benchmark for the API request path.
+
+Starts the app under a local uvicorn server against a temporary database,
+renders a synthetic PDF corpus, and drives concurrent workloads through the
+real HTTP stack:
+
+    upload    POST /upload with every corpus PDF
+    validate  POST /validate for every uploaded file
+    process   POST /process (wait=true) for every valid file
+    list      GET /receipts and GET /files pages
+    get       GET /receipts/{id} and GET /files/{id}
+
+Each workload reports throughput and p50/p95/p99 latency. The full result is
+printed as JSON and can be written to a file. Pass an earlier result as
+--baseline to fail when a workload regresses past --max-regression.
+
+Usage:
+    python -m benchmarks.bench_load --pdfs 100 --concurrency 8 --output result.json
+    python -m benchmarks.bench_load --baseline result.json --max-regression 0.25
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from benchmarks.common import BACKEND_DIR, INVOKED_FROM, WORKDIR, LocalServer, latency_summary
+from benchmarks.corpus import generate_corpus
+from app.main import app
+
+WORKLOADS = ["upload", "validate", "process", "list", "get"]
+
+
+class Workload:
+    """Latencies and failures of one workload's requests"""
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.samples = []
+        self.errors = 0
+        self.status_counts = {}
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, status: int):
+        with self._lock:
+            self.samples.append(seconds)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            if status >= 400:
+                self.errors += 1
+
+    def summary(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "requests": len(self.samples),
+            "errors": self.errors,
+            "status_counts": {str(status): count for status, count in sorted(self.status_counts.items())},
+            "elapsed_s": round(self.elapsed, 3),
+            "throughput_rps": round(len(self.samples) / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency": latency_summary(self.samples),
+        }
+
+
+def run_workload(name: str, calls: list, concurrency: int) -> tuple[Workload, list]:
+    """Issue calls from `concurrency` threads, each with its own session, and time every request
+
+    Each call takes a session and returns a response; the parsed JSON bodies of
+    successful responses are returned in call order.
+    """
+    workload = Workload(name, concurrency)
+    sessions = threading.local()
+
+    def issue(call):
+        session = getattr(sessions, "session", None)
+        if session is None:
+            session = sessions.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = call(session)
+        except requests.RequestException:
+            workload.record(time.perf_counter() - started, 599)
+            return None
+        workload.record(time.perf_counter() - started, response.status_code)
+        return response.json() if response.ok else None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(issue, calls))
+    workload.elapsed = time.perf_counter() - started
+    return workload, results
+
+
+def upload_call(base_url: str, path: str):
+    def call(session):
+        with open(path, "rb") as handle:
+            files = {"file": (os.path.basename(path), handle, "application/pdf")}
+            return session.post(f"{base_url}/upload", files=files)
+    return call
+
+
+def form_call(url: str, data: dict):
+    return lambda session: session.post(url, data=data)
+
+
+def get_call(url: str):
+    return lambda session: session.get(url)
+
+
+def run_benchmark(base_url: str, pdfs: list, concurrency: int, reads: int, seed: int) -> dict:
+    """Run the workloads in order; each one feeds the ids it created to the next"""
+    rng = random.Random(seed)
+    results = {}
+
+    upload, uploaded = run_workload("upload", [upload_call(base_url, path) for path in pdfs], concurrency)
+    results["upload"] = upload
+    file_ids = [record["id"] for record in uploaded if record]
+
+    calls = [form_call(f"{base_url}/validate", {"file_id": file_id}) for file_id in file_ids]
+    validate, validated = run_workload("validate", calls, concurrency)
+    results["validate"] = validate
+    valid_ids = [record["id"] for record in validated if record and record["is_valid"]]
+
+    calls = [form_call(f"{base_url}/process", {"file_id": file_id, "wait": "true"}) for file_id in valid_ids]
+    process, processed = run_workload("process", calls, concurrency)
+    results["process"] = process
+    receipt_ids = [receipt["id"] for receipt in processed if receipt and "id" in receipt]
+
+    list_urls = [f"{base_url}/receipts?limit=50", f"{base_url}/files?limit=50"]
+    calls = [get_call(rng.choice(list_urls)) for _ in range(reads)]
+    results["list"], _ = run_workload("list", calls, concurrency)
+
+    get_urls = [f"{base_url}/receipts/{receipt_id}" for receipt_id in receipt_ids]
+    get_urls += [f"{base_url}/files/{file_id}" for file_id in file_ids]
+    calls = [get_call(rng.choice(get_urls)) for _ in range(reads)] if get_urls else []
+    results["get"], _ = run_workload("get", calls, concurrency)
+
+    return {name: workload.summary() for name, workload in results.items()}
+
+
+def environment() -> dict:
+    """Where and on what the benchmark ran, so results can be compared across releases"""
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "git_revision": revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(result: dict, baseline: dict, max_regression: float) -> list:
+    """Workloads whose p95 latency rose or throughput fell by more than max_regression"""
+    regressions = []
+    for name, current in result["workloads"].items():
+        previous = baseline.get("workloads", {}).get(name)
+        if not previous or not previous["requests"] or not current["requests"]:
+            continue
+        old_p95, new_p95 = previous["latency"]["p95_ms"], current["latency"]["p95_ms"]
+        if old_p95 and new_p95 > old_p95 * (1 + max_regression):
+            regressions.append(f"{name}: p95 {old_p95} ms -> {new_p95} ms")
+        old_rps, new_rps = previous["throughput_rps"], current["throughput_rps"]
+        if old_rps and new_rps < old_rps * (1 - max_regression):
+            regressions.append(f"{name}: throughput {old_rps} -> {new_rps} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdfs", type=int, default=100, help="receipts to upload, validate and process")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads per workload")
+    parser.add_argument("--reads", type=int, default=2000, help="requests in each of the list and get workloads")
+    parser.add_argument("--max-items", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    parser.add_argument("--baseline", help="earlier JSON result to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="allowed relative p95 increase or throughput drop against the baseline")
+    args = parser.parse_args()
+
+    corpus = generate_corpus(os.path.join(WORKDIR, "corpus"), args.pdfs, args.seed, max_items=args.max_items)
+    pdfs = [entry["file"] for entry in corpus]
+
+    with LocalServer(app) as server:
+        workloads = run_benchmark(server.base_url, pdfs, args.concurrency, args.reads, args.seed)
+
+    result = {
+        "benchmark": "load",
+        "environment": environment(),
+        "parameters": {
+            "pdfs": args.pdfs, "concurrency": args.concurrency, "reads": args.reads,
+            "max_items": args.max_items, "seed": args.seed,
+        },
+        "workloads": workloads,
+    }
+    failed = [name for name in WORKLOADS if workloads[name]["errors"]]
+
+    if args.baseline:
+        with open(os.path.join(INVOKED_FROM, args.baseline)) as handle:
+            regressions = compare(result, json.load(handle), args.max_regression)
+        result["baseline"] = {"path": args.baseline, "max_regression": args.max_regression, "regressions": regressions}
+    else:
+        regressions = []
+
+    result["passed"] = not failed and not regressions
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output:
+        with open(os.path.join(INVOKED_FROM, args.output), "w") as handle:
+            handle.write(output + "\n")
+    sys.exit(0 if result["passed"] else 1)
+
+
+if __name__ == "__main__":
+    main()
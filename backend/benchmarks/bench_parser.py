@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark the receipt field parser on a synthetic reportlab corpus.
+
+Generates receipts, reads their text layers once, then times
+parse_receipt_text over the texts and scores every field against the
+ground truth.
+
+Usage:
+    python -m benchmarks.bench_parser --count 200 --max-items 80
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from benchmarks.common import WORKDIR
+from benchmarks.corpus import generate_corpus
+from app.extraction.engine import TextLayerEngine
+from app.extraction.parser import PARSER_VERSION, parse_receipt_text
+
+SCALAR_FIELDS = [
+    "merchant_name", "total_amount", "tax_amount", "subtotal", "purchased_at",
+    "receipt_number", "payment_method", "cashier",
+]
+
+
+def field_matches(expected, actual) -> bool:
+    """Compare one parsed field with its ground truth"""
+    if isinstance(actual, datetime):
+        actual = actual.isoformat(sep=" ")
+    if isinstance(expected, float) and isinstance(actual, float):
+        return abs(expected - actual) < 0.005
+    return expected == actual
+
+
+def items_match(expected: list, actual: list) -> tuple[int, bool]:
+    """Number of line items parsed correctly, and whether the whole list is right"""
+    correct = sum(
+        1 for want, got in zip(expected, actual)
+        if want["name"] == got["name"] and abs(want["price"] - got["price"]) < 0.005
+        and want["quantity"] == got["quantity"]
+    )
+    return correct, correct == len(expected) == len(actual)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200)
+    parser.add_argument("--max-items", type=int, default=80)
+    parser.add_argument("--iterations", type=int, default=5, help="parse passes over the corpus")
+    args = parser.parse_args()
+
+    manifest = generate_corpus(os.path.join(WORKDIR, "corpus"), args.count, max_items=args.max_items)
+
+    engine = TextLayerEngine()
+    started = time.perf_counter()
+    texts = [engine.extract(entry["file"]).text for entry in manifest]
+    extract_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.iterations):
+        results = [parse_receipt_text(text) for text in texts]
+    parse_seconds = (time.perf_counter() - started) / args.iterations
+
+    correct = {field: 0 for field in SCALAR_FIELDS}
+    items_correct = items_total = lists_correct = 0
+    for entry, result in zip(manifest, results):
+        expected = entry["expected"]
+        for field in SCALAR_FIELDS:
+            correct[field] += field_matches(expected[field], result[field])
+        matched, whole = items_match(expected["items"], result["items"])
+        items_correct += matched
+        items_total += len(expected["items"])
+        lists_correct += whole
+
+    lines = sum(text.count("\n") + 1 for text in texts)
+    print(json.dumps({
+        "parser_version": PARSER_VERSION,
+        "receipts": len(texts),
+        "lines": lines,
+        "parse": {
+            "receipts_per_sec": round(len(texts) / parse_seconds, 1),
+            "mean_us_per_receipt": round(parse_seconds / len(texts) * 1e6, 1),
+            "lines_per_sec": round(lines / parse_seconds),
+        },
+        "text_layer_extract_mean_ms": round(extract_seconds / len(texts) * 1000, 3),
+        "accuracy": {
+            **{field: round(count / len(texts), 4) for field, count in correct.items()},
+            "items": round(items_correct / items_total, 4) if items_total else None,
+            "item_lists_exact": round(lists_correct / len(texts), 4),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Benchmark upload storage: flat vs hash-sharded directories, and compression of originals.
+
+Lookups: --files empty files are created in one flat directory and in a
+ShardedFileStorage tree, then random existing paths are stat'ed and opened in
+each. Compression: a generated receipt corpus is compressed with every
+supported format, reporting the size ratio and compress and read-back (decompress) rates.
+
+Usage:
+    python -m benchmarks.bench_storage --files 200000 --lookups 20000
+    python -m benchmarks.bench_storage --pdfs 50 --files 0
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import time
+
+from benchmarks.common import WORKDIR, latency_summary
+from benchmarks.corpus import generate_corpus
+from app.services.storage import COMPRESSORS, ShardedFileStorage
+
+
+def content_hash(index: int) -> str:
+    return hashlib.sha256(str(index).encode()).hexdigest()
+
+
+def fill_flat(directory: str, count: int) -> list:
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"{content_hash(index)}.pdf")
+        open(path, "wb").close()
+        paths.append(path)
+    return paths
+
+
+def fill_sharded(storage: ShardedFileStorage, count: int) -> list:
+    paths = []
+    for index in range(count):
+        fd, temp_path = storage.create_temp()
+        os.close(fd)
+        paths.append(storage.commit(temp_path, content_hash(index)))
+    return paths
+
+
+def measure_lookups(paths: list, lookups: int, seed: int) -> dict:
+    """Stat and open random stored files"""
+    rng = random.Random(seed)
+    samples = []
+    for path in rng.choices(paths, k=lookups):
+        started = time.perf_counter()
+        os.stat(path)
+        with open(path, "rb"):
+            pass
+        samples.append(time.perf_counter() - started)
+    return latency_summary(samples)
+
+
+def bench_lookups(files: int, lookups: int, seed: int) -> dict:
+    results = {}
+    for layout in ("flat", "sharded"):
+        root = os.path.join(WORKDIR, f"storage-{layout}")
+        started = time.perf_counter()
+        if layout == "flat":
+            paths = fill_flat(root, files)
+        else:
+            # No fsync: this measures directory costs, not the disk's flush latency
+            paths = fill_sharded(ShardedFileStorage(root, fsync=False, compression="none"), files)
+        elapsed = time.perf_counter() - started
+        results[layout] = {
+            "creates_per_second": round(files / elapsed, 1),
+            "lookup": measure_lookups(paths, lookups, seed),
+        }
+        shutil.rmtree(root)
+    return results
+
+
+def bench_compression(pdfs: int, seed: int) -> dict:
+    corpus = [entry["file"] for entry in generate_corpus(os.path.join(WORKDIR, "corpus"), pdfs, seed)]
+    results = {}
+    for compression in COMPRESSORS:
+        root = os.path.join(WORKDIR, f"storage-{compression}")
+        storage = ShardedFileStorage(root, fsync=False, compression=compression)
+        paths = []
+        for index, source in enumerate(corpus):
+            fd, temp_path = storage.create_temp()
+            with os.fdopen(fd, "wb") as target, open(source, "rb") as handle:
+                shutil.copyfileobj(handle, target)
+            paths.append(storage.commit(temp_path, content_hash(index)))
+        original = sum(os.path.getsize(path) for path in paths)
+
+        started = time.perf_counter()
+        saved = sum(storage.compress(path) for path in paths)
+        compress_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for path in paths:
+            with storage.local_path(path):
+                pass
+        read_seconds = time.perf_counter() - started
+
+        results[compression] = {
+            "original_bytes": original,
+            "stored_bytes": original - saved,
+            "ratio": round((original - saved) / original, 3),
+            "compress_mb_per_second": round(original / compress_seconds / 1e6, 1),
+            "read_mb_per_second": round(original / read_seconds / 1e6, 1),
+        }
+        shutil.rmtree(root)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100000, help="files per layout for the lookup benchmark")
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--pdfs", type=int, default=30, help="receipts for the compression benchmark")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    result = {}
+    if args.files:
+        result["lookups"] = bench_lookups(args.files, args.lookups, args.seed)
+    if args.pdfs:
+        result["compression"] = bench_compression(args.pdfs, args.seed)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark group commit: one transaction per write vs the shared WriteBatcher.
+
+Each writer thread repeatedly does the write path of an upload followed by a
+validation (create_file_record, update_file_validation), once with every write
+committing on its own pooled connection and once through run_write's group
+commit. Throughput and per-write latency are reported for each thread count.
+
+Use --synchronous FULL to see the case where every commit waits on an fsync.
+
+Usage:
+    python -m benchmarks.bench_write_batch --threads 1 4 16 --seconds 3
+    python -m benchmarks.bench_write_batch --synchronous FULL
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from benchmarks.common import latency_summary
+
+if "--synchronous" in sys.argv:
+    # Connections read the pragma from config when they are opened
+    os.environ["RECEIPTS_DB_SYNCHRONOUS"] = sys.argv[sys.argv.index("--synchronous") + 1]
+
+from app import config  # noqa: E402
+from app.services.file_service import FileService  # noqa: E402
+
+
+def run(threads: int, seconds: float, batching: bool) -> dict:
+    """Issue upload+validate writes from `threads` threads for `seconds`"""
+    config.DB_WRITE_BATCHING = batching
+    file_service = FileService()
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def writer():
+        local = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            content_hash = uuid.uuid4().hex
+            file_id = file_service.create_file_record("bench.pdf", "bench.pdf", content_hash, 1024)
+            local.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            file_service.update_file_validation(file_id, True, None, 1)
+            local.append(time.perf_counter() - started)
+        with lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=writer) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    return {"writes_per_second": round(len(samples) / elapsed, 1), "latency": latency_summary(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--synchronous", default=config.DB_SYNCHRONOUS, help="SQLite synchronous pragma")
+    args = parser.parse_args()
+
+    results = []
+    for threads in args.threads:
+        results.append({
+            "threads": threads,
+            "per_write_commit": run(threads, args.seconds, batching=False),
+            "group_commit": run(threads, args.seconds, batching=True),
+        })
+    print(json.dumps({"synchronous": config.DB_SYNCHRONOUS, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Importing this module points the application at a throwaway working
+directory (database and uploads), so it must be imported before `app`.
+"""
+
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Spawned worker processes re-import this module; they must share the parent's directory
+WORKDIR = os.environ.get("RECEIPTS_BENCH_WORKDIR") or tempfile.mkdtemp(prefix="receipts-bench-")
+os.environ["RECEIPTS_BENCH_WORKDIR"] = WORKDIR
+
+os.environ.setdefault("RECEIPTS_DB_PATH", os.path.join(WORKDIR, "receipts.db"))
+# Relative paths given on the command line refer to where the script was started
+INVOKED_FROM = os.getcwd()
+os.chdir(WORKDIR)
+sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples: list) -> dict:
+    """p50/p95/p99/max of latencies given in seconds, reported in milliseconds"""
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples, default=0) * 1000, 2),
+    }
+
+
+def sample_receipt_data(file_path: str) -> dict:
+    """Fixed extraction output, for benchmarks that measure the database path without running OCR"""
+    return {
+        "purchased_at": "2024-01-15 12:30:00",
+        "merchant_name": "Sample Store",
+        "total_amount": 25.99,
+        "file_path": file_path,
+        "items": '[{"name": "Milk 2%", "quantity": 1, "price": 3.99}]',
+        "payment_method": "CREDIT",
+        "tax_amount": 1.99,
+        "subtotal": 24.0,
+        "receipt_number": "000123",
+        "cashier": "Sam Patel",
+        "raw_text": "Sample Store\nMilk 2% 3.99\nTOTAL 25.99",
+        "extraction_stats": None,
+        "extractor_version": None,
+    }
+
+
+class LocalServer:
+    """Run an ASGI app under uvicorn on a free local port in a background thread"""
+
+    def __init__(self, app):
+        import uvicorn
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
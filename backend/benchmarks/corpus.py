@@ -0,0 +1,141 @@
+"""
+Synthetic receipt corpus generated with reportlab.
+
+Each receipt is rendered to a PDF with randomized merchants, items, label
+wording, date formats and payment methods, and its ground truth is written
+to manifest.json next to the PDFs.
+
+Usage:
+    python -m benchmarks.corpus --count 50 --out ./corpus
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+MERCHANTS = [
+    "WALMART", "Trader Joe's", "Whole Foods Market", "SAFEWAY", "Target", "Costco Wholesale",
+    "Kroger", "CVS Pharmacy", "Corner Deli & Grocery", "Blue Bottle Coffee", "Home Depot", "ALDI",
+]
+ITEMS = [
+    ("Milk 2%", 3.99), ("Whole Wheat Bread", 2.49), ("Large Eggs 12ct", 4.99), ("Bananas", 1.29),
+    ("Cheddar Cheese", 5.49), ("Greek Yogurt", 1.19), ("Chicken Breast", 9.87), ("Ground Coffee", 11.99),
+    ("Orange Juice", 4.29), ("Pasta Penne", 1.79), ("Tomato Sauce", 2.99), ("Romaine Lettuce", 2.19),
+    ("Avocado", 1.50), ("Olive Oil", 8.99), ("Paper Towels", 12.49), ("Dish Soap", 3.79),
+    ("Peanut Butter", 4.59), ("Strawberries", 3.99), ("Salmon Fillet", 14.32), ("Rice 5lb", 6.49),
+    ("Sparkling Water", 5.99), ("Granola", 4.79), ("Butter Unsalted", 4.49), ("Baby Spinach", 3.49),
+]
+CASHIERS = ["John Doe", "Maria Garcia", "Lee Wong", "Sam Patel", "Ana Souza"]
+PAYMENTS = [("VISA ****{last4}", "CREDIT"), ("MASTERCARD ****{last4}", "CREDIT"),
+            ("Payment: CASH", "CASH"), ("DEBIT ****{last4}", "DEBIT"), ("AMEX ****{last4}", "CREDIT")]
+DATE_FORMATS = ["%m/%d/%Y %I:%M %p", "%Y-%m-%d %H:%M", "%b %d, %Y %H:%M", "%d.%m.%Y %H:%M"]
+SUBTOTAL_LABELS = ["Subtotal", "SUB TOTAL", "Sub-total"]
+TOTAL_LABELS = ["TOTAL", "Total", "Amount Due", "BALANCE DUE"]
+NOISE = ["{n} Market Street", "Tel: (555) 0{n}-7788", "Thank you for shopping!", "Store #{n}"]
+
+
+def make_receipt(rng: random.Random, min_items: int, max_items: int) -> dict:
+    """Random receipt contents and the rendering choices that go with them"""
+    items = []
+    for _ in range(rng.randint(min_items, max_items)):
+        name, unit_price = rng.choice(ITEMS)
+        quantity = rng.choice([1, 1, 1, 2, 3])
+        items.append({"name": name, "price": round(unit_price * quantity, 2), "quantity": quantity})
+    subtotal = round(sum(item["price"] for item in items), 2)
+    tax_rate = rng.choice([0.0, 0.05, 0.0725, 0.0825, 0.1])
+    tax = round(subtotal * tax_rate, 2)
+    purchased_at = datetime(2023, 1, 1) + timedelta(minutes=rng.randint(0, 365 * 24 * 60))
+    payment_label, payment_method = rng.choice(PAYMENTS)
+    return {
+        "merchant_name": rng.choice(MERCHANTS),
+        "receipt_number": str(rng.randint(10000, 9999999)),
+        "cashier": rng.choice(CASHIERS),
+        "purchased_at": purchased_at.isoformat(sep=" "),
+        "items": items,
+        "subtotal": subtotal,
+        "tax_amount": tax if tax_rate else None,
+        "total_amount": round(subtotal + tax, 2),
+        "payment_method": payment_method,
+        "_layout": {
+            "date_format": rng.choice(DATE_FORMATS),
+            "subtotal_label": rng.choice(SUBTOTAL_LABELS),
+            "total_label": rng.choice(TOTAL_LABELS),
+            "payment_label": payment_label.format(last4=rng.randint(1000, 9999)),
+            "tax_rate": tax_rate,
+            "noise": [line.format(n=rng.randint(10, 999)) for line in rng.sample(NOISE, 2)],
+        },
+    }
+
+
+def render_receipt(path: str, receipt: dict):
+    """Draw a receipt as a (possibly multi-page) PDF"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    layout = receipt["_layout"]
+    pdf = canvas.Canvas(path, pagesize=letter)
+    width, height = letter
+    y = height - 50
+
+    def line(left: str, right: str | None = None, font: str = "Helvetica", size: int = 11):
+        nonlocal y
+        if y < 60:
+            pdf.showPage()
+            y = height - 50
+        pdf.setFont(font, size)
+        pdf.drawString(50, y, left)
+        if right is not None:
+            pdf.drawRightString(360, y, right)
+        y -= size + 5
+
+    line(receipt["merchant_name"], font="Helvetica-Bold", size=16)
+    line(layout["noise"][0])
+    line(f"Receipt #{receipt['receipt_number']}")
+    purchased_at = datetime.fromisoformat(receipt["purchased_at"])
+    line(f"Date: {purchased_at.strftime(layout['date_format'])}")
+    line(f"Cashier: {receipt['cashier']}")
+    y -= 10
+    for item in receipt["items"]:
+        label = item["name"] if item["quantity"] == 1 else f"{item['quantity']} x {item['name']}"
+        line(label, f"${item['price']:.2f}")
+    y -= 10
+    line(f"{layout['subtotal_label']}:", f"${receipt['subtotal']:.2f}")
+    if receipt["tax_amount"] is not None:
+        line(f"Tax {layout['tax_rate'] * 100:g}%:", f"${receipt['tax_amount']:.2f}")
+    line(f"{layout['total_label']}:", f"${receipt['total_amount']:.2f}", font="Helvetica-Bold")
+    line(layout["payment_label"], f"${receipt['total_amount']:.2f}")
+    line(layout["noise"][1])
+    pdf.save()
+
+
+def generate_corpus(directory: str, count: int, seed: int = 7, min_items: int = 3, max_items: int = 40) -> list:
+    """Render `count` receipts into `directory` and return their manifest entries"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = []
+    for index in range(count):
+        receipt = make_receipt(rng, min_items, max_items)
+        path = os.path.join(directory, f"receipt_{index:05d}.pdf")
+        render_receipt(path, receipt)
+        receipt.pop("_layout")
+        manifest.append({"file": path, "expected": receipt})
+    with open(os.path.join(directory, "manifest.json"), "w") as handle:
+        json.dump(manifest, handle, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--out", default="corpus")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-items", type=int, default=40)
+    args = parser.parse_args()
+    manifest = generate_corpus(os.path.abspath(args.out), args.count, args.seed, max_items=args.max_items)
+    print(f"Wrote {len(manifest)} receipts to {os.path.abspath(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Shared test setup.
+
+Settings are read when app modules are first imported, so the throwaway
+database, upload and cache locations are set here, before any test module
+imports `app`.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="receipts-test-")
+
+os.environ["RECEIPTS_DB_PATH"] = os.path.join(WORKDIR, "receipts.db")
+os.environ["RECEIPTS_UPLOAD_DIR"] = os.path.join(WORKDIR, "uploads")
+os.environ["RECEIPTS_OCR_CACHE_PATH"] = os.path.join(WORKDIR, "ocr_cache.db")
+os.environ["RECEIPTS_PROFILE_DIR"] = os.path.join(WORKDIR, "profiles")
+os.environ["RECEIPTS_STORAGE_FSYNC"] = "false"
+os.environ["RECEIPTS_JOB_WORKERS"] = "2"
+os.environ["RECEIPTS_JOB_POLL_INTERVAL"] = "0.05"
+# benchmarks.common (LocalServer) moves into this directory instead of creating its own
+os.environ["RECEIPTS_BENCH_WORKDIR"] = WORKDIR
+sys.path.insert(0, BACKEND_DIR)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def workdir():
+    yield WORKDIR
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def receipt_pdfs(workdir):
+    """Generated receipt PDFs with their ground truth, as benchmarks.corpus manifest entries"""
+    from benchmarks.corpus import generate_corpus
+    return generate_corpus(os.path.join(workdir, "corpus"), 4, seed=11, max_items=8)
+
+
+@pytest.fixture
+def write_pdf(tmp_path):
+    """Write raw PDF bytes to a file under tmp_path and return its path"""
+    def write(body: bytes, name: str = "test.pdf") -> str:
+        path = tmp_path / name
+        path.write_bytes(body)
+        return str(path)
+    return write
@@ -0,0 +1,113 @@
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.database import _backfill_receipt_items, get_db, run_write
+from app.services.analytics_service import AnalyticsService
+from app.services.receipt_service import ReceiptService
+from benchmarks.common import sample_receipt_data
+
+analytics_service = AnalyticsService()
+receipt_service = ReceiptService()
+
+
+def insert_receipt(purchased_at: datetime, **fields) -> int:
+    data = {**sample_receipt_data("uploads/analytics.pdf"), "purchased_at": purchased_at, **fields}
+    return run_write(lambda cursor: receipt_service.insert_receipt(cursor, data))
+
+
+def items_json(*items: tuple[str, float, int]) -> str:
+    return json.dumps([{"name": name, "price": price, "quantity": quantity} for name, price, quantity in items])
+
+
+def item_rows(receipt_id: int) -> list[tuple]:
+    with get_db() as conn:
+        return conn.execute('''
+            SELECT position, name, price, quantity, purchased_at FROM receipt_item
+            WHERE receipt_id = ? ORDER BY position
+        ''', (receipt_id,)).fetchall()
+
+
+def test_monthly_rollup_converts_aware_bounds_to_utc():
+    insert_receipt(datetime(1981, 1, 31, 23, 30), total_amount=1.0)
+    insert_receipt(datetime(1981, 2, 1, 0, 30), total_amount=2.0)
+    insert_receipt(datetime(1981, 2, 15, 12, 0), total_amount=4.0)
+    insert_receipt(datetime(1981, 3, 1, 0, 0), total_amount=8.0)
+    # 01:00 at UTC+2 is 23:00 UTC on the previous day, in the previous month
+    purchased_from = datetime(1981, 2, 1, 1, 0, tzinfo=timezone(timedelta(hours=2)))
+    months = analytics_service.spend_by_month(purchased_from, datetime(1981, 3, 1))
+    assert months == [
+        {"month": "1981-01", "receipts": 1, "total_spend": 1.0},
+        {"month": "1981-02", "receipts": 2, "total_spend": 6.0},
+    ]
+
+
+def test_merchant_and_payment_method_rollups():
+    merchant = uuid.uuid4().hex
+    for total, method in ((10.0, "CASH"), (20.0, "CASH"), (30.0, "CREDIT")):
+        insert_receipt(datetime(1982, 5, 1), merchant_name=merchant, total_amount=total, payment_method=method)
+    purchased_from, purchased_to = datetime(1982, 1, 1), datetime(1983, 1, 1)
+
+    merchants = analytics_service.spend_by_merchant(purchased_from, purchased_to)
+    assert merchants == [{"merchant_name": merchant, "receipts": 3, "total_spend": 60.0, "average_spend": 20.0}]
+    methods = analytics_service.spend_by_payment_method(purchased_from, purchased_to)
+    assert methods == [
+        {"payment_method": "CASH", "receipts": 2, "total_spend": 30.0},
+        {"payment_method": "CREDIT", "receipts": 1, "total_spend": 30.0},
+    ]
+
+
+def test_top_items_by_spend_and_quantity():
+    insert_receipt(datetime(1983, 6, 1), items=items_json(("Caviar", 90.0, 1), ("Gum", 1.0, 3)))
+    insert_receipt(datetime(1983, 6, 2), items=items_json(("Gum", 1.0, 4)))
+    purchased_from, purchased_to = datetime(1983, 1, 1), datetime(1984, 1, 1)
+
+    by_spend = analytics_service.top_items(purchased_from, purchased_to)
+    assert [(row["name"], row["total_spend"]) for row in by_spend] == [("Caviar", 90.0), ("Gum", 2.0)]
+    by_quantity = analytics_service.top_items(purchased_from, purchased_to, order_by="quantity")
+    assert [(row["name"], row["line_count"], row["quantity"]) for row in by_quantity] == [
+        ("Gum", 2, 7), ("Caviar", 1, 1)
+    ]
+    with pytest.raises(HTTPException) as raised:
+        analytics_service.top_items(order_by="name")
+    assert raised.value.status_code == 400
+
+
+def test_item_rows_follow_the_receipt():
+    receipt_id = insert_receipt(datetime(1984, 1, 1), items=items_json(("Tea", 2.5, 2), ("Jam", 4.0, 1)))
+    assert item_rows(receipt_id) == [
+        (0, "Tea", 2.5, 2, "1984-01-01 00:00:00"),
+        (1, "Jam", 4.0, 1, "1984-01-01 00:00:00"),
+    ]
+
+    def update(sql: str, value):
+        run_write(lambda cursor: cursor.execute(f'UPDATE receipt SET {sql} = ? WHERE id = ?', (value, receipt_id)))
+
+    update("items", '[{"name": "Bread", "price": 3.0}]')
+    assert item_rows(receipt_id) == [(0, "Bread", 3.0, 1, "1984-01-01 00:00:00")]
+    update("purchased_at", datetime(1984, 2, 2))
+    assert item_rows(receipt_id) == [(0, "Bread", 3.0, 1, "1984-02-02 00:00:00")]
+    # Malformed items leave the receipt without line items instead of failing the write
+    update("items", '[{"name": ')
+    assert item_rows(receipt_id) == []
+
+    update("items", items_json(("Tea", 2.5, 2)))
+    run_write(lambda cursor: cursor.execute('DELETE FROM receipt WHERE id = ?', (receipt_id,)))
+    assert item_rows(receipt_id) == []
+
+
+def test_backfill_copies_missing_item_rows_once():
+    missing = insert_receipt(datetime(1985, 1, 1), items=items_json(("Tea", 2.5, 2)))
+    present = insert_receipt(datetime(1985, 1, 1), items=items_json(("Jam", 4.0, 1)))
+    broken = insert_receipt(datetime(1985, 1, 1), items="not json")
+    # As for receipts stored before receipt_item and its triggers existed
+    run_write(lambda cursor: cursor.execute('DELETE FROM receipt_item WHERE receipt_id = ?', (missing,)))
+    before = item_rows(present)
+
+    run_write(_backfill_receipt_items)
+    assert item_rows(missing) == [(0, "Tea", 2.5, 2, "1985-01-01 00:00:00")]
+    assert item_rows(present) == before
+    assert item_rows(broken) == []
@@ -0,0 +1,262 @@
+"""
+End-to-end API tests against an in-process server.
+
+The app runs under uvicorn on a free local port with the test database and
+its embedded job runner, and is driven over HTTP with requests (the in-process
+TestClient would need httpx, which is not a dependency).
+"""
+
+import io
+import json
+import os
+import zipfile
+from datetime import datetime
+
+import pytest
+import requests
+
+from app import config
+from app.models.database import run_write
+from app.services.receipt_service import ReceiptService
+from benchmarks.common import LocalServer, sample_receipt_data
+
+
+@pytest.fixture(scope="module")
+def api():
+    from app.main import app
+
+    with LocalServer(app) as server:
+        session = requests.Session()
+        session.base_url = server.base_url
+        yield session
+
+
+def get(api, path: str, **kwargs):
+    return api.get(api.base_url + path, timeout=60, **kwargs)
+
+
+def post(api, path: str, **kwargs):
+    return api.post(api.base_url + path, timeout=120, **kwargs)
+
+
+def upload(api, path: str, endpoint: str = "/upload", name: str = "receipt.pdf"):
+    with open(path, "rb") as handle:
+        return post(api, endpoint, files={"file": (name, handle, "application/pdf")})
+
+
+def stored_files() -> set:
+    return {
+        os.path.join(directory, name)
+        for directory, _, names in os.walk(config.UPLOAD_DIR)
+        for name in names
+    }
+
+
+def test_root(api):
+    response = get(api, "/")
+    assert response.status_code == 200
+    assert response.json()["version"] == "1.0.0"
+
+
+def test_upload_rejects_non_pdf(api, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("not a receipt")
+    with open(path, "rb") as handle:
+        response = post(api, "/upload", files={"file": ("notes.txt", handle, "text/plain")})
+    assert response.status_code == 400
+
+
+def test_upload_validate_process(api, receipt_pdfs):
+    entry = receipt_pdfs[0]
+    uploaded = upload(api, entry["file"])
+    assert uploaded.status_code == 200
+    file_id = uploaded.json()["id"]
+    assert uploaded.json()["processing_state"] == "pending"
+
+    validated = post(api, "/validate", data={"file_id": file_id})
+    assert validated.status_code == 200
+    assert validated.json()["is_valid"] is True
+    assert validated.json()["page_count"] >= 1
+
+    processed = post(api, "/process", data={"file_id": file_id})
+    assert processed.status_code == 200, processed.text
+    receipt = processed.json()
+    assert receipt["merchant_name"] == entry["expected"]["merchant_name"]
+    assert receipt["total_amount"] == entry["expected"]["total_amount"]
+    assert len(receipt["items"]) == len(entry["expected"]["items"])
+
+    # Repeated calls return the same receipt instead of extracting again
+    assert post(api, "/process", data={"file_id": file_id}).json()["id"] == receipt["id"]
+    file_record = get(api, f"/files/{file_id}").json()
+    assert (file_record["processing_state"], file_record["receipt_id"]) == ("processed", receipt["id"])
+
+
+def test_duplicate_upload_reuses_the_record(api, receipt_pdfs):
+    first = upload(api, receipt_pdfs[1]["file"]).json()
+    second = upload(api, receipt_pdfs[1]["file"], name="copy.pdf").json()
+    assert second["id"] == first["id"]
+    assert second["is_duplicate"] is True
+
+
+def test_process_requires_a_valid_file(api, receipt_pdfs):
+    file_id = upload(api, receipt_pdfs[2]["file"]).json()["id"]
+    assert post(api, "/process", data={"file_id": file_id}).status_code == 400
+    assert post(api, "/process", data={"file_id": 10 ** 9}).status_code == 404
+
+
+def test_ingest_returns_the_receipt_once(api, receipt_pdfs):
+    entry = receipt_pdfs[3]
+    first = upload(api, entry["file"], endpoint="/ingest")
+    assert first.status_code == 200, first.text
+    assert first.json()["merchant_name"] == entry["expected"]["merchant_name"]
+    again = upload(api, entry["file"], endpoint="/ingest")
+    assert again.json()["id"] == first.json()["id"]
+
+
+def test_rejected_ingest_leaves_no_file(api, tmp_path):
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"%PDF-1.4\nnot really a pdf\n")
+    before = stored_files()
+    response = upload(api, str(path), endpoint="/ingest")
+    assert response.status_code == 400
+    assert "Invalid PDF file" in response.json()["detail"]
+    assert stored_files() == before
+
+
+def test_receipt_projection(api, receipt_pdfs):
+    receipt_id = upload(api, receipt_pdfs[3]["file"], endpoint="/ingest").json()["id"]
+    response = get(api, f"/receipts/{receipt_id}", params={"fields": "merchant_name,total_amount"})
+    assert set(response.json()) == {"id", "merchant_name", "total_amount"}
+    assert get(api, f"/receipts/{receipt_id}", params={"fields": "nope"}).status_code == 400
+    assert get(api, f"/receipts/{10 ** 9}").status_code == 404
+
+
+def test_list_endpoints_follow_cursors(api, receipt_pdfs):
+    for entry in receipt_pdfs:
+        upload(api, entry["file"])
+    listing = get(api, "/files", params={"limit": 1}).json()
+    assert len(listing["files"]) == 1
+    following = get(api, "/files", params={"limit": 1, "cursor": listing["next_cursor"]}).json()
+    assert following["files"][0]["id"] != listing["files"][0]["id"]
+    assert get(api, "/files", params={"cursor": "garbage"}).status_code == 400
+
+    receipts = get(api, "/receipts", params={"include_total": "false", "fields": "id"}).json()
+    assert receipts["total"] is None
+    assert all(set(receipt) == {"id"} for receipt in receipts["receipts"])
+
+
+def test_export_ndjson(api, receipt_pdfs):
+    receipt_id = upload(api, receipt_pdfs[3]["file"], endpoint="/ingest").json()["id"]
+    response = get(api, "/receipts/export", params={"format": "ndjson"})
+    assert response.status_code == 200
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert receipt_id in {row["id"] for row in rows}
+    assert all(isinstance(row["items"], list) for row in rows)
+
+
+def test_unknown_job(api):
+    assert get(api, f"/jobs/{10 ** 9}").status_code == 404
+
+
+def test_analytics_endpoints(api, receipt_pdfs):
+    entry = receipt_pdfs[0]
+    upload(api, entry["file"], endpoint="/ingest")
+    merchants = get(api, "/analytics/merchants").json()
+    assert entry["expected"]["merchant_name"] in {row["merchant_name"] for row in merchants}
+    monthly = get(api, "/analytics/monthly", params={"purchased_from": "2000-01-01T00:00:00+02:00"})
+    assert monthly.status_code == 200
+    assert all(row["month"] >= "1999-12" for row in monthly.json())
+    assert get(api, "/analytics/payment-methods").status_code == 200
+    top_items = get(api, "/analytics/top-items", params={"order_by": "quantity", "limit": 3})
+    assert top_items.status_code == 200 and len(top_items.json()) <= 3
+    assert get(api, "/analytics/top-items", params={"order_by": "name"}).status_code == 400
+
+
+def test_batch_upload_with_zip_archive(api, receipt_pdfs, tmp_path):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as bundle:
+        bundle.write(receipt_pdfs[1]["file"], "scans/second.pdf")
+        bundle.writestr("scans/readme.txt", "not a receipt")
+        bundle.writestr("__MACOSX/scans/._second.pdf", "resource fork")
+    with open(receipt_pdfs[0]["file"], "rb") as handle:
+        first = handle.read()
+    response = post(api, "/upload/batch", files=[
+        ("files", ("first.pdf", first, "application/pdf")),
+        ("files", ("notes.txt", b"not a receipt", "text/plain")),
+        ("files", ("scans.zip", archive.getvalue(), "application/zip")),
+        ("files", ("broken.zip", b"not a zip", "application/zip")),
+    ])
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert [result["file_name"] for result in body["results"]] == [
+        "first.pdf", "notes.txt", "second.pdf", "readme.txt", "broken.zip"
+    ]
+    assert [("id" in result, "error" in result) for result in body["results"]] == [
+        (True, False), (False, True), (True, False), (False, True), (False, True)
+    ]
+    assert (body["uploaded"], body["failed"]) == (2, 3)
+    # Files in the archive are stored like direct uploads
+    second = get(api, f"/files/{body['results'][2]['id']}").json()
+    assert second["content_hash"] == body["results"][2]["content_hash"]
+
+
+def test_batch_upload_checks_each_pdf_content_type(api, receipt_pdfs):
+    with open(receipt_pdfs[2]["file"], "rb") as handle:
+        content = handle.read()
+    response = post(api, "/upload/batch", files=[
+        ("files", ("typed.pdf", content, "application/pdf")),
+        ("files", ("untyped.pdf", content, "application/octet-stream")),
+    ])
+    results = response.json()["results"]
+    assert "id" in results[0]
+    assert results[1] == {"file_name": "untyped.pdf", "error": "Content-Type must be application/pdf"}
+
+
+def insert_receipt() -> int:
+    data = sample_receipt_data("uploads/etag.pdf")
+    return run_write(lambda cursor: ReceiptService().insert_receipt(cursor, data))
+
+
+def test_list_etag_changes_only_with_the_table(api):
+    insert_receipt()
+    first = get(api, "/receipts", params={"limit": 1})
+    etag = first.headers["ETag"]
+    cached = get(api, "/receipts", params={"limit": 1}, headers={"If-None-Match": etag})
+    assert (cached.status_code, cached.content, cached.headers["ETag"]) == (304, b"", etag)
+    # Other query strings are other representations
+    assert get(api, "/receipts", params={"limit": 2}, headers={"If-None-Match": etag}).status_code == 200
+
+    insert_receipt()
+    changed = get(api, "/receipts", params={"limit": 1}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+
+def test_receipt_etag_follows_updated_at(api):
+    receipt_id = insert_receipt()
+    path = f"/receipts/{receipt_id}"
+    etag = get(api, path).headers["ETag"]
+    assert get(api, path, headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+    # A projection is a different representation of the same version
+    assert get(api, path, params={"fields": "id"}, headers={"If-None-Match": etag}).status_code == 200
+
+    run_write(lambda cursor: cursor.execute('UPDATE receipt SET merchant_name = ?, updated_at = ? WHERE id = ?',
+                                            ("Renamed", datetime.utcnow(), receipt_id)))
+    changed = get(api, path, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["merchant_name"] == "Renamed"
+
+
+def test_metrics_are_labelled_by_route_template(api):
+    receipt_id = insert_receipt()
+    get(api, f"/receipts/{receipt_id}")
+    get(api, f"/files/{10 ** 9}")
+    get(api, "/no/such/route")
+    body = get(api, "/metrics").text
+    duration = "receipts_http_request_duration_seconds_count"
+    assert f'{duration}{{method="GET",route="/receipts/{{receipt_id}}",status="200"}}' in body
+    assert f'{duration}{{method="GET",route="/files/{{file_id}}",status="404"}}' in body
+    assert f'{duration}{{method="GET",route="unmatched",status="404"}}' in body
+    # Raw paths would give every receipt its own series
+    assert f'route="/receipts/{receipt_id}"' not in body
+    assert "receipts_job_queue_depth " in body
@@ -0,0 +1,111 @@
+import uuid
+
+from app.services import cache as cache_module
+from app.services.cache import TTLCache
+from app.services.file_service import FileService, file_cache
+
+file_service = FileService()
+
+
+def test_hits_misses_and_ratio():
+    cache = TTLCache(maxsize=10, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("a") == 1
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 1, 1)
+    assert stats["hit_ratio"] == round(2 / 3, 4)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    now[0] += 4.9
+    assert cache.get("a") == 1
+    now[0] += 0.2
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = TTLCache(maxsize=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
+
+
+def test_invalidate_and_clear():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.invalidate("a")
+    assert cache.get("a") is None
+    cache.clear()
+    assert cache.get("b") is None
+
+
+def test_value_read_before_an_invalidation_is_not_stored():
+    cache = TTLCache(maxsize=10, ttl=60)
+    generation = cache.generation()
+    # The row is read here; a writer commits and invalidates before the reader stores it
+    cache.invalidate("a")
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+    # Other keys and later reads are unaffected
+    cache.set("b", "fresh", generation)
+    cache.set("a", "fresh", cache.generation())
+    assert (cache.get("a"), cache.get("b")) == ("fresh", "fresh")
+
+
+def test_forgotten_invalidations_still_block_older_reads():
+    cache = TTLCache(maxsize=1, ttl=60)
+    generation = cache.generation()
+    cache.invalidate("a")
+    cache.invalidate("b")
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+    cache.clear()
+    cache.set("b", "stale", generation)
+    assert cache.get("b") is None
+
+
+def new_file_id() -> int:
+    content_hash = uuid.uuid4().hex
+    return file_service.create_file_record("r.pdf", f"uploads/{content_hash}.pdf", content_hash, 1)
+
+
+def test_file_record_is_refreshed_after_validation():
+    file_id = new_file_id()
+    assert file_service.get_file_record(file_id)[3] == 0  # is_valid
+    assert file_cache.get(file_id) is not None
+    file_service.update_file_validation(file_id, True, None, 1)
+    assert file_service.get_file_record(file_id)[3] == 1
+
+
+def test_stale_read_racing_a_validation_is_not_cached(monkeypatch):
+    file_id = new_file_id()
+    real_set = file_cache.set
+
+    def set_after_validation(key, value, generation=None):
+        # The reader already holds the unvalidated row when the validation commits
+        file_service.update_file_validation(file_id, True, None, 1)
+        real_set(key, value, generation)
+
+    monkeypatch.setattr(file_cache, "set", set_after_validation)
+    assert file_service.get_file_record(file_id)[3] == 0
+    monkeypatch.undo()
+    assert file_cache.get(file_id) is None
+    assert file_service.get_file_record(file_id)[3] == 1
@@ -0,0 +1,116 @@
+"""
+The pending -> processing -> processed (or failed) life cycle of a file,
+driven through JobService the way /process and the job runner drive it.
+"""
+
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.models.database import get_db
+from app.services.file_service import (
+    FILE_FAILED, FILE_PENDING, FILE_PROCESSED, FILE_PROCESSING, FileService
+)
+from app.services.job_service import (
+    CLAIM_IN_FLIGHT, CLAIM_PROCESSED, CLAIM_QUEUED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JOB_SUCCEEDED,
+    JobService
+)
+from benchmarks.common import sample_receipt_data
+
+job_service = JobService()
+
+
+@pytest.fixture
+def file_id():
+    content_hash = uuid.uuid4().hex
+    return FileService().create_file_record("receipt.pdf", f"uploads/{content_hash}.pdf", content_hash, 100)
+
+
+def file_state(file_id: int) -> tuple:
+    with get_db() as conn:
+        return conn.execute('SELECT processing_state, receipt_id FROM receipt_file WHERE id = ?',
+                            (file_id,)).fetchone()
+
+
+def claim_job(job_id: int) -> tuple:
+    claimed = job_service.claim_next()
+    assert claimed is not None and claimed[0] == job_id
+    return claimed
+
+
+def test_new_file_is_pending(file_id):
+    assert file_state(file_id) == (FILE_PENDING, None)
+
+
+def test_claim_queues_one_job_and_later_claims_join_it(file_id):
+    outcome, job_id = job_service.claim_processing(file_id)
+    assert outcome == CLAIM_QUEUED
+    assert file_state(file_id) == (FILE_PROCESSING, None)
+    assert job_service.get_job(job_id)["status"] == JOB_QUEUED
+
+    assert job_service.claim_processing(file_id) == (CLAIM_IN_FLIGHT, job_id)
+    claim_job(job_id)
+    # Still the same job while it runs
+    assert job_service.claim_processing(file_id) == (CLAIM_IN_FLIGHT, job_id)
+    assert job_service.get_job(job_id)["status"] == JOB_RUNNING
+    job_service.fail_job(job_id, "cleanup")
+
+
+def test_concurrent_claims_share_one_job(file_id):
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        outcomes = list(executor.map(job_service.claim_processing, [file_id] * 32))
+    assert [outcome for outcome, _ in outcomes].count(CLAIM_QUEUED) == 1
+    job_ids = {job_id for _, job_id in outcomes}
+    assert len(job_ids) == 1
+    job_service.fail_job(job_ids.pop(), "cleanup")
+
+
+def test_completed_job_marks_file_processed(file_id):
+    _, job_id = job_service.claim_processing(file_id)
+    _, claimed_file_id, attempts, file_path, content_hash = claim_job(job_id)
+    assert (claimed_file_id, attempts) == (file_id, 1)
+
+    receipt_id = job_service.complete_job(job_id, file_id, sample_receipt_data(file_path), content_hash)
+    assert file_state(file_id) == (FILE_PROCESSED, receipt_id)
+    job = job_service.get_job(job_id)
+    assert (job["status"], job["receipt_id"]) == (JOB_SUCCEEDED, receipt_id)
+    # Processed files are never queued again
+    assert job_service.claim_processing(file_id) == (CLAIM_PROCESSED, receipt_id)
+
+
+def test_completing_twice_keeps_the_first_receipt(file_id):
+    _, job_id = job_service.claim_processing(file_id)
+    _, _, _, file_path, content_hash = claim_job(job_id)
+    first = job_service.complete_job(job_id, file_id, sample_receipt_data(file_path), content_hash)
+    # A retried attempt finishing late must not store a duplicate receipt
+    second = job_service.complete_job(job_id, file_id, sample_receipt_data(file_path), content_hash)
+    assert first == second
+    assert file_state(file_id) == (FILE_PROCESSED, first)
+
+
+def test_failed_job_marks_file_failed_and_it_can_be_claimed_again(file_id):
+    _, job_id = job_service.claim_processing(file_id)
+    claim_job(job_id)
+    job_service.fail_job(job_id, "OCR failed")
+    assert file_state(file_id) == (FILE_FAILED, None)
+    job = job_service.get_job(job_id)
+    assert (job["status"], job["error"]) == (JOB_FAILED, "OCR failed")
+
+    outcome, retry_job_id = job_service.claim_processing(file_id)
+    assert outcome == CLAIM_QUEUED
+    assert retry_job_id != job_id
+    assert file_state(file_id) == (FILE_PROCESSING, None)
+    job_service.fail_job(retry_job_id, "cleanup")
+
+
+def test_retried_job_stays_in_flight(file_id):
+    _, job_id = job_service.claim_processing(file_id)
+    claim_job(job_id)
+    job_service.fail_job(job_id, "Worker crashed", retry=True)
+    assert file_state(file_id) == (FILE_PROCESSING, None)
+    assert job_service.claim_processing(file_id) == (CLAIM_IN_FLIGHT, job_id)
+
+    _, _, attempts, _, _ = claim_job(job_id)
+    assert attempts == 2
+    job_service.fail_job(job_id, "cleanup")
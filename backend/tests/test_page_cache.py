@@ -0,0 +1,106 @@
+import sqlite3
+
+import pytest
+
+from app.extraction import page_cache as page_cache_module
+from app.extraction.engine import tsv_text
+from app.extraction.page_cache import ROW_OVERHEAD_BYTES, PageCache
+
+
+def new_cache(tmp_path, max_bytes: int = 10 ** 6) -> PageCache:
+    return PageCache(str(tmp_path / "ocr_cache.db"), max_bytes)
+
+
+def test_hits_misses_and_stats(tmp_path):
+    cache = new_cache(tmp_path)
+    assert cache.get("hash", 1, "tesseract") is None
+    cache.put("hash", 1, "tesseract", "TOTAL 9.52", raster_ms=12.0, ocr_ms=340.0)
+    page = cache.get("hash", 1, "tesseract")
+    assert (page.text, page.raster_ms, page.ocr_ms) == ("TOTAL 9.52", 12.0, 340.0)
+    # Other pages and other engine settings are separate entries
+    assert cache.get("hash", 2, "tesseract") is None
+    assert cache.get("hash", 1, "tesseract-psm4") is None
+    assert cache.stats() == {"entries": 1, "bytes": len("TOTAL 9.52") + ROW_OVERHEAD_BYTES, "max_bytes": 10 ** 6}
+
+    cache.put("hash", 1, "tesseract", "TOTAL 9.53")
+    assert cache.get("hash", 1, "tesseract").text == "TOTAL 9.53"
+    assert cache.stats()["entries"] == 1
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(page_cache_module.time, "time", lambda: now[0])
+    text = "x" * 872
+    cache = new_cache(tmp_path, max_bytes=3 * (len(text) + ROW_OVERHEAD_BYTES))
+    for page_number in (1, 2, 3):
+        cache.put("hash", page_number, "tesseract", text)
+        now[0] += 1
+    # The hit on page 1 is written with the next put, so page 2 is now the oldest
+    assert cache.get("hash", 1, "tesseract") is not None
+    now[0] += 1
+    cache.put("hash", 4, "tesseract", text)
+
+    # Eviction goes down to the low-water mark, so it takes page 3 along with page 2
+    assert [cache.get("hash", page_number, "tesseract") is not None for page_number in (1, 2, 3, 4)] == [
+        True, False, False, True
+    ]
+    assert cache.stats()["bytes"] <= cache.max_bytes * page_cache_module.EVICTION_TARGET
+
+
+def test_touches_are_flushed_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setattr(page_cache_module, "TOUCH_BATCH", 2)
+    cache = new_cache(tmp_path)
+    for page_number in (1, 2):
+        cache.put("hash", page_number, "tesseract", "text")
+    cache.get("hash", 1, "tesseract")
+    assert len(cache._touched) == 1
+    cache.get("hash", 2, "tesseract")
+    assert cache._touched == {}
+
+
+def test_zero_size_cache_stores_nothing(tmp_path):
+    cache = new_cache(tmp_path, max_bytes=0)
+    cache.put("hash", 1, "tesseract", "text")
+    assert cache.get("hash", 1, "tesseract") is None
+
+
+def test_layout_is_stored_with_the_text(tmp_path):
+    cache = new_cache(tmp_path)
+    layout = "level\tpage_num\ttext\n5\t1\tTOTAL\n"
+    cache.put("hash", 1, "tesseract", "TOTAL", layout=layout)
+    assert cache.get("hash", 1, "tesseract").layout == layout
+    assert cache.stats()["bytes"] == len("TOTAL") + len(layout) + ROW_OVERHEAD_BYTES
+
+
+def test_failed_touch_flush_leaves_no_transaction_open(tmp_path, monkeypatch):
+    monkeypatch.setattr(page_cache_module, "TOUCH_BATCH", 1)
+    cache = new_cache(tmp_path)
+    cache.put("hash", 1, "tesseract", "text")
+
+    def fail(conn):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(cache, "_flush_touches", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        cache.get("hash", 1, "tesseract")
+    monkeypatch.undo()
+    assert not cache._connection().in_transaction
+    cache.put("hash", 2, "tesseract", "text")
+    assert cache.stats()["entries"] == 2
+
+
+def test_tsv_text():
+    header = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+    rows = [
+        "1\t1\t0\t0\t0\t0\t0\t0\t600\t800\t-1\t",
+        "4\t1\t1\t1\t1\t0\t10\t10\t200\t20\t-1\t",
+        "5\t1\t1\t1\t1\t1\t10\t10\t90\t20\t96.1\tWHOLE",
+        "5\t1\t1\t1\t1\t2\t110\t10\t90\t20\t95.3\tFOODS",
+        "5\t1\t1\t1\t2\t1\t10\t40\t90\t20\t91.0\tMilk",
+        "5\t1\t1\t1\t2\t2\t110\t40\t90\t20\t90.2\t3.99",
+        "5\t1\t1\t2\t1\t1\t10\t90\t90\t20\t94.0\tTOTAL",
+        "5\t1\t1\t2\t1\t2\t110\t90\t90\t20\t-1\t ",
+        "5\t1\t1\t2\t1\t3\t210\t90\t90\t20\t93.5\t3.99",
+    ]
+    assert tsv_text("\n".join([header, *rows])) == "WHOLE FOODS\nMilk 3.99\n\nTOTAL 3.99\n"
+    assert tsv_text(header) == ""
@@ -0,0 +1,131 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.database import get_db, run_write
+from app.services.file_service import FileService
+from app.services.pagination import MAX_PAGE_SIZE, clamp_limit, decode_cursor, encode_cursor
+from app.services.receipt_service import ReceiptService
+from benchmarks.common import sample_receipt_data
+
+receipt_service = ReceiptService()
+file_service = FileService()
+
+
+def insert_receipts(count: int, created_at: datetime | None = None) -> list[int]:
+    """Insert receipts in one write; with created_at they all share that timestamp"""
+    def insert(cursor):
+        ids = [receipt_service.insert_receipt(cursor, sample_receipt_data(f"uploads/{index}.pdf"))
+               for index in range(count)]
+        if created_at is not None:
+            cursor.executemany('UPDATE receipt SET created_at = ? WHERE id = ?',
+                               [(created_at, receipt_id) for receipt_id in ids])
+        return ids
+    return run_write(insert)
+
+
+def all_pages(fetch, key: str, limit: int) -> list[list[int]]:
+    """IDs of every page, following next_cursor until it runs out"""
+    pages = []
+    page_cursor = None
+    while True:
+        page = fetch(limit=limit, page_cursor=page_cursor)
+        pages.append([row["id"] for row in page[key]])
+        page_cursor = page["next_cursor"]
+        if page_cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("2024-01-15 12:30:00.123456", 42)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, 2) == ["2024-01-15 12:30:00.123456", 42]
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor!", encode_cursor(1, 2, 3), encode_cursor()])
+def test_malformed_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor, 2)
+    assert raised.value.status_code == 400
+
+
+def test_clamp_limit():
+    assert clamp_limit(0) == 1
+    assert clamp_limit(50) == 50
+    assert clamp_limit(10 ** 6) == MAX_PAGE_SIZE
+
+
+def test_receipt_pages_cover_every_row_once():
+    insert_receipts(7)
+    expected = [row["id"] for row in receipt_service.get_all_receipts(limit=MAX_PAGE_SIZE)["receipts"]]
+    pages = all_pages(receipt_service.get_all_receipts, "receipts", 3)
+    assert [receipt_id for page in pages for receipt_id in page] == expected
+    assert all(len(page) == 3 for page in pages[:-1])
+
+
+def test_rows_with_equal_timestamps_are_split_by_id():
+    ids = insert_receipts(5, created_at=datetime(2000, 1, 1))
+    pages = all_pages(receipt_service.get_all_receipts, "receipts", 2)
+    seen = [receipt_id for page in pages for receipt_id in page]
+    assert [receipt_id for receipt_id in seen if receipt_id in ids] == sorted(ids, reverse=True)
+
+
+def test_cursor_is_stable_when_newer_rows_arrive():
+    insert_receipts(4)
+    first = receipt_service.get_all_receipts(limit=2)
+    rest = receipt_service.get_all_receipts(limit=MAX_PAGE_SIZE, page_cursor=first["next_cursor"])
+    newer = insert_receipts(3)
+    # Unlike OFFSET paging, rows added meanwhile neither shift nor repeat the next page
+    again = receipt_service.get_all_receipts(limit=MAX_PAGE_SIZE, page_cursor=first["next_cursor"])
+    assert again["receipts"] == rest["receipts"]
+    assert not set(newer) & {row["id"] for row in again["receipts"]}
+
+
+def test_file_pages_with_filter_and_projection():
+    for _ in range(5):
+        content_hash = uuid.uuid4().hex
+        file_id = file_service.create_file_record("r.pdf", f"uploads/{content_hash}.pdf", content_hash, 1)
+        file_service.update_file_validation(file_id, True, None, 1)
+    expected = [row["id"] for row in file_service.get_all_files(limit=MAX_PAGE_SIZE, is_valid=True)["files"]]
+
+    def fetch(limit, page_cursor):
+        return file_service.get_all_files(limit=limit, page_cursor=page_cursor, is_valid=True, fields=("id",))
+
+    pages = all_pages(fetch, "files", 2)
+    assert [file_id for page in pages for file_id in page] == expected
+    # created_at is read for the cursor but not returned when it is not projected
+    assert set(fetch(2, None)["files"][0]) == {"id"}
+
+
+def test_export_batches_match_a_single_batch():
+    insert_receipts(5)
+    whole = "".join(receipt_service.iter_export("ndjson", batch_size=MAX_PAGE_SIZE))
+    batched = "".join(receipt_service.iter_export("ndjson", batch_size=2))
+    assert batched == whole
+    ids = [json.loads(line)["id"] for line in batched.splitlines()]
+    assert ids == sorted(set(ids))
+
+
+def test_export_replaces_malformed_items_with_an_empty_list():
+    def insert(cursor):
+        ids = [receipt_service.insert_receipt(cursor, sample_receipt_data("uploads/broken.pdf")) for _ in range(3)]
+        cursor.executemany('UPDATE receipt SET items = ? WHERE id = ?',
+                           [('[{"name": "cut off', ids[0]), (None, ids[1])])
+        return ids
+    ids = run_write(insert)
+    rows = {row["id"]: row for row in map(json.loads, "".join(receipt_service.iter_export("ndjson")).splitlines())}
+    assert [rows[receipt_id]["items"] for receipt_id in ids] == [[], [], json.loads(sample_receipt_data("")["items"])]
+
+
+@pytest.mark.parametrize("where", ["", "WHERE is_valid = 1", "WHERE is_processed = 0",
+                                   "WHERE is_valid = 1 AND is_processed = 0"])
+def test_file_filters_are_listed_in_index_order(where):
+    with get_db() as conn:
+        plan = conn.execute(f'''
+            EXPLAIN QUERY PLAN SELECT id, file_name, created_at FROM receipt_file {where}
+            ORDER BY created_at DESC, id DESC LIMIT 101
+        ''').fetchall()
+    assert not any("TEMP B-TREE" in row[-1] for row in plan)
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+
+from app.extraction.parser import parse_amount, parse_receipt_text
+
+RECEIPT = """WALMART
+123 Market Street
+Receipt #A12345
+Date: 03/14/2024 02:30 PM
+Cashier: Maria Garcia
+Milk 2%    $3.99
+2 x Whole Wheat Bread    $4.98
+Subtotal:   $8.97
+Tax 5%:   $0.45
+Sales Tax   $0.10
+TOTAL:   $9.52
+VISA ****1234   $9.52
+Change  $0.00
+Thank you for shopping!
+"""
+
+
+def test_parses_every_field_in_one_pass():
+    fields = parse_receipt_text(RECEIPT)
+    assert fields["merchant_name"] == "WALMART"
+    assert fields["receipt_number"] == "A12345"
+    assert fields["purchased_at"] == datetime(2024, 3, 14, 14, 30)
+    assert fields["cashier"] == "Maria Garcia"
+    assert fields["subtotal"] == 8.97
+    assert fields["total_amount"] == 9.52
+    assert fields["payment_method"] == "CREDIT"
+    assert fields["items"] == [
+        {"name": "Milk 2%", "price": 3.99, "quantity": 1},
+        {"name": "Whole Wheat Bread", "price": 4.98, "quantity": 2},
+    ]
+
+
+def test_tax_lines_add_up():
+    assert parse_receipt_text(RECEIPT)["tax_amount"] == 0.55
+
+
+def test_change_line_is_not_an_item_or_total():
+    fields = parse_receipt_text(RECEIPT)
+    assert all(item["name"] != "Change" for item in fields["items"])
+    assert fields["total_amount"] == 9.52
+
+
+def test_last_total_wins():
+    fields = parse_receipt_text("SHOP\nTotal  $5.00\nBALANCE DUE  $4.50\n")
+    assert fields["total_amount"] == 4.50
+
+
+def test_date_formats():
+    assert parse_receipt_text("2024-01-05 09:15")["purchased_at"] == datetime(2024, 1, 5, 9, 15)
+    assert parse_receipt_text("05.01.2024 09:15")["purchased_at"] == datetime(2024, 1, 5, 9, 15)
+    assert parse_receipt_text("Mar 5, 2024 18:05")["purchased_at"] == datetime(2024, 3, 5, 18, 5)
+    assert parse_receipt_text("12/31/24 12:10 AM")["purchased_at"] == datetime(2024, 12, 31, 0, 10)
+
+
+def test_invalid_date_is_ignored():
+    assert parse_receipt_text("Date: 13/45/2024")["purchased_at"] is None
+
+
+def test_empty_text():
+    fields = parse_receipt_text("")
+    assert fields["merchant_name"] is None
+    assert fields["items"] == []
+    assert fields["tax_amount"] is None
+
+
+def test_parse_amount():
+    assert parse_amount("$1,234.50") == 1234.50
+    assert parse_amount("12,39") == 12.39
+    assert parse_amount("-$ 3.00") == -3.00
+
+
+def test_generated_receipt_text(receipt_pdfs):
+    from app.extraction.pdf_text import extract_page_texts
+
+    for entry in receipt_pdfs:
+        fields = parse_receipt_text("\n".join(extract_page_texts(entry["file"])))
+        expected = entry["expected"]
+        assert fields["merchant_name"] == expected["merchant_name"]
+        assert fields["total_amount"] == expected["total_amount"]
+        assert fields["subtotal"] == expected["subtotal"]
+        assert len(fields["items"]) == len(expected["items"])
+
+
+@pytest.mark.parametrize("line", ["Total Savings 1.00", "Total Discount $1.00", "TOTAL COUPONS 0.50"])
+def test_savings_and_discount_totals_are_not_the_total(line):
+    fields = parse_receipt_text(f"SHOP\nTOTAL 5.70\n{line}\n")
+    assert fields["total_amount"] == 5.70
+    assert fields["items"] == []
+
+
+def test_total_tax_line_is_tax():
+    fields = parse_receipt_text("SHOP\nTotal Tax 0.45\nTOTAL 5.70\n")
+    assert (fields["tax_amount"], fields["total_amount"]) == (0.45, 5.70)
+
+
+def test_total_label_takes_only_separators_before_the_amount():
+    assert parse_receipt_text("Total due: $ 9.52")["total_amount"] == 9.52
+    assert parse_receipt_text("Total of purchases today 9.52")["total_amount"] is None
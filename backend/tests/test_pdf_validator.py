@@ -0,0 +1,102 @@
+from app.extraction import pdf_validator
+from app.extraction.pdf_validator import validate_pdf
+
+
+def build_pdf(objects: list[bytes], root: int = 1, xref_stream: bool = False) -> bytes:
+    """A PDF with the given object bodies (numbered from 1) and a correct cross-reference section"""
+    body = b"%PDF-1.7\n"
+    offsets = []
+    for number, content in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += b"%d 0 obj\n%s\nendobj\n" % (number, content)
+    xref_offset = len(body)
+    if xref_stream:
+        # The validator only checks the stream's /Type; the entries are never decoded
+        body += b"%d 0 obj\n<< /Type /XRef /Root %d 0 R >>\nstream\nendstream\nendobj\n" % (len(objects) + 1, root)
+    else:
+        body += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        body += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        body += b"trailer\n<< /Size %d /Root %d 0 R >>\n" % (len(objects) + 1, root)
+    return body + b"startxref\n%d\n%%%%EOF\n" % xref_offset
+
+
+TWO_PAGES = [
+    b"<< /Type /Catalog /Pages 2 0 R >>",
+    b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>",
+    b"<< /Type /Page /Parent 2 0 R >>",
+    b"<< /Type /Page /Parent 2 0 R >>",
+]
+
+
+def test_valid_pdf_reports_version_and_page_count(write_pdf):
+    result = validate_pdf(write_pdf(build_pdf(TWO_PAGES)))
+    assert result.is_valid
+    assert result.version == "1.7"
+    assert result.page_count == 2
+
+
+def test_generated_receipts_are_valid(receipt_pdfs):
+    for entry in receipt_pdfs:
+        result = validate_pdf(entry["file"])
+        assert result.is_valid, result.invalid_reason
+        assert result.page_count >= 1
+
+
+def test_missing_and_empty_files(write_pdf, tmp_path):
+    assert validate_pdf(str(tmp_path / "missing.pdf")).invalid_reason == "File not found"
+    assert validate_pdf(write_pdf(b"")).invalid_reason == "File is empty"
+
+
+def test_missing_header(write_pdf):
+    result = validate_pdf(write_pdf(b"hello" + build_pdf(TWO_PAGES)[9:]))
+    assert not result.is_valid
+    assert result.invalid_reason == "Missing %PDF- header"
+
+
+def test_truncated_file_has_no_eof_marker(write_pdf):
+    body = build_pdf(TWO_PAGES)
+    result = validate_pdf(write_pdf(body[:len(body) // 2]))
+    assert not result.is_valid
+    assert result.invalid_reason == "Missing %%EOF marker"
+
+
+def test_startxref_beyond_end_of_file(write_pdf):
+    body = build_pdf(TWO_PAGES)
+    body = body[:body.rindex(b"startxref")] + b"startxref\n999999\n%%EOF\n"
+    result = validate_pdf(write_pdf(body))
+    assert not result.is_valid
+    assert "beyond the end of the file" in result.invalid_reason
+
+
+def test_catalog_without_page_tree(write_pdf):
+    result = validate_pdf(write_pdf(build_pdf([b"<< /Type /Catalog >>"])))
+    assert not result.is_valid
+    assert result.invalid_reason == "Catalog has no /Pages tree"
+
+
+def test_empty_page_tree(write_pdf):
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Kids [] /Count 0 >>"]
+    result = validate_pdf(write_pdf(build_pdf(objects)))
+    assert not result.is_valid
+    assert result.page_count == 0
+
+
+def test_xref_stream_pages_are_counted_by_scan(write_pdf):
+    result = validate_pdf(write_pdf(build_pdf(TWO_PAGES, xref_stream=True)))
+    assert result.is_valid
+    assert result.page_count == 2
+
+
+def test_xref_stream_with_object_streams_leaves_page_count_unknown(write_pdf):
+    objects = TWO_PAGES + [b"<< /Type /ObjStm /N 0 /First 0 >>"]
+    result = validate_pdf(write_pdf(build_pdf(objects, xref_stream=True)))
+    assert result.is_valid
+    assert result.page_count is None
+
+
+def test_page_scan_is_skipped_above_the_size_limit(write_pdf, monkeypatch):
+    body = build_pdf(TWO_PAGES, xref_stream=True)
+    monkeypatch.setattr(pdf_validator, "PAGE_SCAN_LIMIT", len(body) - 1)
+    result = validate_pdf(write_pdf(body))
+    assert result.is_valid
+    assert result.page_count is None
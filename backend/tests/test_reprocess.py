@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from app.models.database import run_write
+from app.services.receipt_service import EXTRACTOR_VERSION, ReceiptService
+from app.services.reprocess_service import (
+    RUN_COMPLETED, RUN_PENDING, RUN_RUNNING, RUN_SUPERSEDED, ReprocessService,
+)
+from benchmarks.common import sample_receipt_data
+
+receipt_service = ReceiptService()
+reprocess_service = ReprocessService()
+
+
+def fresh_run(batch_size: int = 2) -> dict:
+    """Start a new run for the current version, completing any left over from earlier tests"""
+    run_write(lambda cursor: cursor.execute(
+        'UPDATE reprocess_run SET status = ?, lease_owner = NULL WHERE status NOT IN (?, ?)',
+        (RUN_COMPLETED, RUN_COMPLETED, RUN_SUPERSEDED)))
+    return reprocess_service.start_run(batch_size)
+
+
+def expire_lease(run_id: int):
+    run_write(lambda cursor: cursor.execute(
+        'UPDATE reprocess_run SET lease_expires_at = ? WHERE id = ?',
+        (datetime.utcnow() - timedelta(seconds=1), run_id)))
+
+
+def test_expired_lease_is_taken_over():
+    run = fresh_run()
+    first = reprocess_service.claim_run(run["id"])
+    assert first["status"] == RUN_RUNNING
+    # Nobody else can claim the run while its lease holds
+    assert reprocess_service.claim_run(run["id"]) is None
+
+    expire_lease(run["id"])
+    second = reprocess_service.claim_run(run["id"])
+    assert second["lease_owner"] != first["lease_owner"]
+
+    # The previous owner can no longer renew, checkpoint, finish or release the run
+    assert reprocess_service.renew_lease(run["id"], first["lease_owner"]) is False
+    assert reprocess_service.complete_batch(run["id"], first["lease_owner"], 10 ** 9, []) is None
+    reprocess_service.finish_run(run["id"], first["lease_owner"])
+    reprocess_service.release_run(run["id"], first["lease_owner"])
+    current = reprocess_service.get_run(run["id"])
+    assert (current["status"], current["last_receipt_id"]) == (RUN_RUNNING, 0)
+    assert reprocess_service.renew_lease(run["id"], second["lease_owner"]) is True
+
+
+def test_checkpoint_survives_release_and_resume():
+    run = fresh_run(batch_size=2)
+    ids = run_write(lambda cursor: [
+        receipt_service.insert_receipt(cursor, sample_receipt_data(f"uploads/reprocess-{index}.pdf"))
+        for index in range(3)
+    ])
+    # Start right before these receipts so the rest of the test database stays out of the batches
+    run_write(lambda cursor: cursor.execute(
+        'UPDATE reprocess_run SET last_receipt_id = ? WHERE id = ?', (ids[0] - 1, run["id"])))
+
+    claimed = reprocess_service.claim_run(run["id"])
+    owner = claimed["lease_owner"]
+    batch = reprocess_service.next_batch(claimed)
+    assert [row[0] for row in batch] == ids[:2]
+
+    updates = [(receipt_id, {**sample_receipt_data(path), "merchant_name": "Reprocessed",
+                             "extractor_version": EXTRACTOR_VERSION})
+               for receipt_id, path, _ in batch]
+    assert reprocess_service.complete_batch(run["id"], owner, batch[-1][0], updates) == RUN_RUNNING
+    assert receipt_service.get_receipt(ids[0])["merchant_name"] == "Reprocessed"
+
+    # A runner that stops hands the run back; the next one resumes after the checkpoint
+    reprocess_service.release_run(run["id"], owner)
+    assert reprocess_service.get_run(run["id"])["status"] == RUN_PENDING
+    resumed = reprocess_service.claim_run(run["id"])
+    assert (resumed["last_receipt_id"], resumed["processed"]) == (ids[1], 2)
+    assert [row[0] for row in reprocess_service.next_batch(resumed)] == ids[2:]
+
+
+def test_runs_for_an_older_version_are_superseded():
+    fresh_run()
+    old_id = run_write(lambda cursor: cursor.execute('''
+        INSERT INTO reprocess_run (target_version, status, batch_size, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ("old", RUN_PENDING, 10, datetime.utcnow(), datetime.utcnow())).lastrowid)
+    # A run for another version is never claimed, so it cannot stamp receipts with that version
+    assert reprocess_service.claim_run(old_id) is None
+
+    current = reprocess_service.start_run()
+    assert current["target_version"] == EXTRACTOR_VERSION
+    old = reprocess_service.get_run(old_id)
+    assert (old["status"], old["finished_at"] is not None) == (RUN_SUPERSEDED, True)
+    # The unfinished run for the current version is returned instead of a new one
+    assert reprocess_service.start_run()["id"] == current["id"]
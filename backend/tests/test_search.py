@@ -0,0 +1,82 @@
+import subprocess
+import sys
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.models.database import run_write
+from app.services.receipt_service import ReceiptService, build_search_query
+from benchmarks.common import sample_receipt_data
+from conftest import BACKEND_DIR
+
+receipt_service = ReceiptService()
+
+
+def insert_receipt(**fields) -> int:
+    data = {**sample_receipt_data("uploads/search.pdf"), **fields}
+    return run_write(lambda cursor: receipt_service.insert_receipt(cursor, data))
+
+
+def search_ids(query: str, **kwargs) -> list[int]:
+    return [hit["id"] for hit in receipt_service.search_receipts(query, **kwargs)["results"]]
+
+
+def test_build_search_query():
+    assert build_search_query("Whole  foods!") == '"Whole"* "foods"*'
+    assert build_search_query("  ?! ") is None
+
+
+def test_empty_query_is_a_400():
+    with pytest.raises(HTTPException) as raised:
+        receipt_service.search_receipts("--")
+    assert raised.value.status_code == 400
+
+
+def test_prefix_terms_must_all_match():
+    word = uuid.uuid4().hex[:10]
+    both = insert_receipt(merchant_name=f"{word} Grocery")
+    insert_receipt(merchant_name=f"{word} Hardware")
+    assert search_ids(f"{word[:6]} groc") == [both]
+
+
+def test_item_names_and_raw_text_are_searchable():
+    word = uuid.uuid4().hex[:10]
+    by_item = insert_receipt(items=f'[{{"name": "{word}", "price": 1.0, "quantity": 1}}]')
+    by_text = insert_receipt(raw_text=f"... {word}z ...")
+    assert set(search_ids(word)) == {by_item, by_text}
+
+
+def test_merchant_match_ranks_above_raw_text():
+    word = uuid.uuid4().hex[:10]
+    in_text = insert_receipt(raw_text=f"lots of OCR text mentioning {word} once")
+    in_merchant = insert_receipt(merchant_name=word)
+    assert search_ids(word) == [in_merchant, in_text]
+
+
+def test_updated_receipt_is_reindexed():
+    old, new = uuid.uuid4().hex[:10], uuid.uuid4().hex[:10]
+    receipt_id = insert_receipt(merchant_name=old)
+    run_write(lambda cursor: cursor.execute('UPDATE receipt SET merchant_name = ? WHERE id = ?', (new, receipt_id)))
+    assert search_ids(old) == []
+    assert search_ids(new) == [receipt_id]
+
+
+def test_pages_follow_the_cursor():
+    word = uuid.uuid4().hex[:10]
+    ids = {insert_receipt(merchant_name=word) for _ in range(5)}
+    first = receipt_service.search_receipts(word, limit=3)
+    rest = receipt_service.search_receipts(word, limit=3, page_cursor=first["next_cursor"])
+    assert rest["next_cursor"] is None
+    assert {hit["id"] for hit in first["results"] + rest["results"]} == ids
+
+
+def test_search_survives_another_process_importing_the_database_module():
+    word = uuid.uuid4().hex[:10]
+    receipt_id = insert_receipt(merchant_name=word)
+    # Pooled connections have already used the FTS table
+    assert search_ids(word) == [receipt_id]
+    # Job workers, other API workers and the CLIs all run init_database() on import
+    subprocess.run([sys.executable, "-c", "import app.models.database"], cwd=BACKEND_DIR, check=True)
+    for _ in range(4):
+        assert search_ids(word) == [receipt_id]
@@ -0,0 +1,79 @@
+import gzip
+import hashlib
+import os
+
+import pytest
+
+from app.services.storage import ShardedFileStorage
+
+CONTENT = b"%PDF-1.4\n" + b"receipt line item 3.99\n" * 500
+
+
+def store(storage: ShardedFileStorage, content: bytes) -> str:
+    fd, temp_path = storage.create_temp()
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(content)
+    return storage.commit(temp_path, hashlib.sha256(content).hexdigest())
+
+
+def read(storage: ShardedFileStorage, path: str) -> bytes:
+    with storage.open(path) as handle:
+        return handle.read()
+
+
+def test_files_are_sharded_by_hash(tmp_path):
+    storage = ShardedFileStorage(str(tmp_path), fsync=False)
+    content_hash = hashlib.sha256(CONTENT).hexdigest()
+    path = store(storage, CONTENT)
+    assert path == os.path.join(str(tmp_path), content_hash[:2], content_hash[2:4], f"{content_hash}.pdf")
+    assert read(storage, path) == CONTENT
+    # The same content is stored once
+    assert store(storage, CONTENT) == path
+    assert os.listdir(storage.temp_dir) == []
+
+
+@pytest.mark.parametrize("compression, suffix", [("gzip", ".gz"), ("lzma", ".xz")])
+def test_compressed_files_read_transparently(tmp_path, compression, suffix):
+    storage = ShardedFileStorage(str(tmp_path), compression=compression, fsync=False)
+    path = store(storage, CONTENT)
+    saved = storage.compress(path)
+    assert 0 < saved < len(CONTENT)
+    assert not os.path.exists(path)
+    assert os.path.getsize(path + suffix) == len(CONTENT) - saved
+
+    # The recorded path keeps working for reads, existence checks and duplicate uploads
+    assert storage.exists(path)
+    assert read(storage, path) == CONTENT
+    with storage.local_path(path) as local:
+        with open(local, "rb") as handle:
+            assert handle.read() == CONTENT
+    assert not os.path.exists(local)
+    assert store(storage, CONTENT) == path
+    assert storage.compress(path) == 0
+
+
+def test_incompressible_files_stay_plain(tmp_path):
+    storage = ShardedFileStorage(str(tmp_path), fsync=False)
+    path = store(storage, os.urandom(64 * 1024))
+    assert storage.compress(path) == 0
+    assert os.path.exists(path)
+    assert os.listdir(storage.temp_dir) == []
+
+
+def test_legacy_flat_files_are_reused(tmp_path):
+    storage = ShardedFileStorage(str(tmp_path), fsync=False)
+    content_hash = hashlib.sha256(CONTENT).hexdigest()
+    legacy_path = storage.legacy_path_for(content_hash)
+    with gzip.open(legacy_path + ".gz", "wb") as handle:
+        handle.write(CONTENT)
+    assert store(storage, CONTENT) == legacy_path
+    assert read(storage, legacy_path) == CONTENT
+    assert not os.path.exists(storage.path_for(content_hash))
+
+
+def test_missing_file(tmp_path):
+    storage = ShardedFileStorage(str(tmp_path), fsync=False)
+    missing = storage.path_for("0" * 64)
+    assert not storage.exists(missing)
+    with pytest.raises(FileNotFoundError):
+        storage.open(missing)
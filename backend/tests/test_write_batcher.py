@@ -0,0 +1,81 @@
+import sqlite3
+import threading
+
+import pytest
+
+from app.models.database import WriteBatcher
+
+
+@pytest.fixture
+def batcher(tmp_path):
+    path = str(tmp_path / "batch.db")
+    with sqlite3.connect(path) as conn:
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+    # A wide window makes concurrently submitted operations share one transaction
+    return WriteBatcher(path, window=0.3)
+
+
+def stored_names(batcher) -> set:
+    with sqlite3.connect(batcher.database_path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM item")}
+
+
+def insert(name: str, fail: bool = False):
+    def operation(cursor):
+        cursor.execute("INSERT INTO item (name) VALUES (?)", (name,))
+        if fail:
+            raise ValueError(f"rejected {name}")
+        return cursor.lastrowid
+    return operation
+
+
+def run_concurrently(batcher, operations: list) -> list:
+    """Submit operations from one thread each and return each one's result or exception"""
+    outcomes = [None] * len(operations)
+    start = threading.Barrier(len(operations))
+
+    def submit(index, operation):
+        start.wait()
+        try:
+            outcomes[index] = batcher.execute(operation)
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=submit, args=item) for item in enumerate(operations)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_failed_operation_is_rolled_back_alone(batcher):
+    outcomes = run_concurrently(batcher, [
+        insert("a"), insert("b"), insert("bad", fail=True), insert("c"),
+    ])
+    assert isinstance(outcomes[2], ValueError)
+    assert all(isinstance(outcome, int) for index, outcome in enumerate(outcomes) if index != 2)
+    assert stored_names(batcher) == {"a", "b", "c"}
+
+
+def test_constraint_violation_only_fails_its_caller(batcher):
+    batcher.execute(insert("taken"))
+    outcomes = run_concurrently(batcher, [insert("taken"), insert("fresh")])
+    assert isinstance(outcomes[0], sqlite3.IntegrityError)
+    assert isinstance(outcomes[1], int)
+    assert stored_names(batcher) == {"taken", "fresh"}
+
+
+def test_result_is_returned_after_commit(batcher):
+    row_id = batcher.execute(insert("durable"))
+    # A separate connection already sees the row once execute() returns
+    with sqlite3.connect(batcher.database_path) as conn:
+        assert conn.execute("SELECT name FROM item WHERE id = ?", (row_id,)).fetchone() == ("durable",)
+
+
+def test_writer_keeps_working_after_a_failure(batcher):
+    with pytest.raises(ValueError):
+        batcher.execute(insert("first", fail=True))
+    batcher.execute(insert("second"))
+    assert stored_names(batcher) == {"second"}